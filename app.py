@@ -14,7 +14,14 @@ from modules.validator import FileValidator
 
 # Import custom modules
 from modules.cleaner import DataCleaner
+from modules.cache import CleaningCache
 from modules.simulator import Simulator
+from modules.data_access import (
+    DATASET_NAMES, set_dataset, dataset_fingerprints, dataset_version,
+    file_fingerprint, derived_fingerprint,
+    get_filter_engine, get_dashboard_kpis, get_analytics_tables, get_campaign_grid,
+    get_campaign_uncertainty, get_elasticity_estimates, get_simulator
+)
 from modules.utils import (
     CONFIG, SIMULATOR_CONFIG, CHART_THEME, 
     style_plotly_chart, load_sample_data, get_data_summary
@@ -840,6 +847,8 @@ if 'is_cleaned' not in st.session_state:
     st.session_state.is_cleaned = False
 if 'data_loaded' not in st.session_state:
     st.session_state.data_loaded = False
+if 'dataset_fingerprints' not in st.session_state:
+    st.session_state.dataset_fingerprints = {}
 
 # ============================================================================
 # SIDEBAR NAVIGATION
@@ -1309,6 +1318,9 @@ def show_dashboard_page():
     st.markdown('<p class="section-title section-title-blue">🎛️ Global Filters</p>', unsafe_allow_html=True)
     st.caption("💡 Leave empty to include all")
     
+    # Filters read the session frames through the engine's indexes; nothing is copied or modified
+    filter_engine = get_filter_engine(dataset_version(), sales_df, stores_df, products_df, inventory_df)
+    
     filter_col1, filter_col2, filter_col3, filter_col4, filter_col5 = st.columns(5)
     
     # Date Range Filter
@@ -1316,11 +1328,9 @@ def show_dashboard_page():
         date_range = None
         if 'order_time' in sales_df.columns:
             try:
-                sales_df['order_time'] = pd.to_datetime(sales_df['order_time'], errors='coerce')
-                valid_dates = sales_df['order_time'].dropna()
-                if len(valid_dates) > 0:
-                    min_date = valid_dates.min().date()
-                    max_date = valid_dates.max().date()
+                date_bounds = filter_engine.date_bounds()
+                if date_bounds is not None:
+                    min_date, max_date = date_bounds
                     date_range = st.date_input(
                         "📅 Date Range",
                         value=(min_date, max_date),
@@ -1405,53 +1415,14 @@ def show_dashboard_page():
             selected_brands = []
     
 # ===== APPLY FILTERS =====
-    filtered_sales = sales_df.copy()
-    filtered_stores = stores_df.copy() if stores_df is not None else None
-    filtered_products = products_df.copy() if products_df is not None else None
-    filtered_inventory = inventory_df.copy() if inventory_df is not None else None
-    
-    # Apply date filter
-    if date_range and len(date_range) == 2 and 'order_time' in filtered_sales.columns:
-        start_date, end_date = date_range
-        filtered_sales = filtered_sales[
-            (filtered_sales['order_time'].dt.date >= start_date) &
-            (filtered_sales['order_time'].dt.date <= end_date)
-        ]
-    
-    # Apply city/channel filter via stores
-    if filtered_stores is not None:
-        if selected_cities:
-            filtered_stores = filtered_stores[filtered_stores['city'].isin(selected_cities)]
-        if selected_channels:
-            filtered_stores = filtered_stores[filtered_stores['channel'].isin(selected_channels)]
-        
-        # Filter sales by valid stores
-        if 'store_id' in filtered_sales.columns and 'store_id' in filtered_stores.columns:
-            valid_store_ids = filtered_stores['store_id'].unique()
-            filtered_sales = filtered_sales[filtered_sales['store_id'].isin(valid_store_ids)]
-    
-    # Apply category filter via products
-    if filtered_products is not None and selected_categories:
-        filtered_products = filtered_products[filtered_products['category'].isin(selected_categories)]
-    
-    # Apply brand filter via products
-    if filtered_products is not None and selected_brands and 'brand' in filtered_products.columns:
-        filtered_products = filtered_products[filtered_products['brand'].isin(selected_brands)]
-    
-    # Filter sales by valid products (after category AND brand filters)
-    if filtered_products is not None:
-        if 'sku' in filtered_sales.columns and 'sku' in filtered_products.columns:
-            valid_skus = filtered_products['sku'].unique()
-            filtered_sales = filtered_sales[filtered_sales['sku'].isin(valid_skus)]
-    
-    # Filter inventory by valid stores and products
-    if filtered_inventory is not None:
-        if filtered_stores is not None and 'store_id' in filtered_inventory.columns:
-            valid_store_ids = filtered_stores['store_id'].unique()
-            filtered_inventory = filtered_inventory[filtered_inventory['store_id'].isin(valid_store_ids)]
-        if filtered_products is not None and 'sku' in filtered_inventory.columns:
-            valid_skus = filtered_products['sku'].unique()
-            filtered_inventory = filtered_inventory[filtered_inventory['sku'].isin(valid_skus)]
+    filter_rows = filter_engine.apply(
+        date_range=date_range,
+        cities=selected_cities,
+        channels=selected_channels,
+        categories=selected_categories,
+        brands=selected_brands
+    )
+    filtered_sales, filtered_stores, filtered_products, filtered_inventory = filter_engine.filtered_frames(filter_rows)
     
     # Show filter results
     original_count = len(sales_df)
@@ -1500,17 +1471,18 @@ def show_dashboard_page():
     
     st.markdown("---")
     
-    # Initialize simulator for KPI calculations
-    sim = Simulator()
-    
-    # Calculate KPIs using FILTERED data
-    kpis = sim.calculate_overall_kpis(filtered_sales, filtered_products)
-    city_kpis = sim.calculate_kpis_by_dimension(filtered_sales, filtered_stores, filtered_products, 'city')
-    channel_kpis = sim.calculate_kpis_by_dimension(filtered_sales, filtered_stores, filtered_products, 'channel')
-    category_kpis = sim.calculate_kpis_by_dimension(filtered_sales, filtered_stores, filtered_products, 'category')
+    # KPIs for the FILTERED data, cached per dataset version and filter selection
+    filter_key = (date_range, selected_cities, selected_channels, selected_categories, selected_brands)
+    dashboard_kpis = get_dashboard_kpis(dataset_version(), filter_key, filtered_sales, filtered_stores, filtered_products)
+    kpis = dashboard_kpis['kpis']
+    kpi_cube = dashboard_kpis['kpi_cube']
+    city_kpis = dashboard_kpis['city_kpis']
+    channel_kpis = dashboard_kpis['channel_kpis']
+    category_kpis = dashboard_kpis['category_kpis']
+    daily_rollup = dashboard_kpis['daily_rollup']
     
     with tab_exec:
-        show_executive_view(kpis, city_kpis, channel_kpis, category_kpis, filtered_sales, filtered_products, filtered_stores, filtered_inventory)
+        show_executive_view(kpis, city_kpis, channel_kpis, category_kpis, filtered_sales, filtered_products, filtered_stores, filtered_inventory, kpi_cube=kpi_cube, daily_rollup=daily_rollup)
     
     with tab_mgr:
         show_manager_view(kpis, city_kpis, channel_kpis, category_kpis, filtered_sales, filtered_products, filtered_stores, filtered_inventory)
@@ -1532,7 +1504,7 @@ def show_dashboard_page():
     show_footer()
 
 
-def show_executive_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df, products_df, stores_df, filtered_inventory=None):
+def show_executive_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df, products_df, stores_df, filtered_inventory=None, kpi_cube=None, daily_rollup=None):
     """Display Executive View - Financial & Strategic KPIs."""
     
     # ===== KPI CARDS (Executive) =====
@@ -1813,39 +1785,18 @@ def show_executive_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df,
                 key="revenue_trend_time_group"
             )
             
-            sales_trend = sales_df.copy()
-            sales_trend['order_time'] = pd.to_datetime(sales_trend['order_time'], errors='coerce')
-            
-            # Drop rows with invalid dates
-            sales_trend = sales_trend.dropna(subset=['order_time'])
-            
-            if len(sales_trend) > 0:
-                # Create time column based on selection
-                if time_group == "Daily":
-                    sales_trend['time_period'] = sales_trend['order_time'].dt.strftime('%d %b %Y')
-                    sales_trend['time_sort'] = sales_trend['order_time'].dt.date
-                elif time_group == "Weekly":
-                    sales_trend['time_period'] = sales_trend['order_time'].dt.to_period('W').apply(lambda x: x.start_time.strftime('%d %b %Y'))
-                    sales_trend['time_sort'] = sales_trend['order_time'].dt.to_period('W').apply(lambda x: x.start_time)
-                else:  # Monthly
-                    sales_trend['time_period'] = sales_trend['order_time'].dt.strftime('%b %Y')
-                    sales_trend['time_sort'] = sales_trend['order_time'].dt.to_period('M')
-                
-                # Calculate correct revenue (qty * price)
-                if 'qty' in sales_trend.columns and 'selling_price_aed' in sales_trend.columns:
-                    sales_trend['revenue'] = sales_trend['qty'] * sales_trend['selling_price_aed']
-                elif 'selling_price_aed' in sales_trend.columns:
-                    sales_trend['revenue'] = sales_trend['selling_price_aed']
+            # Weekly/monthly buckets are derived from the precomputed daily rollup
+            if daily_rollup is None:
+                daily_rollup = Simulator().calculate_daily_rollup(sales_df, stores_df, products_df)
+            trend_revenue = Simulator().rollup_time_series(daily_rollup, time_group)
+            
+            if len(trend_revenue) > 0:
+                if time_group == "Monthly":
+                    trend_revenue['time_period'] = trend_revenue['period'].dt.strftime('%b %Y')
                 else:
-                    sales_trend['revenue'] = 0
-                
-                # Filter paid only
-                if 'payment_status' in sales_trend.columns:
-                    sales_trend = sales_trend[sales_trend['payment_status'] == 'Paid']
-                
-                # Group by time period
-                trend_revenue = sales_trend.groupby(['time_sort', 'time_period']).agg({'revenue': 'sum'}).reset_index()
-                trend_revenue = trend_revenue.sort_values('time_sort')
+                    trend_revenue['time_period'] = trend_revenue['period'].dt.strftime('%d %b %Y')
+                # Chart shows paid revenue only
+                trend_revenue['revenue'] = trend_revenue['paid_revenue']
                 
                 fig_area = go.Figure()
                 fig_area.add_trace(go.Scatter(
@@ -1955,48 +1906,13 @@ def show_executive_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df,
     
     with col1:
         # CHART 4: Sunburst - Revenue Mix (City → Channel → Category)
-        if sales_df is not None and stores_df is not None and products_df is not None:
+        if kpi_cube is not None and len(kpi_cube) > 0:
             try:
-                sunburst_df = sales_df.copy()
-                
-                # Merge store data
-                if 'store_id' in sunburst_df.columns and 'store_id' in stores_df.columns:
-                    sunburst_df = sunburst_df.merge(
-                        stores_df[['store_id', 'city', 'channel']], 
-                        on='store_id', 
-                        how='left'
-                    )
-                
-                # Merge product data
-                if 'sku' in sunburst_df.columns and 'sku' in products_df.columns:
-                    sunburst_df = sunburst_df.merge(
-                        products_df[['sku', 'category']], 
-                        on='sku', 
-                        how='left'
-                    )
-                elif 'product_id' in sunburst_df.columns and 'product_id' in products_df.columns:
-                    sunburst_df = sunburst_df.merge(
-                        products_df[['product_id', 'category']], 
-                        on='product_id', 
-                        how='left'
-                    )
-                
-                # Check if all required columns exist
-                if all(col in sunburst_df.columns for col in ['city', 'channel', 'category', 'selling_price_aed']):
-                    # Calculate revenue
-                    if 'qty' in sunburst_df.columns:
-                        sunburst_df['revenue'] = sunburst_df['qty'] * sunburst_df['selling_price_aed']
-                    else:
-                        sunburst_df['revenue'] = sunburst_df['selling_price_aed']
-                    
-                    # Filter paid orders only
-                    if 'payment_status' in sunburst_df.columns:
-                        sunburst_df = sunburst_df[sunburst_df['payment_status'] == 'Paid']
-                    
-                    # Aggregate data
-                    sunburst_agg = sunburst_df.groupby(['city', 'channel', 'category']).agg({
-                        'revenue': 'sum'
-                    }).reset_index()
+                # Check if all required dimensions exist in the KPI cube
+                if all(col in kpi_cube.columns for col in ['city', 'channel', 'category']):
+                    # Paid revenue per City → Channel → Category, rolled up from the cube
+                    sunburst_agg = Simulator().rollup_kpi_cube(kpi_cube, ['city', 'channel', 'category'])
+                    sunburst_agg = sunburst_agg[['city', 'channel', 'category', 'paid_revenue']]
                     sunburst_agg.columns = ['City', 'Channel', 'Category', 'Revenue']
                     
                     # Get top 30 combinations for cleaner visualization
@@ -2028,13 +1944,8 @@ def show_executive_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df,
                         st.info("No revenue data available for sunburst chart")
                 else:
                     # Fallback: Pie chart by channel
-                    if 'channel' in sunburst_df.columns and 'selling_price_aed' in sunburst_df.columns:
-                        if 'qty' in sunburst_df.columns:
-                            sunburst_df['revenue'] = sunburst_df['qty'] * sunburst_df['selling_price_aed']
-                        else:
-                            sunburst_df['revenue'] = sunburst_df['selling_price_aed']
-                        
-                        channel_rev = sunburst_df.groupby('channel')['revenue'].sum().reset_index()
+                    if channel_kpis is not None and 'channel' in channel_kpis.columns:
+                        channel_rev = channel_kpis[['channel', 'revenue']]
                         
                         fig_fallback = px.pie(
                             channel_rev, 
@@ -2196,9 +2107,9 @@ def show_manager_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df, pr
         # Use reorder_point if available, otherwise use fixed threshold
         if 'reorder_point' in inventory_df.columns:
             # Compare stock against reorder point
-            inventory_df['_stock'] = pd.to_numeric(inventory_df['stock_on_hand'], errors='coerce').fillna(0)
-            inventory_df['_reorder'] = pd.to_numeric(inventory_df['reorder_point'], errors='coerce').fillna(10)
-            low_stock = (inventory_df['_stock'] <= inventory_df['_reorder']).sum()
+            stock = pd.to_numeric(inventory_df['stock_on_hand'], errors='coerce').fillna(0)
+            reorder = pd.to_numeric(inventory_df['reorder_point'], errors='coerce').fillna(10)
+            low_stock = (stock <= reorder).sum()
         else:
             # Fallback: Use 10% of average stock or minimum 10 units
             avg_stock = inventory_df['stock_on_hand'].mean()
@@ -2296,7 +2207,7 @@ def show_manager_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df, pr
                 
                 # FIXED: Use explicit aggregation instead of apply() to prevent misalignment
                 # Step 1: Calculate aggregates per city-channel
-                city_channel_agg = inv_with_store.groupby(['city', 'channel']).agg(
+                city_channel_agg = inv_with_store.groupby(['city', 'channel'], observed=True).agg(
                     low_stock_count=('stock_on_hand', lambda x: (x < 10).sum()),
                     total_count=('stock_on_hand', 'count')
                 ).reset_index()
@@ -2381,7 +2292,7 @@ def show_manager_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df, pr
                 if 'category' in sales_with_cat.columns and 'qty' in sales_with_cat.columns:
                     # Calculate demand by category
                     sales_with_cat['qty'] = pd.to_numeric(sales_with_cat['qty'], errors='coerce').fillna(0)
-                    demand_by_cat = sales_with_cat.groupby('category')['qty'].sum().reset_index()
+                    demand_by_cat = sales_with_cat.groupby('category', observed=True)['qty'].sum().reset_index()
                     demand_by_cat.columns = ['Category', 'Demand']
                     
                     # Calculate stock by category
@@ -2395,11 +2306,11 @@ def show_manager_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df, pr
                     
                     if 'category' in inv_with_cat.columns and 'stock_on_hand' in inv_with_cat.columns:
                         inv_with_cat['stock_on_hand'] = pd.to_numeric(inv_with_cat['stock_on_hand'], errors='coerce').fillna(0)
-                        stock_by_cat = inv_with_cat.groupby('category')['stock_on_hand'].sum().reset_index()
+                        stock_by_cat = inv_with_cat.groupby('category', observed=True)['stock_on_hand'].sum().reset_index()
                         stock_by_cat.columns = ['Category', 'Stock']
                         
                         # Merge demand and stock
-                        demand_stock = demand_by_cat.merge(stock_by_cat, on='Category', how='outer').fillna(0)
+                        demand_stock = demand_by_cat.merge(stock_by_cat, on='Category', how='outer').fillna({'Demand': 0, 'Stock': 0})
                         demand_stock = demand_stock.nlargest(8, 'Demand')
                         
                         # Calculate stock coverage ratio
@@ -2553,7 +2464,7 @@ def show_manager_view(kpis, city_kpis, channel_kpis, category_kpis, sales_df, pr
                     risk_df = risk_df.merge(stores_df[['store_id', 'city']], on='store_id', how='left')
                     risk_df['SKU-Location'] = (
                         risk_df[sku_col].astype(str) + ' @ ' + 
-                        risk_df['city'].fillna('Unknown') + 
+                        risk_df['city'].astype(object).fillna('Unknown') + 
                         ' (Stock: ' + risk_df['stock_on_hand'].astype(int).astype(str) + ')'
                     )
                 else:
@@ -2948,14 +2859,11 @@ def show_data_page():
         button_disabled = len(valid_files) != 4
         
         if st.button("📥 Load All Files", width='stretch', disabled=button_disabled):
-            if 'products' in valid_files:
-                st.session_state.raw_products = valid_files['products']
-            if 'stores' in valid_files:
-                st.session_state.raw_stores = valid_files['stores']
-            if 'sales' in valid_files:
-                st.session_state.raw_sales = valid_files['sales']
-            if 'inventory' in valid_files:
-                st.session_state.raw_inventory = valid_files['inventory']
+            uploaded_files = {'products': products_file, 'stores': stores_file, 'sales': sales_file, 'inventory': inventory_file}
+            for name in DATASET_NAMES:
+                if name in valid_files:
+                    # Fingerprint the uploaded bytes so caches can key on the data version
+                    set_dataset('raw', name, valid_files[name], file_fingerprint(uploaded_files[name]))
             
             st.session_state.data_loaded = True
             st.session_state.is_cleaned = False
@@ -2999,7 +2907,7 @@ def show_data_page():
                     'unit_cost_aed': np.random.uniform(10, 500, num_products).round(2),
                     'base_price_aed': np.random.uniform(50, 1000, num_products).round(2),
                 }
-                st.session_state.raw_products = pd.DataFrame(products_data)
+                set_dataset('raw', 'products', pd.DataFrame(products_data))
                 
                 # Generate Stores
                 stores_data = {
@@ -3008,7 +2916,7 @@ def show_data_page():
                     'city': np.random.choice(cities, num_stores),
                     'channel': np.random.choice(all_channels, num_stores),
                 }
-                st.session_state.raw_stores = pd.DataFrame(stores_data)
+                set_dataset('raw', 'stores', pd.DataFrame(stores_data))
                 
                 # Generate Sales
                 end_date = datetime.now()
@@ -3025,7 +2933,7 @@ def show_data_page():
                     'payment_status': np.random.choice(['Paid', 'Paid', 'Paid', 'Failed', 'Refunded'], num_sales),
                     'return_flag': np.random.choice([0, 0, 0, 0, 1], num_sales),
                 }
-                st.session_state.raw_sales = pd.DataFrame(sales_data)
+                set_dataset('raw', 'sales', pd.DataFrame(sales_data))
                 
                 # Generate Inventory
                 inventory_data = {
@@ -3034,7 +2942,7 @@ def show_data_page():
                     'stock_on_hand': np.random.randint(0, 200, num_inventory),
                     'reorder_point': np.random.randint(5, 30, num_inventory),
                 }
-                st.session_state.raw_inventory = pd.DataFrame(inventory_data)
+                set_dataset('raw', 'inventory', pd.DataFrame(inventory_data))
                 
                 st.session_state.data_loaded = True
                 st.session_state.is_cleaned = False
@@ -3205,23 +3113,29 @@ def show_cleaner_page():
                 try:
                     cleaner = DataCleaner()
                     
-                    clean_products, clean_stores, clean_sales, clean_inventory = cleaner.clean_all(
-                        st.session_state.raw_products.copy(),
-                        st.session_state.raw_stores.copy(),
-                        st.session_state.raw_sales.copy(),
-                        st.session_state.raw_inventory.copy()
+                    # Identical inputs + rules reuse the cached result (clean_all copies the inputs)
+                    clean_products, clean_stores, clean_sales, clean_inventory = cleaner.clean_all_cached(
+                        st.session_state.raw_products,
+                        st.session_state.raw_stores,
+                        st.session_state.raw_sales,
+                        st.session_state.raw_inventory,
+                        CleaningCache()
                     )
                     
-                    st.session_state.clean_products = clean_products
-                    st.session_state.clean_stores = clean_stores
-                    st.session_state.clean_sales = clean_sales
-                    st.session_state.clean_inventory = clean_inventory
+                    # Cleaning is deterministic, so the cleaned version derives from the raw one
+                    clean_fingerprint = derived_fingerprint(dataset_fingerprints('raw'), cleaner.config_fingerprint())
+                    clean_frames = [clean_products, clean_stores, clean_sales, clean_inventory]
+                    for name, df in zip(DATASET_NAMES, clean_frames):
+                        set_dataset('clean', name, df, derived_fingerprint([clean_fingerprint, name]))
                     st.session_state.issues_df = cleaner.get_issues_df()
                     st.session_state.cleaner_stats = cleaner.stats
                     st.session_state.cleaning_report = cleaner.cleaning_report
                     st.session_state.is_cleaned = True
                     
-                    st.success("✅ Data cleaning complete!")
+                    if cleaner.cache_hit:
+                        st.success("✅ Data cleaning complete! (loaded from cache)")
+                    else:
+                        st.success("✅ Data cleaning complete!")
                     st.rerun()
                 except Exception as e:
                     st.error(f"❌ Error during cleaning: {str(e)}")
@@ -3416,6 +3330,7 @@ def show_simulator_page():
     sales_df = st.session_state.clean_sales if st.session_state.is_cleaned else st.session_state.raw_sales
     stores_df = st.session_state.clean_stores if st.session_state.is_cleaned else st.session_state.raw_stores
     products_df = st.session_state.clean_products if st.session_state.is_cleaned else st.session_state.raw_products
+    inventory_df = st.session_state.clean_inventory if st.session_state.is_cleaned else st.session_state.raw_inventory
     
     st.markdown('<p class="section-title section-title-cyan">⚙️ Campaign Parameters</p>', unsafe_allow_html=True)
     
@@ -3449,17 +3364,95 @@ def show_simulator_page():
         channel = st.selectbox("Target Channel", channels)
         category = st.selectbox("Target Category", categories)
     
+    # Elasticities fitted from discount_pct/qty in the sales data, cached per dataset version
+    use_estimated_elasticity = st.checkbox(
+        "📐 Use elasticities estimated from sales data",
+        value=False,
+        key="use_estimated_elasticity",
+        help="Fits discount elasticity per category from the data; categories without enough data keep the defaults."
+    )
+    if use_estimated_elasticity:
+        with st.expander("📐 Estimated Elasticities"):
+            estimates = get_elasticity_estimates(dataset_version(), ('category',), sales_df, stores_df, products_df)
+            st.dataframe(
+                estimates.rename(columns={
+                    'category': 'Category', 'elasticity': 'Elasticity', 'rows': 'Sales Lines',
+                    'bins': 'Discount Bins', 'fitted': 'Fitted'
+                })[['Category', 'Elasticity', 'Sales Lines', 'Discount Bins', 'Fitted']].round(2),
+                width='stretch',
+                hide_index=True
+            )
+    # Baseline measured over the observed trading window: run-rate (the default, optionally by weekday) or forecast
+    baseline_modes = {
+        "📏 Average daily run-rate": ('run_rate', False),
+        "📅 Run-rate by day of week": ('run_rate', True),
+        "📈 Forecast (trend + weekly seasonality)": ('forecast', False),
+    }
+    baseline_mode = st.selectbox(
+        "Baseline",
+        list(baseline_modes),
+        key="baseline_mode",
+        help="How demand without the campaign is projected over the campaign window, which starts the day after the last order."
+    )
+    baseline_method, weekday_seasonality = baseline_modes[baseline_mode]
+    
+    # Cap expected units per SKU x store by stock on hand plus one reorder arriving after the lead time
+    use_inventory = st.checkbox(
+        "📦 Cap demand by available inventory",
+        value=False,
+        key="use_inventory",
+        disabled=inventory_df is None,
+        help="Limits units per SKU and store to the latest stock on hand; one reorder of reorder_point units is assumed to arrive after the lead time."
+    )
+    sim = get_simulator(dataset_version(), use_estimated_elasticity, sales_df, stores_df, products_df,
+                        baseline_method=baseline_method, weekday_seasonality=weekday_seasonality)
+    baseline_table = sim.get_baseline_table(sales_df, stores_df, products_df)
+    if baseline_table['first_date'] is not None:
+        st.caption(f"📌 Baseline measured over {baseline_table['data_days']} days of sales "
+                   f"({baseline_table['first_date']:%d %b %Y} – {baseline_table['last_date']:%d %b %Y}).")
+    else:
+        st.caption("📌 No order dates found; the baseline assumes the data covers 30 days.")
+    
     st.markdown("---")
     
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         run_simulation = st.button("🚀 Run Simulation", width='stretch', type="primary")
     
+    with st.expander("🧮 Optimize Discount & Budget"):
+        opt_col1, opt_col2, opt_col3 = st.columns(3)
+        with opt_col1:
+            opt_objective = st.selectbox("Maximize", ["Net Profit", "ROI"], key="opt_objective")
+        with opt_col2:
+            opt_discount_range = st.slider("Discount Range %", 0, 50, (0, 50), key="opt_discount_range")
+        with opt_col3:
+            opt_budget_range = st.slider("Budget Range (AED)", 1000, 500000, (1000, 100000), step=1000, key="opt_budget_range")
+        st.caption("💡 Searches discount and budget within these ranges, respecting the margin floor and targeting above.")
+        run_optimizer = st.button("🧮 Find Best Campaign", width='stretch', key="run_optimizer")
+    
+    if run_optimizer:
+        with st.spinner("🔄 Optimizing campaign..."):
+            try:
+                results = sim.optimize_campaign(
+                    sales_df, stores_df, products_df,
+                    objective='roi' if opt_objective == "ROI" else 'net_profit',
+                    discount_range=opt_discount_range,
+                    budget_range=opt_budget_range,
+                    margin_floor=margin_floor,
+                    city=city,
+                    channel=channel,
+                    category=category,
+                    campaign_days=campaign_days
+                )
+                
+                st.session_state.sim_results = results
+            
+            except Exception as e:
+                st.error(f"❌ Optimization error: {str(e)}")
+    
     if run_simulation:
         with st.spinner("🔄 Running simulation..."):
             try:
-                sim = Simulator()
-                
                 results = sim.simulate_campaign(
                     sales_df, stores_df, products_df,
                     discount_pct=discount_pct,
@@ -3468,7 +3461,8 @@ def show_simulator_page():
                     city=city,
                     channel=channel,
                     category=category,
-                    campaign_days=campaign_days
+                    campaign_days=campaign_days,
+                    inventory_df=inventory_df if use_inventory else None
                 )
                 
                 st.session_state.sim_results = results
@@ -3476,6 +3470,39 @@ def show_simulator_page():
             except Exception as e:
                 st.error(f"❌ Simulation error: {str(e)}")
     
+    with st.expander("💼 Allocate Budget Across Segments"):
+        st.caption("💡 Splits the promo budget above across every city × channel × category segment to maximize total expected profit. The budget funds the discounts.")
+        if st.button("💼 Allocate Budget", width='stretch', key="run_allocation"):
+            with st.spinner("🔄 Allocating budget..."):
+                st.session_state.budget_allocation = sim.allocate_budget(
+                    sales_df, stores_df, products_df,
+                    total_budget=promo_budget,
+                    margin_floor=margin_floor,
+                    campaign_days=campaign_days
+                )
+        
+        allocation_results = st.session_state.get('budget_allocation')
+        if allocation_results and len(allocation_results['allocation']) > 0:
+            summary = allocation_results['summary']
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.markdown(create_metric_card("Allocated", format_currency(summary['allocated_budget']), color="cyan"), unsafe_allow_html=True)
+            with col2:
+                st.markdown(create_metric_card("Expected Profit", format_currency(summary['expected_net_profit']), color="green"), unsafe_allow_html=True)
+            with col3:
+                st.markdown(create_metric_card("Segments Funded", f"{summary['segments_funded']:,}", color="purple"), unsafe_allow_html=True)
+            
+            st.dataframe(
+                allocation_results['allocation'].rename(columns={
+                    'city': 'City', 'channel': 'Channel', 'category': 'Category',
+                    'discount_pct': 'Discount %', 'allocated_budget': 'Budget (AED)',
+                    'baseline_profit': 'Baseline Profit', 'expected_net_profit': 'Expected Profit',
+                    'incremental_profit': 'Incremental Profit', 'marginal_return': 'Marginal Return'
+                }).round(2),
+                width='stretch',
+                hide_index=True
+            )
+    
     if 'sim_results' in st.session_state and st.session_state.sim_results:
         results = st.session_state.sim_results
         outputs = results.get('outputs')
@@ -3486,6 +3513,10 @@ def show_simulator_page():
             st.markdown("---")
             st.markdown('<p class="section-title section-title-teal">📊 Simulation Results</p>', unsafe_allow_html=True)
             
+            optimal = results.get('optimal')
+            if optimal:
+                st.success(f"✅ Best campaign: {optimal['discount_pct']:.1f}% discount with {format_currency(optimal['promo_budget'])} promo budget")
+            
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
@@ -3524,6 +3555,30 @@ def show_simulator_page():
             with col4:
                 st.markdown(create_metric_card("Fulfillment", format_currency(outputs['fulfillment_cost']), color="blue"), unsafe_allow_html=True)
             
+            inventory = results.get('inventory')
+            if inventory:
+                st.markdown("<br>", unsafe_allow_html=True)
+                
+                col1, col2, col3, col4 = st.columns(4)
+                
+                with col1:
+                    color = "green" if inventory['fill_rate_pct'] >= 99 else "orange"
+                    st.markdown(create_metric_card("Fill Rate", f"{inventory['fill_rate_pct']:.1f}%", color=color), unsafe_allow_html=True)
+                
+                with col2:
+                    st.markdown(create_metric_card("Lost Units", f"{inventory['lost_units']:,.0f}", color="orange"), unsafe_allow_html=True)
+                
+                with col3:
+                    st.markdown(create_metric_card("Lost Revenue", format_currency(inventory['lost_revenue']), color="pink"), unsafe_allow_html=True)
+                
+                with col4:
+                    extra_stockouts = inventory['stockouts'] - inventory['baseline_stockouts']
+                    delta_type = "negative" if extra_stockouts > 0 else "positive"
+                    st.markdown(create_metric_card("Stockouts", f"{inventory['stockouts']:,}", f"{extra_stockouts:+d} vs baseline", delta_type, "purple"), unsafe_allow_html=True)
+                
+                st.caption(f"📦 {inventory['pairs']:,} SKU-store pairs with demand; "
+                           f"{inventory['untracked_pairs']:,} have no inventory record and are not capped.")
+            
             if warnings:
                 st.markdown("---")
                 st.markdown('<p class="section-title section-title-orange">⚠️ Risk Alerts</p>', unsafe_allow_html=True)
@@ -3569,6 +3624,68 @@ def show_simulator_page():
                 fig = style_plotly_chart(fig)
                 fig.update_layout(showlegend=False)
                 st.plotly_chart(fig, width='stretch')
+            
+            # Whole discount curve for the current settings, evaluated as one scenario grid
+            st.markdown("---")
+            st.markdown('<p class="section-title section-title-purple">📉 Discount Curve</p>', unsafe_allow_html=True)
+            
+            curve = get_campaign_grid(
+                dataset_version(), tuple(range(0, 51)), (promo_budget,), (margin_floor,), (campaign_days,),
+                city, channel, category, sales_df, stores_df, products_df,
+                use_estimated_elasticity=use_estimated_elasticity,
+                baseline_method=baseline_method,
+                weekday_seasonality=weekday_seasonality
+            )
+            
+            if len(curve) > 0:
+                fig = make_subplots(specs=[[{"secondary_y": True}]])
+                fig.add_trace(go.Scatter(
+                    x=curve['discount_pct'], y=curve['expected_net_profit'],
+                    mode='lines', name='Net Profit', line=dict(color='#10b981', width=2)
+                ), secondary_y=False)
+                fig.add_trace(go.Scatter(
+                    x=curve['discount_pct'], y=curve['roi_pct'],
+                    mode='lines', name='ROI %', line=dict(color='#8b5cf6', width=2, dash='dot')
+                ), secondary_y=True)
+                fig.add_vline(x=discount_pct, line_dash='dash', line_color='#f59e0b')
+                fig = style_plotly_chart(fig)
+                fig.update_layout(title='Net Profit & ROI by Discount %', xaxis_title='Discount %')
+                fig.update_yaxes(title_text='Net Profit (AED)', secondary_y=False)
+                fig.update_yaxes(title_text='ROI %', secondary_y=True)
+                st.plotly_chart(fig, width='stretch')
+                
+                best = curve.loc[curve['expected_net_profit'].idxmax()]
+                st.caption(f"📌 With the current budget, margin floor and targeting, net profit peaks at {best['discount_pct']:.0f}% discount ({format_currency(best['expected_net_profit'])}).")
+            
+            # Monte Carlo bands over elasticity, baseline demand and cost
+            st.markdown("---")
+            st.markdown('<p class="section-title section-title-orange">🎲 Uncertainty (Monte Carlo)</p>', unsafe_allow_html=True)
+            
+            if st.checkbox("Show 90% confidence intervals", key="show_uncertainty"):
+                uncertainty = get_campaign_uncertainty(
+                    dataset_version(), discount_pct, promo_budget, margin_floor, campaign_days,
+                    city, channel, category, sales_df, stores_df, products_df,
+                    use_estimated_elasticity=use_estimated_elasticity,
+                    baseline_method=baseline_method,
+                    weekday_seasonality=weekday_seasonality
+                )
+                bands = uncertainty.get('bands')
+                
+                if bands:
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        band = bands['expected_revenue']
+                        st.markdown(create_metric_card("Revenue (P5 – P95)", f"{format_currency(band['p5'])} – {format_currency(band['p95'])}", color="cyan"), unsafe_allow_html=True)
+                    with col2:
+                        band = bands['expected_net_profit']
+                        st.markdown(create_metric_card("Net Profit (P5 – P95)", f"{format_currency(band['p5'])} – {format_currency(band['p95'])}", color="green"), unsafe_allow_html=True)
+                    with col3:
+                        band = bands['roi_pct']
+                        st.markdown(create_metric_card("ROI (P5 – P95)", f"{band['p5']:.0f}% – {band['p95']:.0f}%", color="purple"), unsafe_allow_html=True)
+                    
+                    st.caption(f"📌 {uncertainty['n_draws']:,} draws of elasticity, baseline demand and unit cost. Incremental profit is negative in {uncertainty['prob_loss'] * 100:.0f}% of draws.")
+                    for warning in uncertainty.get('warnings', []):
+                        st.warning(warning)
         
         elif warnings:
             for warning in warnings:
@@ -3598,7 +3715,8 @@ def show_analytics_page():
     stores_df = st.session_state.clean_stores if st.session_state.is_cleaned else st.session_state.raw_stores
     inventory_df = st.session_state.clean_inventory if st.session_state.is_cleaned else st.session_state.raw_inventory
     
-    sim = Simulator()
+    # Trend, dimension and risk tables, cached per dataset version
+    analytics = get_analytics_tables(dataset_version(), sales_df, stores_df, products_df, inventory_df)
     
     tab1, tab2, tab3, tab4 = st.tabs(["📈 Trends", "🏙️ By City", "📦 By Category", "📋 Inventory"])
     
@@ -3606,7 +3724,7 @@ def show_analytics_page():
         st.markdown('<p class="section-title section-title-cyan">📈 Daily Performance Trends</p>', unsafe_allow_html=True)
         
         try:
-            daily_trends = sim.calculate_daily_trends(sales_df, products_df)
+            daily_trends = analytics['daily_trends']
             
             if daily_trends is None or len(daily_trends) == 0:
                 st.warning("⚠️ No trend data available. This could be due to missing date column in sales data.")
@@ -3662,7 +3780,7 @@ def show_analytics_page():
         st.markdown('<p class="section-title section-title-blue">🏙️ Performance by City</p>', unsafe_allow_html=True)
         
         try:
-            city_kpis = sim.calculate_kpis_by_dimension(sales_df, stores_df, products_df, 'city')
+            city_kpis = analytics['city_kpis']
             
             if city_kpis is None or len(city_kpis) == 0:
                 st.warning("⚠️ No city data available.")
@@ -3711,7 +3829,7 @@ def show_analytics_page():
         st.markdown('<p class="section-title section-title-purple">📦 Performance by Category</p>', unsafe_allow_html=True)
         
         try:
-            cat_kpis = sim.calculate_kpis_by_dimension(sales_df, stores_df, products_df, 'category')
+            cat_kpis = analytics['category_kpis']
             
             if cat_kpis is None or len(cat_kpis) == 0:
                 st.warning("⚠️ No category data available.")
@@ -3757,7 +3875,7 @@ def show_analytics_page():
         st.markdown('<p class="section-title section-title-orange">📋 Inventory Health</p>', unsafe_allow_html=True)
         
         try:
-            stockout = sim.calculate_stockout_risk(inventory_df)
+            stockout = analytics['stockout']
             
             col1, col2, col3 = st.columns(3)
             
@@ -5,6 +5,9 @@
 
 from .cleaner import DataCleaner
 from .simulator import Simulator
+from .sketches import QuantileSketch
+from .cache import CleaningCache
+from .filters import FilterEngine
 from .utils import *
 
-__all__ = ['DataCleaner', 'Simulator']
+__all__ = ['DataCleaner', 'Simulator', 'QuantileSketch', 'CleaningCache', 'FilterEngine']
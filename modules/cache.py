@@ -0,0 +1,122 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Cleaning Result Cache
+# ============================================================================
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+
+class CleaningCache:
+    """
+    On-disk cache of cleaning results keyed by input content.
+    
+    Entries hold the cleaned frames plus the cleaner's issues, stats and
+    cleaning report. Keys hash the raw frames together with the cleaner's
+    config fingerprint (rule version, quantile settings, text mappings), so
+    any change to the data or the rules misses. The directory is bounded by
+    max_bytes; least recently used entries are evicted first.
+    """
+    
+    DEFAULT_DIR = os.path.join(os.path.dirname(__file__), '..', '.cache', 'cleaning')
+    DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+    
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        """Initialize the cache."""
+        self.cache_dir = os.path.abspath(cache_dir or self.DEFAULT_DIR)
+        self.max_bytes = max_bytes
+    
+    @staticmethod
+    def make_key(frames, fingerprint):
+        """Hash a list of DataFrames (columns, dtypes and values) with a config fingerprint."""
+        digest = hashlib.sha256()
+        digest.update(fingerprint.encode('utf-8'))
+        
+        for df in frames:
+            if df is None:
+                digest.update(b'<none>')
+                continue
+            
+            digest.update(repr([(str(col), str(dtype)) for col, dtype in df.dtypes.items()]).encode('utf-8'))
+            digest.update(str(len(df)).encode('utf-8'))
+            digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+        
+        return digest.hexdigest()
+    
+    def _path(self, key):
+        """File path of a cache entry."""
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+    
+    def get(self, key):
+        """Return the cached payload for key, or None on a miss."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        
+        try:
+            with open(path, 'rb') as f:
+                payload = pickle.load(f)
+            # Touch so eviction sees this entry as recently used
+            os.utime(path)
+            return payload
+        except Exception as e:
+            print(f"Warning: Could not read cache entry {key}: {e}")
+            return None
+    
+    def put(self, key, payload):
+        """Store a payload under key, then evict old entries beyond max_bytes."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            
+            # Write to a temp file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+            
+            self._evict()
+        except Exception as e:
+            print(f"Warning: Could not write cache entry {key}: {e}")
+    
+    def clear(self):
+        """Remove all cache entries."""
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def _entries(self):
+        """List (path, size, mtime) of cache entries."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, info.st_size, info.st_mtime))
+        return entries
+    
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
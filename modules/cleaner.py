@@ -1,9 +1,15 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+import copy
 import json
 import os
+import pickle
 import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from .sketches import QuantileSketch
 
 
 class DataCleaner:
@@ -16,8 +22,62 @@ class DataCleaner:
     VALID_LAUNCH_FLAG = ["New", "Regular"]
     VALID_PAYMENT_STATUS = ["Paid", "Failed", "Refunded"]
     
-    def __init__(self):
-        """Initialize the cleaner."""
+    # Timestamp formats tried in bulk, in order. Month-first comes before
+    # day-first so ambiguous dates resolve like the mixed-format parser.
+    TIMESTAMP_FORMATS = [
+        '%Y-%m-%d %H:%M:%S',
+        '%m/%d/%Y %H:%M',
+        '%d/%m/%Y %H:%M',
+        '%m-%d-%Y %H:%M:%S',
+        '%d-%m-%Y %H:%M:%S',
+        '%Y-%m-%d',
+        '%m/%d/%Y',
+        '%d/%m/%Y',
+        '%Y-%m'
+    ]
+    
+    # Dimension columns emitted as categoricals with one shared dictionary per
+    # column across all four tables. Fixed value sets come first; other
+    # values follow in order of first appearance (products and stores first,
+    # so their row order defines the sku/store_id codes).
+    CATEGORICAL_COLUMNS = {
+        'sku': None,
+        'store_id': None,
+        'city': VALID_CITIES,
+        'channel': VALID_CHANNELS,
+        'fulfillment_type': VALID_FULFILLMENT,
+        'launch_flag': VALID_LAUNCH_FLAG,
+        'payment_status': VALID_PAYMENT_STATUS,
+        'category': None,
+        'brand': None
+    }
+    
+    # Bump whenever a cleaning rule changes so cached results are invalidated
+    RULES_VERSION = '3'
+    
+    # Table cleaning order; issues and stats are always merged in this order
+    TABLES = ['products', 'stores', 'sales', 'inventory']
+    
+    # Minimum sales rows per partition when sales rows are cleaned in parallel
+    SALES_PARTITION_ROWS = 50000
+    
+    # Sketch rank error clean_all_streaming uses when quantile_error is None
+    STREAMING_QUANTILE_ERROR = 0.001
+    
+    def __init__(self, quantile_error=None, workers=1):
+        """
+        Initialize the cleaner.
+        
+        quantile_error: rank error bound for the quantile sketches behind the
+        percentile caps and median imputation. None keeps them exact in
+        clean_all, where the raw tables are in memory anyway; exact sketches
+        hold every distinct value, so clean_all_streaming falls back to
+        STREAMING_QUANTILE_ERROR unless asked for exact caps.
+        workers: number of processes used by clean_all. 1 cleans in sequence.
+        """
+        self.quantile_error = quantile_error
+        self._sketch_error = quantile_error
+        self.workers = workers
         self.issues = []
         self.stats = {
             'total_issues_fixed': 0,
@@ -28,7 +88,11 @@ class DataCleaner:
             'text_standardized': 0
         }
         self.cleaning_report = {}
+        self.cache_hit = False
+        self.sales_summary = None
+        self.category_dictionaries = {}
         self.text_mappings = self._load_text_mappings()
+        self._text_lookups = {}
     
     def _load_text_mappings(self):
         """Load text mappings from config file."""
@@ -71,36 +135,435 @@ class DataCleaner:
         })
         self.stats['total_issues_fixed'] += 1
     
-    def _map_text_value(self, value, mappings, field_type):
-        """Map a text value to its standardized form."""
-        if pd.isna(value) or value is None:
-            return value
-        
-        value_str = str(value).strip()
-        
+    def _get_text_lookup(self, mappings, field_type):
+        """Return the lower-cased lookup for a mapping dict, building it once."""
+        if field_type not in self._text_lookups:
+            lookup = {}
+            for key, mapped_value in mappings.items():
+                # First key wins, matching the original linear scan order
+                lookup.setdefault(str(key).lower(), mapped_value)
+            self._text_lookups[field_type] = lookup
+        return self._text_lookups[field_type]
+    
+    def _resolve_text_value(self, value_str, mappings, lookup, field_type):
+        """Resolve a stripped text value. Returns (mapped_value, was_standardized)."""
         # Direct mapping lookup
         if value_str in mappings:
-            self.stats['text_standardized'] += 1
-            return mappings[value_str]
+            return mappings[value_str], True
         
         # Case-insensitive lookup
         value_lower = value_str.lower()
-        for key, mapped_value in mappings.items():
-            if key.lower() == value_lower:
-                self.stats['text_standardized'] += 1
-                return mapped_value
+        if value_lower in lookup:
+            return lookup[value_lower], True
         
         # Title case for standard values
         value_title = value_str.title()
         standard_values = self.text_mappings.get('standard_values', {}).get(field_type + 's', [])
         if value_title in standard_values:
+            return value_title, True
+        
+        return value_str, False
+    
+    def _map_text_value(self, value, mappings, field_type):
+        """Map a text value to its standardized form."""
+        if pd.isna(value) or value is None:
+            return value
+        
+        lookup = self._get_text_lookup(mappings, field_type)
+        mapped_value, standardized = self._resolve_text_value(str(value).strip(), mappings, lookup, field_type)
+        if standardized:
             self.stats['text_standardized'] += 1
-            return value_title
+        return mapped_value
+    
+    def _map_text_series(self, series, mappings, field_type):
+        """
+        Vectorized _map_text_value for a whole column.
+        
+        Distinct values are factorized and resolved once, then broadcast back
+        to the rows, so the cost depends on the number of distinct strings
+        rather than the number of rows. text_standardized still counts rows.
+        """
+        codes, uniques = pd.factorize(series)
+        if len(uniques) == 0:
+            return series
+        
+        lookup = self._get_text_lookup(mappings, field_type)
+        resolved = [self._resolve_text_value(str(v).strip(), mappings, lookup, field_type) for v in uniques]
+        mapped_uniques = np.array([mapped for mapped, _ in resolved], dtype=object)
+        standardized = np.array([hit for _, hit in resolved], dtype=bool)
+        
+        valid = codes >= 0
+        counts = np.bincount(codes[valid], minlength=len(uniques))
+        self.stats['text_standardized'] += int(counts[standardized].sum())
+        
+        values = series.to_numpy(dtype=object, copy=True)
+        values[valid] = mapped_uniques[codes[valid]]
+        return pd.Series(values, index=series.index, name=series.name)
+    
+    def _parse_timestamp_value(self, x):
+        """Parse a single timestamp with mixed-format fallbacks (slow path)."""
+        if pd.isna(x):
+            return pd.NaT
+        try:
+            return pd.to_datetime(x, format='mixed')
+        except (ValueError, TypeError):
+            try:
+                return pd.to_datetime(x)
+            except (ValueError, TypeError):
+                return pd.NaT
+    
+    def _parse_timestamps(self, series):
+        """
+        Parse a timestamp column in bulk.
+        
+        Each format in TIMESTAMP_FORMATS is parsed with one vectorized call on
+        the rows still unparsed. Only the residual strings fall back to the
+        per-value mixed-format parser, once per distinct value.
+        """
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
+        
+        text = series.astype(str).str.strip()
+        parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+        remaining = series.notna().to_numpy()
         
-        return value_str
+        for fmt in self.TIMESTAMP_FORMATS:
+            if not remaining.any():
+                break
+            positions = np.flatnonzero(remaining)
+            attempt = pd.to_datetime(text.iloc[positions], format=fmt, errors='coerce')
+            hit = attempt.notna().to_numpy()
+            parsed.iloc[positions[hit]] = attempt.to_numpy()[hit]
+            remaining[positions[hit]] = False
+        
+        # Residual strings that match none of the known formats
+        if remaining.any():
+            positions = np.flatnonzero(remaining)
+            codes, uniques = pd.factorize(series.iloc[positions])
+            fallback = pd.to_datetime(pd.Series([self._parse_timestamp_value(v) for v in uniques], dtype=object),
+                                      errors='coerce')
+            parsed.iloc[positions] = fallback.to_numpy()[codes]
+        
+        return parsed
     
     def clean_all(self, products_df, stores_df, sales_df, inventory_df):
         """Clean all dataframes and return cleaned versions."""
+        self._reset_state()
+        
+        if self.workers and self.workers > 1:
+            clean_products, clean_stores, clean_sales, clean_inventory = self._clean_tables_parallel(
+                [products_df, stores_df, sales_df, inventory_df])
+        else:
+            # Clean in order (stores/products first, then sales/inventory)
+            clean_products = self._clean_products(products_df.copy() if products_df is not None else pd.DataFrame())
+            clean_stores = self._clean_stores(stores_df.copy() if stores_df is not None else pd.DataFrame())
+            clean_sales = self._clean_sales(sales_df.copy() if sales_df is not None else pd.DataFrame(), clean_products, clean_stores)
+            clean_inventory = self._clean_inventory(inventory_df.copy() if inventory_df is not None else pd.DataFrame(), clean_products, clean_stores)
+        
+        # Final foreign key validation
+        clean_sales = self._validate_foreign_keys_sales(clean_sales, clean_products, clean_stores)
+        clean_inventory = self._validate_foreign_keys_inventory(clean_inventory, clean_products, clean_stores)
+        
+        return tuple(self._apply_categoricals([clean_products, clean_stores, clean_sales, clean_inventory]))
+    
+    def clean_all_cached(self, products_df, stores_df, sales_df, inventory_df, cache):
+        """
+        Like clean_all, but reuse a CleaningCache entry for identical inputs.
+        
+        On a hit, issues, stats and the cleaning report are restored from
+        the cache as well; self.cache_hit tells which path was taken.
+        """
+        frames = [products_df, stores_df, sales_df, inventory_df]
+        key = cache.make_key(frames, self.config_fingerprint())
+        
+        payload = cache.get(key)
+        if payload is not None:
+            self.issues = payload['issues']
+            self.stats = payload['stats']
+            self.cleaning_report = payload['cleaning_report']
+            self.sales_summary = payload.get('sales_summary')
+            self.cache_hit = True
+            return payload['frames']
+        
+        cleaned = self.clean_all(products_df, stores_df, sales_df, inventory_df)
+        cache.put(key, {
+            'frames': cleaned,
+            'issues': self.issues,
+            'stats': self.stats,
+            'cleaning_report': self.cleaning_report,
+            'sales_summary': self.sales_summary
+        })
+        self.cache_hit = False
+        return cleaned
+    
+    def config_fingerprint(self):
+        """String identifying everything besides the input data that affects cleaning output."""
+        return json.dumps({
+            'rules_version': self.RULES_VERSION,
+            'quantile_error': self.quantile_error,
+            'text_mappings': self.text_mappings
+        }, sort_keys=True, default=str)
+    
+    def incremental_state(self, clean_products, clean_stores, clean_sales):
+        """
+        Capture the state needed to clean appended sales batches after clean_all.
+        
+        The state holds the seen order_ids (as a sorted array of 64-bit
+        hashes, built here so plain clean_all runs never pay for it), the
+        quantile sketches behind the sales caps, the valid SKU/store key
+        sets and the issue log, stats and report so far. Seen ids are those
+        of clean_sales plus the rows clean_all dropped for foreign key
+        violations, as a full re-clean would see them. It is a plain dict;
+        persist it with save_incremental_state.
+        """
+        if self.sales_summary is None:
+            raise ValueError("No sales history: run clean_all before building incremental state")
+        
+        valid_skus, valid_stores = self._foreign_key_sets(clean_products, clean_stores)
+        order_ids = clean_sales['order_id'] if clean_sales is not None and 'order_id' in clean_sales.columns else None
+        dropped_ids = self.sales_summary.get('dropped_order_ids')
+        if dropped_ids is not None:
+            order_ids = pd.concat([pd.Series(order_ids, dtype=object), pd.Series(dropped_ids, dtype=object)])
+        return {
+            'config': self.config_fingerprint(),
+            'sales_summary': self.sales_summary,
+            'order_id_hashes': self._order_id_hashes(order_ids),
+            'valid_skus': valid_skus,
+            'valid_stores': valid_stores,
+            'category_dictionaries': self.category_dictionaries,
+            'issues': list(self.issues),
+            'stats': dict(self.stats),
+            'cleaning_report': copy.deepcopy(self.cleaning_report)
+        }
+    
+    def _order_id_hashes(self, order_ids, unique=True):
+        """
+        64-bit hashes of order_ids, compared as strings.
+        
+        Missing ids share one hash, as drop_duplicates treats them as equal.
+        With unique=True the hashes come back sorted and deduplicated.
+        """
+        if order_ids is None:
+            return np.zeros(0, dtype=np.uint64)
+        ids = pd.Series(order_ids, dtype=object)
+        hashes = pd.util.hash_array(ids.where(ids.notna(), '').astype(str).to_numpy(dtype=object))
+        return np.unique(hashes) if unique else hashes
+    
+    @staticmethod
+    def save_incremental_state(state, path):
+        """Persist incremental state to disk."""
+        with open(path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    @staticmethod
+    def load_incremental_state(path):
+        """Load incremental state saved with save_incremental_state."""
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    
+    def clean_sales_increment(self, batch_df, state):
+        """
+        Clean an appended sales batch against incremental state.
+        
+        The batch gets the same rules as clean_all: caps come from the
+        history sketches merged with the batch, order_ids already seen in
+        history are dropped as duplicates (latest wins within the batch),
+        and foreign keys are checked against the stored key sets. The issue
+        log, stats and report are extended rather than rebuilt. The
+        incoming state is never modified, so a failed batch can be retried
+        from it.
+        
+        Returns the cleaned batch on its own and the updated state. Apart
+        from merging the batch's hashed ids into the sorted seen-id array
+        (a flat array copy), the cost depends only on the batch size; use
+        append_sales_batch to add the batch to the cleaned history.
+        """
+        if state['config'] != self.config_fingerprint():
+            raise ValueError("Incremental state was built with different cleaning rules; run clean_all again")
+        
+        self.issues = list(state['issues'])
+        self.stats = dict(state['stats'])
+        self.cleaning_report = copy.deepcopy(state['cleaning_report'])
+        history = state['sales_summary']
+        
+        if batch_df is None or len(batch_df) == 0:
+            return pd.DataFrame(), state
+        
+        original_count = len(batch_df)
+        df, counts = self._clean_sales_rows(batch_df.copy())
+        
+        # Caps see history and batch together, as a full re-clean would
+        summary = {key: value.copy() if isinstance(value, QuantileSketch) else value
+                   for key, value in history.items()}
+        self._merge_counts(summary, {key: value for key, value in counts.items()
+                                     if key in ['qty_sketch', 'price_sketch', 'valid_price_sketch',
+                                                'missing_price', 'negative_price']})
+        caps = self._sales_caps(summary)
+        df = self._apply_sales_caps(df, caps, counts)
+        
+        # Latest row wins within the batch; ids already in history are duplicates
+        df = self._dedup_sales(df, counts)
+        seen_hashes = state['order_id_hashes']
+        if 'order_id' in df.columns and len(seen_hashes) > 0:
+            hashes = self._order_id_hashes(df['order_id'], unique=False)
+            positions = np.minimum(np.searchsorted(seen_hashes, hashes), len(seen_hashes) - 1)
+            seen = seen_hashes[positions] == hashes
+            counts['duplicates'] = counts.get('duplicates', 0) + int(seen.sum())
+            df = df[~seen]
+        self._log_sales_issues(counts, caps)
+        
+        # New seen-id array, including rows the foreign key checks drop next;
+        # the history array is left as it was
+        order_id_hashes = seen_hashes
+        if 'order_id' in df.columns and len(df) > 0:
+            batch_hashes = self._order_id_hashes(df['order_id'])
+            order_id_hashes = np.insert(seen_hashes, np.searchsorted(seen_hashes, batch_hashes), batch_hashes)
+        
+        invalid_sku, invalid_store = self._foreign_key_violations(df, state['valid_skus'], state['valid_stores'])
+        df = df[~(invalid_sku | invalid_store)].copy()
+        self._log_foreign_key_violations('sales', invalid_sku.sum(), invalid_store.sum())
+        
+        # Extend the report
+        report = self.cleaning_report.setdefault('sales', {'original_rows': 0, 'final_rows': 0, 'dropped_rows': 0})
+        report['original_rows'] = report.get('original_rows', 0) + original_count
+        report['final_rows'] = report.get('final_rows', 0) + len(df)
+        report['dropped_rows'] = report.get('dropped_rows', 0) + original_count - len(df)
+        fk_report = self.cleaning_report.setdefault('foreign_key_issues', {})
+        fk_report['invalid_skus'] = fk_report.get('invalid_skus', 0) + invalid_sku.sum()
+        fk_report['invalid_stores'] = fk_report.get('invalid_stores', 0) + invalid_store.sum()
+        
+        self.sales_summary = summary
+        
+        new_state = dict(state)
+        new_state.update({
+            'sales_summary': summary,
+            'order_id_hashes': order_id_hashes,
+            'issues': list(self.issues),
+            'stats': dict(self.stats),
+            'cleaning_report': copy.deepcopy(self.cleaning_report)
+        })
+        
+        # Batch shares the history's category dictionaries (extended if new values appear)
+        self._apply_categoricals([df], base=state.get('category_dictionaries'))
+        new_state['category_dictionaries'] = self.category_dictionaries
+        return df, new_state
+    
+    @staticmethod
+    def append_sales_batch(clean_sales, batch):
+        """
+        Append a batch from clean_sales_increment to the cleaned sales history.
+        
+        This copies the whole history (pd.concat), and also re-codes history
+        columns whose category dictionary grew with the batch, so its cost
+        follows the history size; callers that keep batches separately
+        (e.g. as files) can skip it.
+        """
+        if clean_sales is None or len(clean_sales) == 0:
+            return batch
+        if batch is None or len(batch) == 0:
+            return clean_sales
+        
+        grown = {col: batch[col].dtype for col in batch.columns
+                 if isinstance(batch[col].dtype, pd.CategoricalDtype)
+                 and col in clean_sales.columns and clean_sales[col].dtype != batch[col].dtype}
+        if grown:
+            clean_sales = clean_sales.astype(grown)
+        return pd.concat([clean_sales, batch])
+    
+    def _clean_tables_parallel(self, frames):
+        """
+        Clean the four tables concurrently in a process pool.
+        
+        The per-table cleaners are independent (foreign keys are checked
+        afterwards), so each runs in its own worker with a fresh cleaner;
+        sales is additionally split into row partitions.
+        Issues, stats and report entries are merged back in TABLES order,
+        which keeps the issue log identical to the sequential run.
+        """
+        settings = self._worker_settings()
+        
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                table: pool.submit(_clean_table_worker, table,
+                                   df if df is not None else pd.DataFrame(), settings)
+                for table, df in zip(self.TABLES, frames)
+                if table != 'sales'
+            }
+            
+            # Sales dominates: its row rules run as partitions on the same pool
+            # while the other tables clean, and the global steps run here
+            sales_cleaner = DataCleaner(quantile_error=self.quantile_error, workers=self.workers)
+            sales_df = frames[self.TABLES.index('sales')]
+            clean_sales = sales_cleaner._clean_sales(
+                sales_df.copy() if sales_df is not None else pd.DataFrame(), None, None, pool=pool)
+            
+            self.sales_summary = sales_cleaner.sales_summary
+            
+            results = []
+            for table in self.TABLES:
+                if table == 'sales':
+                    results.append((clean_sales, sales_cleaner.issues, sales_cleaner.stats,
+                                    sales_cleaner.cleaning_report))
+                else:
+                    results.append(futures[table].result())
+        
+        cleaned = []
+        for clean_df, issues, stats, report in results:
+            self._merge_cleaner_logs(issues, stats, report)
+            cleaned.append(clean_df)
+        
+        return cleaned
+    
+    def _worker_settings(self):
+        """Settings a worker process needs to clean exactly like this cleaner."""
+        return {'quantile_error': self.quantile_error, 'text_mappings': self.text_mappings}
+    
+    def _merge_cleaner_logs(self, issues, stats, report):
+        """Append issues, add stats and merge report entries from another cleaner run."""
+        self.issues.extend(issues)
+        for key, value in stats.items():
+            self.stats[key] = self.stats.get(key, 0) + value
+        self.cleaning_report.update(report)
+    
+    def _category_dictionaries(self, frames, base=None):
+        """Build the shared category list for each dimension column present in frames."""
+        dictionaries = {}
+        for col, valid_values in self.CATEGORICAL_COLUMNS.items():
+            known = list((base or {}).get(col) or valid_values or [])
+            seen = set(known)
+            for df in frames:
+                if df is None or col not in df.columns:
+                    continue
+                for value in pd.unique(df[col].dropna()):
+                    if value not in seen:
+                        seen.add(value)
+                        known.append(value)
+            if known:
+                dictionaries[col] = known
+        return dictionaries
+    
+    def _apply_categoricals(self, frames, base=None):
+        """
+        Convert dimension columns to categoricals sharing one dictionary per
+        column, so sku/store_id codes line up across tables.
+        
+        base extends existing dictionaries (incremental batches); the result
+        is kept in self.category_dictionaries.
+        """
+        self.category_dictionaries = self._category_dictionaries(frames, base)
+        dtypes = {col: pd.CategoricalDtype(categories) for col, categories in self.category_dictionaries.items()}
+        
+        for df in frames:
+            if df is None:
+                continue
+            for col, dtype in dtypes.items():
+                if col in df.columns:
+                    df[col] = df[col].astype(dtype)
+        
+        return frames
+    
+    def _reset_state(self):
+        """Reset issues, stats and report before a cleaning run."""
         self.issues = []
         self.stats = {
             'total_issues_fixed': 0,
@@ -111,18 +574,216 @@ class DataCleaner:
             'text_standardized': 0
         }
         self.cleaning_report = {}
+        self.sales_summary = None
+        self._sketch_error = self.quantile_error
+    
+    def clean_all_streaming(self, products_df, stores_df, sales_source, inventory_source,
+                            chunksize=100000, output_dir=None, exact=False):
+        """
+        Clean sales and inventory from CSV sources in chunks, without holding
+        the raw tables in memory.
+        
+        By default the outlier caps come from bounded sketches, so results
+        may differ from ``clean_all`` by up to STREAMING_QUANTILE_ERROR
+        (0.1%) rank error in the percentile caps, and with them the capped
+        values and outlier counts. Pass ``exact=True`` to match ``clean_all``.
+        
+        Products and stores are small and cleaned in memory. Sales and
+        inventory are read with ``chunksize`` rows at a time in two passes:
+        the first applies the row-local rules and collects the global
+        statistics (percentile caps, median price, latest row per key), the
+        second applies the caps, dedup and foreign key checks. Issues, stats
+        and the cleaning report match ``clean_all`` given the same caps
+        (see below); surviving rows keep their input order.
+        
+        The caps come from quantile sketches. Without a quantile_error they
+        use STREAMING_QUANTILE_ERROR, so memory stays bounded however many
+        distinct values the sources hold, and caps can differ from
+        ``clean_all`` within that rank error. ``exact=True`` keeps every
+        distinct value instead: caps then match ``clean_all`` exactly, but
+        sketch memory grows with the distinct qty, price and stock values.
+        
+        If ``output_dir`` is given, cleaned sales and inventory are appended
+        to CSV files there and their paths are returned instead of frames.
+        """
+        self._reset_state()
+        if self.quantile_error is None and not exact:
+            self._sketch_error = self.STREAMING_QUANTILE_ERROR
         
-        # Clean in order (stores/products first, then sales/inventory)
         clean_products = self._clean_products(products_df.copy() if products_df is not None else pd.DataFrame())
         clean_stores = self._clean_stores(stores_df.copy() if stores_df is not None else pd.DataFrame())
-        clean_sales = self._clean_sales(sales_df.copy() if sales_df is not None else pd.DataFrame(), clean_products, clean_stores)
-        clean_inventory = self._clean_inventory(inventory_df.copy() if inventory_df is not None else pd.DataFrame(), clean_products, clean_stores)
+        valid_skus, valid_stores = self._foreign_key_sets(clean_products, clean_stores)
         
-        # Final foreign key validation
-        clean_sales = self._validate_foreign_keys_sales(clean_sales, clean_products, clean_stores)
-        clean_inventory = self._validate_foreign_keys_inventory(clean_inventory, clean_products, clean_stores)
+        with tempfile.TemporaryDirectory() as spill_dir:
+            sales_pass = self._stream_first_pass('sales', sales_source, chunksize, spill_dir)
+            inventory_pass = self._stream_first_pass('inventory', inventory_source, chunksize, spill_dir)
+            
+            # Second pass over the spilled chunks
+            sales_out = self._stream_second_pass('sales', sales_pass, valid_skus, valid_stores, output_dir)
+            inventory_out = self._stream_second_pass('inventory', inventory_pass, valid_skus, valid_stores, output_dir)
+        
+        # Log in the same order as clean_all
+        for table, table_pass, table_out in [('sales', sales_pass, sales_out),
+                                             ('inventory', inventory_pass, inventory_out)]:
+            if table_pass['rows'] == 0:
+                self.cleaning_report[table] = {'original_rows': 0, 'final_rows': 0, 'dropped_rows': 0}
+                continue
+            if table == 'sales':
+                self.sales_summary = self._sales_history_summary(table_pass['counts'])
+                for dropped in table_out['dropped_order_ids']:
+                    self._record_dropped_order_ids(dropped)
+                self._log_sales_issues(table_pass['counts'], table_pass['caps'])
+            else:
+                self._log_inventory_issues(table_pass['counts'], table_pass['caps'])
+            self.cleaning_report[table] = {
+                'original_rows': table_pass['rows'],
+                'final_rows': table_out['deduped_rows'],
+                'dropped_rows': table_pass['rows'] - table_out['deduped_rows']
+            }
+        
+        for table, table_pass, table_out in [('sales', sales_pass, sales_out),
+                                             ('inventory', inventory_pass, inventory_out)]:
+            if table_pass['rows'] > 0:
+                self._log_foreign_key_issues(table, table_out['invalid_sku'], table_out['invalid_store'],
+                                             table_out['deduped_rows'], table_out['final_rows'])
+        
+        if output_dir is None:
+            return tuple(self._apply_categoricals(
+                [clean_products, clean_stores, sales_out['result'], inventory_out['result']]))
         
-        return clean_products, clean_stores, clean_sales, clean_inventory
+        self._apply_categoricals([clean_products, clean_stores])
+        return clean_products, clean_stores, sales_out['result'], inventory_out['result']
+    
+    def _stream_first_pass(self, table, source, chunksize, spill_dir):
+        """
+        Apply row-local rules chunk by chunk, spill the rows to disk and
+        accumulate issue counts, quantile sketches and dedup winners.
+        """
+        state = {'rows': 0, 'kept_rows': 0, 'counts': {}, 'caps': {}, 'chunks': [], 'winners': None, 'key_cols': None}
+        if source is None:
+            return state
+        
+        # One reference time for the future-date rule across all chunks
+        now = pd.Timestamp.now()
+        
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            state['rows'] += len(chunk)
+            
+            # Keep the original row position for dedup tie-breaks
+            chunk.index = pd.RangeIndex(state['rows'] - len(chunk), state['rows'])
+            
+            if table == 'sales':
+                chunk, counts = self._clean_sales_rows(chunk, now)
+                if 'order_id' in chunk.columns:
+                    state['key_cols'] = ['order_id']
+                    state['winners'] = self._latest_sales_rows(state['winners'], chunk)
+            else:
+                chunk, counts = self._clean_inventory_rows(chunk)
+                key_cols = self._inventory_key_columns(chunk)
+                if key_cols:
+                    state['key_cols'] = key_cols
+                    keys = chunk[key_cols]
+                    if state['winners'] is not None:
+                        keys = pd.concat([state['winners'], keys])
+                    state['winners'] = keys[~keys.duplicated(subset=key_cols, keep='last')]
+            
+            self._merge_counts(state['counts'], counts)
+            state['kept_rows'] += len(chunk)
+            
+            path = os.path.join(spill_dir, f'{table}_{len(state["chunks"])}.pkl')
+            chunk.to_pickle(path)
+            state['chunks'].append(path)
+        
+        # Global statistics from the merged sketches
+        if table == 'sales':
+            state['caps'] = self._sales_caps(state['counts'])
+        else:
+            state['caps'] = self._inventory_caps(state['counts'])
+        
+        return state
+    
+    def _latest_sales_rows(self, winners, chunk):
+        """Keep the latest row per order_id (latest row position on ties, as in _dedup_sales)."""
+        cols = ['order_id', 'order_time'] if 'order_time' in chunk.columns else ['order_id']
+        candidates = chunk[cols]
+        if winners is not None:
+            candidates = pd.concat([winners, candidates])
+        if 'order_time' in cols:
+            candidates = candidates.iloc[::-1].sort_values('order_time', ascending=False, kind='mergesort')
+        else:
+            candidates = candidates.iloc[::-1]
+        candidates = candidates[~candidates.duplicated(subset=['order_id'], keep='first')]
+        return candidates.sort_index()
+    
+    def _stream_second_pass(self, table, state, valid_skus, valid_stores, output_dir):
+        """Apply caps, dedup and foreign key checks to the spilled chunks."""
+        out = {'result': pd.DataFrame(), 'deduped_rows': 0, 'final_rows': 0,
+               'invalid_sku': 0, 'invalid_store': 0, 'dropped_order_ids': []}
+        
+        output_path = None
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            output_path = os.path.join(output_dir, f'clean_{table}.csv')
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            out['result'] = output_path
+        
+        keep_index = state['winners'].index if state['winners'] is not None else None
+        frames = []
+        
+        for path in state['chunks']:
+            chunk = pd.read_pickle(path)
+            if table == 'sales':
+                chunk = self._apply_sales_caps(chunk, state['caps'], state['counts'])
+            else:
+                chunk = self._apply_inventory_caps(chunk, state['caps'], state['counts'])
+            
+            if keep_index is not None:
+                chunk = chunk[chunk.index.isin(keep_index)]
+            out['deduped_rows'] += len(chunk)
+            
+            invalid_sku, invalid_store = self._foreign_key_violations(chunk, valid_skus, valid_stores)
+            out['invalid_sku'] += invalid_sku.sum()
+            out['invalid_store'] += invalid_store.sum()
+            if table == 'sales':
+                out['dropped_order_ids'].append(chunk[invalid_sku | invalid_store])
+            chunk = chunk[~(invalid_sku | invalid_store)]
+            out['final_rows'] += len(chunk)
+            
+            if output_path is not None:
+                chunk.to_csv(output_path, mode='a', index=False, header=not os.path.exists(output_path))
+            else:
+                frames.append(chunk)
+        
+        if keep_index is not None:
+            state['counts']['duplicates'] = state['kept_rows'] - out['deduped_rows']
+        
+        if output_path is None and frames:
+            out['result'] = pd.concat(frames)
+        
+        return out
+    
+    def _merge_counts(self, total, counts):
+        """Add per-chunk issue counts (and merge quantile sketches) into a running total."""
+        for key, value in counts.items():
+            if isinstance(value, dict):
+                merged = total.setdefault(key, {})
+                for val, val_count in value.items():
+                    merged[val] = merged.get(val, 0) + val_count
+            elif isinstance(value, QuantileSketch):
+                total[key] = total[key].merge(value) if key in total else value
+            elif isinstance(value, (int, np.integer)):
+                total[key] = total.get(key, 0) + value
+            else:
+                total.setdefault(key, value)
+        return total
+    
+    def _new_sketch(self, values=None):
+        """Create a quantile sketch with the configured error, optionally fed with values."""
+        sketch = QuantileSketch(self._sketch_error)
+        if values is not None:
+            sketch.update(values)
+        return sketch
     
     def _clean_products(self, df):
         """Clean products dataframe."""
@@ -153,7 +814,7 @@ class DataCleaner:
         # Map category variations
         if 'category' in df.columns:
             category_mappings = self.text_mappings.get('categories', {})
-            df['category'] = df['category'].apply(lambda x: self._map_text_value(x, category_mappings, 'category'))
+            df['category'] = self._map_text_series(df['category'], category_mappings, 'category')
         
         # Validate launch_flag - DROP if invalid
         if 'launch_flag' in df.columns:
@@ -279,7 +940,7 @@ class DataCleaner:
         if 'city' in df.columns:
             # Map variations first
             city_mappings = self.text_mappings.get('cities', {})
-            df['city'] = df['city'].apply(lambda x: self._map_text_value(x, city_mappings, 'city'))
+            df['city'] = self._map_text_series(df['city'], city_mappings, 'city')
             
             # Drop invalid cities
             invalid_mask = ~df['city'].isin(self.VALID_CITIES)
@@ -300,7 +961,7 @@ class DataCleaner:
         if 'channel' in df.columns:
             # Map variations first
             channel_mappings = self.text_mappings.get('channels', {})
-            df['channel'] = df['channel'].apply(lambda x: self._map_text_value(x, channel_mappings, 'channel'))
+            df['channel'] = self._map_text_series(df['channel'], channel_mappings, 'channel')
             
             # Drop invalid channels
             invalid_mask = ~df['channel'].isin(self.VALID_CHANNELS)
@@ -364,14 +1025,69 @@ class DataCleaner:
         
         return df
     
-    def _clean_sales(self, df, products_df, stores_df):
-        """Clean sales dataframe."""
+    def _clean_sales(self, df, products_df, stores_df, pool=None):
+        """Clean sales dataframe (row rules in parallel partitions if a process pool is given)."""
         if df is None or len(df) == 0:
             self.cleaning_report['sales'] = {'original_rows': 0, 'final_rows': 0, 'dropped_rows': 0}
             return pd.DataFrame()
         
         original_count = len(df)
         
+        # Row-local rules, then caps from the whole column, then dedup
+        if pool is not None:
+            df, counts = self._clean_sales_rows_partitioned(df, pool)
+        else:
+            df, counts = self._clean_sales_rows(df)
+        self.sales_summary = self._sales_history_summary(counts)
+        caps = self._sales_caps(counts)
+        df = self._apply_sales_caps(df, caps, counts)
+        df = self._dedup_sales(df, counts)
+        self._log_sales_issues(counts, caps)
+        
+        # Report
+        self.cleaning_report['sales'] = {
+            'original_rows': original_count,
+            'final_rows': len(df),
+            'dropped_rows': original_count - len(df)
+        }
+        
+        return df
+    
+    def _clean_sales_rows_partitioned(self, df, pool):
+        """
+        Run the row-local sales rules on contiguous row partitions in a process pool.
+        
+        Partitions are concatenated and their counts and sketches merged in
+        row order, so the result equals a single _clean_sales_rows call.
+        """
+        partitions = max(1, min(self.workers, len(df) // self.SALES_PARTITION_ROWS))
+        bounds = np.linspace(0, len(df), partitions + 1).astype(int)
+        now = pd.Timestamp.now()
+        settings = self._worker_settings()
+        
+        futures = [
+            pool.submit(_clean_sales_rows_worker, df.iloc[start:end], now, settings)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+        
+        frames = []
+        counts = {}
+        for future in futures:
+            part, part_counts = future.result()
+            frames.append(part)
+            self._merge_counts(counts, part_counts)
+        
+        return pd.concat(frames), counts
+    
+    def _clean_sales_rows(self, df, now=None):
+        """
+        Apply the row-local sales rules (everything that needs no global statistics).
+        
+        Returns the cleaned rows and a dict of issue counts; nothing is logged
+        here so chunks and partitions can be combined before logging.
+        """
+        counts = {}
+        
         # Standardize column names
         df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
         
@@ -396,50 +1112,27 @@ class DataCleaner:
         
         # ===== TIMESTAMP VALIDATION - DROP IF CORRUPTED =====
         if 'order_time' in df.columns:
-            def parse_timestamp(x):
-                if pd.isna(x):
-                    return pd.NaT
-                try:
-                    return pd.to_datetime(x, format='mixed')
-                except:
-                    try:
-                        return pd.to_datetime(x)
-                    except:
-                        return pd.NaT
-            
-            df['order_time'] = df['order_time'].apply(parse_timestamp)
+            df['order_time'] = self._parse_timestamps(df['order_time'])
             
             # Drop NaT (unparseable timestamps)
-            invalid_timestamps = df['order_time'].isna().sum()
-            if invalid_timestamps > 0:
-                self._log_issue('sales', f'{invalid_timestamps} rows', 'INVALID_TIMESTAMP',
-                              f'{invalid_timestamps} orders have corrupted/unparseable timestamps',
-                              'Dropped rows')
+            counts['invalid_timestamps'] = df['order_time'].isna().sum()
+            if counts['invalid_timestamps'] > 0:
                 df = df[df['order_time'].notna()].copy()
-                self.stats['invalid_dropped'] += invalid_timestamps
             
             # Drop dates outside valid range (2020 to current date)
+            counts['current_date'] = now if now is not None else pd.Timestamp.now()
+            counts['future_dates'] = 0
+            counts['old_dates'] = 0
             if len(df) > 0:
-                current_date = pd.Timestamp.now()
-                current_year = current_date.year
-                
                 # Future dates (beyond current date) are outliers
-                future_dates = (df['order_time'] > current_date).sum()
-                if future_dates > 0:
-                    self._log_issue('sales', f'{future_dates} rows', 'FUTURE_DATE_OUTLIER',
-                                  f'{future_dates} orders have future dates (beyond {current_date.strftime("%Y-%m-%d")})',
-                                  'Dropped rows')
-                    df = df[df['order_time'] <= current_date].copy()
-                    self.stats['invalid_dropped'] += future_dates
+                counts['future_dates'] = (df['order_time'] > counts['current_date']).sum()
+                if counts['future_dates'] > 0:
+                    df = df[df['order_time'] <= counts['current_date']].copy()
                 
                 # Very old dates (before 2020) are also outliers
-                old_dates = (df['order_time'].dt.year < 2020).sum()
-                if old_dates > 0:
-                    self._log_issue('sales', f'{old_dates} rows', 'OLD_DATE_OUTLIER',
-                                  f'{old_dates} orders have dates before 2020',
-                                  'Dropped rows')
+                counts['old_dates'] = (df['order_time'].dt.year < 2020).sum()
+                if counts['old_dates'] > 0:
                     df = df[df['order_time'].dt.year >= 2020].copy()
-                    self.stats['invalid_dropped'] += old_dates
         
         # ===== PAYMENT_STATUS VALIDATION - DROP IF INVALID =====
         if 'payment_status' in df.columns:
@@ -453,20 +1146,13 @@ class DataCleaner:
                 lambda x: status_mappings.get(str(x).strip(), str(x).strip().title()) if pd.notna(x) else 'Paid'
             )
             
-            # Drop invalid payment_status
+            # Drop invalid payment_status (counted per value, in order of appearance)
             invalid_mask = ~df['payment_status'].isin(self.VALID_PAYMENT_STATUS)
-            invalid_count = invalid_mask.sum()
-            
-            if invalid_count > 0:
-                invalid_values = df.loc[invalid_mask, 'payment_status'].unique()
-                for val in invalid_values:
-                    val_count = (df['payment_status'] == val).sum()
-                    self._log_issue('sales', f'{val_count} rows', 'INVALID_PAYMENT_STATUS',
-                                  f"payment_status '{val}' not in {self.VALID_PAYMENT_STATUS}",
-                                  f'Dropped {val_count} rows')
-                
+            counts['invalid_payment_status'] = {}
+            if invalid_mask.sum() > 0:
+                for val in df.loc[invalid_mask, 'payment_status'].unique():
+                    counts['invalid_payment_status'][val] = (df['payment_status'] == val).sum()
                 df = df[~invalid_mask].copy()
-                self.stats['invalid_dropped'] += invalid_count
         
         # ===== RETURN_FLAG VALIDATION - FIX (not drop) =====
         if 'return_flag' in df.columns:
@@ -480,104 +1166,204 @@ class DataCleaner:
                     return True
                 return False
             
-            original_invalid = df['return_flag'].apply(lambda x: str(x).strip().lower() not in ['true', 'false', '1', '0', 'yes', 'no', 'y', 'n', 't', 'f', 'nan', 'none', '']).sum()
+            counts['invalid_return_flag'] = df['return_flag'].apply(lambda x: str(x).strip().lower() not in ['true', 'false', '1', '0', 'yes', 'no', 'y', 'n', 't', 'f', 'nan', 'none', '']).sum()
             df['return_flag'] = df['return_flag'].apply(parse_return_flag)
-            
-            if original_invalid > 0:
-                self._log_issue('sales', f'{original_invalid} rows', 'INVALID_RETURN_FLAG',
-                              f'{original_invalid} orders have invalid return_flag',
-                              'Set to False')
-                self.stats['missing_values_fixed'] += original_invalid
         
         # ===== MISSING DISCOUNT_PCT - FIX (set to 0) =====
         if 'discount_pct' in df.columns:
             df['discount_pct'] = pd.to_numeric(df['discount_pct'], errors='coerce')
-            missing_discount = df['discount_pct'].isna().sum()
-            if missing_discount > 0:
+            counts['missing_discount'] = df['discount_pct'].isna().sum()
+            if counts['missing_discount'] > 0:
                 df['discount_pct'] = df['discount_pct'].fillna(0)
-                self._log_issue('sales', f'{missing_discount} rows', 'MISSING_DISCOUNT',
-                              f'{missing_discount} orders missing discount_pct',
-                              'Set to 0')
-                self.stats['missing_values_fixed'] += missing_discount
         
-        # ===== QTY OUTLIERS - CAP (not drop) =====
+        # ===== NEGATIVE QTY - FIX (set to 1) =====
         if 'qty' in df.columns:
             df['qty'] = pd.to_numeric(df['qty'], errors='coerce').fillna(1)
             
-            # Fix negative qty
-            neg_qty = (df['qty'] < 0).sum()
-            if neg_qty > 0:
+            counts['negative_qty'] = (df['qty'] < 0).sum()
+            if counts['negative_qty'] > 0:
                 df.loc[df['qty'] < 0, 'qty'] = 1
-                self._log_issue('sales', f'{neg_qty} rows', 'NEGATIVE_QTY',
-                              f'{neg_qty} orders have negative qty',
-                              'Set to 1')
-                self.stats['outliers_fixed'] += neg_qty
+            counts['qty_sketch'] = self._new_sketch(df['qty'])
+        
+        # ===== PRICE - coerce only; median fill and caps come from the sketches =====
+        if 'selling_price_aed' in df.columns:
+            df['selling_price_aed'] = pd.to_numeric(df['selling_price_aed'], errors='coerce')
+            counts['missing_price'] = df['selling_price_aed'].isna().sum()
+            counts['negative_price'] = (df['selling_price_aed'] < 0).sum()
+            counts['price_sketch'] = self._new_sketch(df['selling_price_aed'])
+            counts['valid_price_sketch'] = self._new_sketch(df['selling_price_aed'][df['selling_price_aed'] >= 0])
+        
+        return df, counts
+    
+    def _sales_history_summary(self, counts):
+        """What incremental batches are cleaned against: cap sketches and fill counts."""
+        return {key: counts[key] for key in
+                ['qty_sketch', 'price_sketch', 'valid_price_sketch', 'missing_price', 'negative_price']
+                if key in counts}
+    
+    def _record_dropped_order_ids(self, dropped_rows):
+        """
+        Remember order_ids of sales rows dropped by the foreign key checks.
+        
+        A full re-clean still deduplicates against these rows, so
+        incremental_state counts their ids as seen. Only the dropped
+        rows are kept, not the whole id column.
+        """
+        if self.sales_summary is None or 'order_id' not in dropped_rows.columns or len(dropped_rows) == 0:
+            return
+        ids = dropped_rows['order_id'].to_numpy(dtype=object)
+        previous = self.sales_summary.get('dropped_order_ids')
+        self.sales_summary['dropped_order_ids'] = ids if previous is None else np.concatenate([previous, ids])
+    
+    def _sales_caps(self, counts):
+        """Compute the global sales statistics (95th percentiles, median price) from the sketches."""
+        caps = {}
+        
+        if 'qty_sketch' in counts:
+            caps['qty_95'] = counts['qty_sketch'].quantile(0.95)
+        
+        if 'price_sketch' in counts:
+            median_price = counts['price_sketch'].median()
+            if pd.isna(median_price):
+                median_price = 100
             
+            # Missing and negative prices are replaced by the median before the 95th percentile
+            filled = counts['valid_price_sketch'].copy()
+            filled.add(median_price, counts.get('missing_price', 0) + counts.get('negative_price', 0))
+            caps['median_price'] = median_price
+            caps['price_95'] = filled.quantile(0.95)
+        
+        return caps
+    
+    def _apply_sales_caps(self, df, caps, counts):
+        """Apply median imputation and outlier caps; adds cap counts to counts."""
+        # ===== QTY OUTLIERS - CAP (not drop) =====
+        if 'qty' in df.columns:
             # Cap high qty outliers at 95th percentile
-            qty_95 = df['qty'].quantile(0.95)
+            qty_95 = caps['qty_95']
             if qty_95 > 0:
                 high_qty = (df['qty'] > qty_95 * 3).sum()
+                counts['high_qty'] = counts.get('high_qty', 0) + high_qty
                 if high_qty > 0:
-                    cap_value = qty_95 * 2
-                    df.loc[df['qty'] > qty_95 * 3, 'qty'] = cap_value
-                    self._log_issue('sales', f'{high_qty} rows', 'OUTLIER_QTY',
-                                  f'{high_qty} orders have extreme qty values',
-                                  f'Capped at {cap_value:.0f}')
-                    self.stats['outliers_fixed'] += high_qty
+                    df.loc[df['qty'] > qty_95 * 3, 'qty'] = qty_95 * 2
         
         # ===== PRICE OUTLIERS - CAP (not drop) =====
         if 'selling_price_aed' in df.columns:
-            df['selling_price_aed'] = pd.to_numeric(df['selling_price_aed'], errors='coerce')
-            
             # Fill missing with median
-            median_price = df['selling_price_aed'].median()
-            if pd.isna(median_price):
-                median_price = 100
+            median_price = caps['median_price']
             df['selling_price_aed'] = df['selling_price_aed'].fillna(median_price)
             
             # Fix negative price
             neg_price = (df['selling_price_aed'] < 0).sum()
             if neg_price > 0:
                 df.loc[df['selling_price_aed'] < 0, 'selling_price_aed'] = median_price
-                self._log_issue('sales', f'{neg_price} rows', 'NEGATIVE_PRICE',
-                              f'{neg_price} orders have negative price',
-                              'Set to median')
-                self.stats['outliers_fixed'] += neg_price
             
             # Cap high price outliers
-            price_95 = df['selling_price_aed'].quantile(0.95)
+            price_95 = caps['price_95']
             if price_95 > 0:
                 high_price = (df['selling_price_aed'] > price_95 * 5).sum()
+                counts['high_price'] = counts.get('high_price', 0) + high_price
                 if high_price > 0:
-                    cap_value = price_95 * 3
-                    df.loc[df['selling_price_aed'] > price_95 * 5, 'selling_price_aed'] = cap_value
-                    self._log_issue('sales', f'{high_price} rows', 'OUTLIER_PRICE',
-                                  f'{high_price} orders have extreme price values',
-                                  f'Capped at {cap_value:.0f}')
-                    self.stats['outliers_fixed'] += high_price
+                    df.loc[df['selling_price_aed'] > price_95 * 5, 'selling_price_aed'] = price_95 * 3
         
+        return df
+    
+    def _dedup_sales(self, df, counts):
+        """Drop duplicate order_ids, keeping the latest by timestamp (the later row on ties)."""
         # ===== DUPLICATE ORDER_ID - KEEP LATEST =====
         if 'order_id' in df.columns:
             before_dedup = len(df)
             if 'order_time' in df.columns:
-                df = df.sort_values('order_time', ascending=False)
+                # Stable sort of the reversed rows: among equal timestamps the later row comes first
+                df = df.iloc[::-1].sort_values('order_time', ascending=False, kind='mergesort')
             df = df.drop_duplicates(subset=['order_id'], keep='first')
-            dups_removed = before_dedup - len(df)
-            if dups_removed > 0:
-                self.stats['duplicates_removed'] += dups_removed
-                self._log_issue('sales', f'{dups_removed} rows', 'DUPLICATE_ORDER_ID',
-                              f'{dups_removed} duplicate order_ids found',
-                              'Kept latest by timestamp')
-        
-        # Report
-        self.cleaning_report['sales'] = {
-            'original_rows': original_count,
-            'final_rows': len(df),
-            'dropped_rows': original_count - len(df)
-        }
+            counts['duplicates'] = before_dedup - len(df)
         
         return df
     
+    def _log_sales_issues(self, counts, caps):
+        """Log sales issues and update stats from accumulated counts, in rule order."""
+        invalid_timestamps = counts.get('invalid_timestamps', 0)
+        if invalid_timestamps > 0:
+            self._log_issue('sales', f'{invalid_timestamps} rows', 'INVALID_TIMESTAMP',
+                          f'{invalid_timestamps} orders have corrupted/unparseable timestamps',
+                          'Dropped rows')
+            self.stats['invalid_dropped'] += invalid_timestamps
+        
+        future_dates = counts.get('future_dates', 0)
+        if future_dates > 0:
+            self._log_issue('sales', f'{future_dates} rows', 'FUTURE_DATE_OUTLIER',
+                          f'{future_dates} orders have future dates (beyond {counts["current_date"].strftime("%Y-%m-%d")})',
+                          'Dropped rows')
+            self.stats['invalid_dropped'] += future_dates
+        
+        old_dates = counts.get('old_dates', 0)
+        if old_dates > 0:
+            self._log_issue('sales', f'{old_dates} rows', 'OLD_DATE_OUTLIER',
+                          f'{old_dates} orders have dates before 2020',
+                          'Dropped rows')
+            self.stats['invalid_dropped'] += old_dates
+        
+        invalid_statuses = counts.get('invalid_payment_status', {})
+        for val, val_count in invalid_statuses.items():
+            self._log_issue('sales', f'{val_count} rows', 'INVALID_PAYMENT_STATUS',
+                          f"payment_status '{val}' not in {self.VALID_PAYMENT_STATUS}",
+                          f'Dropped {val_count} rows')
+        if invalid_statuses:
+            self.stats['invalid_dropped'] += sum(invalid_statuses.values())
+        
+        invalid_return_flag = counts.get('invalid_return_flag', 0)
+        if invalid_return_flag > 0:
+            self._log_issue('sales', f'{invalid_return_flag} rows', 'INVALID_RETURN_FLAG',
+                          f'{invalid_return_flag} orders have invalid return_flag',
+                          'Set to False')
+            self.stats['missing_values_fixed'] += invalid_return_flag
+        
+        missing_discount = counts.get('missing_discount', 0)
+        if missing_discount > 0:
+            self._log_issue('sales', f'{missing_discount} rows', 'MISSING_DISCOUNT',
+                          f'{missing_discount} orders missing discount_pct',
+                          'Set to 0')
+            self.stats['missing_values_fixed'] += missing_discount
+        
+        neg_qty = counts.get('negative_qty', 0)
+        if neg_qty > 0:
+            self._log_issue('sales', f'{neg_qty} rows', 'NEGATIVE_QTY',
+                          f'{neg_qty} orders have negative qty',
+                          'Set to 1')
+            self.stats['outliers_fixed'] += neg_qty
+        
+        high_qty = counts.get('high_qty', 0)
+        if high_qty > 0:
+            self._log_issue('sales', f'{high_qty} rows', 'OUTLIER_QTY',
+                          f'{high_qty} orders have extreme qty values',
+                          f'Capped at {caps["qty_95"] * 2:.0f}')
+            self.stats['outliers_fixed'] += high_qty
+        
+        neg_price = counts.get('negative_price', 0)
+        if 'median_price' in caps and caps['median_price'] < 0:
+            # Missing prices were filled with a negative median
+            neg_price += counts.get('missing_price', 0)
+        if neg_price > 0:
+            self._log_issue('sales', f'{neg_price} rows', 'NEGATIVE_PRICE',
+                          f'{neg_price} orders have negative price',
+                          'Set to median')
+            self.stats['outliers_fixed'] += neg_price
+        
+        high_price = counts.get('high_price', 0)
+        if high_price > 0:
+            self._log_issue('sales', f'{high_price} rows', 'OUTLIER_PRICE',
+                          f'{high_price} orders have extreme price values',
+                          f'Capped at {caps["price_95"] * 3:.0f}')
+            self.stats['outliers_fixed'] += high_price
+        
+        dups_removed = counts.get('duplicates', 0)
+        if dups_removed > 0:
+            self.stats['duplicates_removed'] += dups_removed
+            self._log_issue('sales', f'{dups_removed} rows', 'DUPLICATE_ORDER_ID',
+                          f'{dups_removed} duplicate order_ids found',
+                          'Kept latest by timestamp')
+    
     def _clean_inventory(self, df, products_df, stores_df):
         """Clean inventory dataframe."""
         if df is None or len(df) == 0:
@@ -586,6 +1372,26 @@ class DataCleaner:
         
         original_count = len(df)
         
+        # Row-local rules, then caps from the whole column, then dedup
+        df, counts = self._clean_inventory_rows(df)
+        caps = self._inventory_caps(counts)
+        df = self._apply_inventory_caps(df, caps, counts)
+        df = self._dedup_inventory(df, counts)
+        self._log_inventory_issues(counts, caps)
+        
+        # Report
+        self.cleaning_report['inventory'] = {
+            'original_rows': original_count,
+            'final_rows': len(df),
+            'dropped_rows': original_count - len(df)
+        }
+        
+        return df
+    
+    def _clean_inventory_rows(self, df):
+        """Apply the row-local inventory rules. Returns the rows and a dict of issue counts."""
+        counts = {}
+        
         # Standardize column names
         df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
         
@@ -607,166 +1413,188 @@ class DataCleaner:
         if 'stock_on_hand' in df.columns:
             df['stock_on_hand'] = pd.to_numeric(df['stock_on_hand'], errors='coerce').fillna(0)
             
-            neg_stock = (df['stock_on_hand'] < 0).sum()
-            if neg_stock > 0:
+            counts['negative_stock'] = (df['stock_on_hand'] < 0).sum()
+            if counts['negative_stock'] > 0:
                 df.loc[df['stock_on_hand'] < 0, 'stock_on_hand'] = 0
-                self._log_issue('inventory', f'{neg_stock} rows', 'NEGATIVE_STOCK',
-                              f'{neg_stock} inventory records have negative stock',
-                              'Set to 0')
-                self.stats['outliers_fixed'] += neg_stock
-            
-            # Cap extreme stock values (like 9999)
-            stock_95 = df['stock_on_hand'].quantile(0.95)
-            if stock_95 > 0:
-                extreme_stock = (df['stock_on_hand'] > stock_95 * 5).sum()
-                if extreme_stock > 0:
-                    cap_value = stock_95 * 3
-                    df.loc[df['stock_on_hand'] > stock_95 * 5, 'stock_on_hand'] = cap_value
-                    self._log_issue('inventory', f'{extreme_stock} rows', 'EXTREME_STOCK',
-                                  f'{extreme_stock} inventory records have extreme stock values',
-                                  f'Capped at {cap_value:.0f}')
-                    self.stats['outliers_fixed'] += extreme_stock
+            counts['stock_sketch'] = self._new_sketch(df['stock_on_hand'])
         
         # Handle missing values
         if 'reorder_point' in df.columns:
             df['reorder_point'] = pd.to_numeric(df['reorder_point'], errors='coerce')
-            missing = df['reorder_point'].isna().sum()
-            if missing > 0:
+            counts['missing_reorder_point'] = df['reorder_point'].isna().sum()
+            if counts['missing_reorder_point'] > 0:
                 df['reorder_point'] = df['reorder_point'].fillna(10)
-                self._log_issue('inventory', f'{missing} rows', 'MISSING_REORDER_POINT',
-                              f'{missing} records missing reorder_point',
-                              'Set to 10')
-                self.stats['missing_values_fixed'] += missing
         
         if 'lead_time_days' in df.columns:
             df['lead_time_days'] = pd.to_numeric(df['lead_time_days'], errors='coerce')
-            missing = df['lead_time_days'].isna().sum()
-            if missing > 0:
+            counts['missing_lead_time'] = df['lead_time_days'].isna().sum()
+            if counts['missing_lead_time'] > 0:
                 df['lead_time_days'] = df['lead_time_days'].fillna(3)
-                self._log_issue('inventory', f'{missing} rows', 'MISSING_LEAD_TIME',
-                              f'{missing} records missing lead_time_days',
-                              'Set to 3')
-                self.stats['missing_values_fixed'] += missing
         
-        # Remove duplicates
+        return df, counts
+    
+    def _inventory_caps(self, counts):
+        """Compute the global inventory statistics (stock 95th percentile) from the sketches."""
+        caps = {}
+        if 'stock_sketch' in counts:
+            caps['stock_95'] = counts['stock_sketch'].quantile(0.95)
+        return caps
+    
+    def _apply_inventory_caps(self, df, caps, counts):
+        """Cap extreme stock values; adds cap counts to counts."""
+        # Cap extreme stock values (like 9999)
+        if 'stock_on_hand' in df.columns:
+            stock_95 = caps['stock_95']
+            if stock_95 > 0:
+                extreme_stock = (df['stock_on_hand'] > stock_95 * 5).sum()
+                counts['extreme_stock'] = counts.get('extreme_stock', 0) + extreme_stock
+                if extreme_stock > 0:
+                    df.loc[df['stock_on_hand'] > stock_95 * 5, 'stock_on_hand'] = stock_95 * 3
+        
+        return df
+    
+    def _inventory_key_columns(self, df):
+        """Return the inventory dedup key columns present, or None if fewer than two."""
         key_cols = ['sku', 'store_id', 'snapshot_date']
         key_cols_present = [col for col in key_cols if col in df.columns]
-        if len(key_cols_present) >= 2:
+        return key_cols_present if len(key_cols_present) >= 2 else None
+    
+    def _dedup_inventory(self, df, counts):
+        """Drop duplicate inventory records, keeping the last one."""
+        key_cols_present = self._inventory_key_columns(df)
+        if key_cols_present:
             before_dedup = len(df)
             df = df.drop_duplicates(subset=key_cols_present, keep='last')
-            dups_removed = before_dedup - len(df)
-            if dups_removed > 0:
-                self.stats['duplicates_removed'] += dups_removed
-                self._log_issue('inventory', f'{dups_removed} rows', 'DUPLICATE_INVENTORY',
-                              f'{dups_removed} duplicate inventory records',
-                              'Kept latest')
-        
-        # Report
-        self.cleaning_report['inventory'] = {
-            'original_rows': original_count,
-            'final_rows': len(df),
-            'dropped_rows': original_count - len(df)
-        }
+            counts['duplicates'] = before_dedup - len(df)
         
         return df
     
-    def _validate_foreign_keys_sales(self, sales_df, products_df, stores_df):
-        """Validate and drop sales with invalid foreign keys."""
-        if sales_df is None or len(sales_df) == 0:
-            return sales_df
-        
-        original_count = len(sales_df)
-        invalid_sku_count = 0
-        invalid_store_count = 0
-        
-        # Check SKU exists in products
-        if 'sku' in sales_df.columns and products_df is not None and len(products_df) > 0 and 'sku' in products_df.columns:
+    def _log_inventory_issues(self, counts, caps):
+        """Log inventory issues and update stats from accumulated counts, in rule order."""
+        neg_stock = counts.get('negative_stock', 0)
+        if neg_stock > 0:
+            self._log_issue('inventory', f'{neg_stock} rows', 'NEGATIVE_STOCK',
+                          f'{neg_stock} inventory records have negative stock',
+                          'Set to 0')
+            self.stats['outliers_fixed'] += neg_stock
+        
+        extreme_stock = counts.get('extreme_stock', 0)
+        if extreme_stock > 0:
+            self._log_issue('inventory', f'{extreme_stock} rows', 'EXTREME_STOCK',
+                          f'{extreme_stock} inventory records have extreme stock values',
+                          f'Capped at {caps["stock_95"] * 3:.0f}')
+            self.stats['outliers_fixed'] += extreme_stock
+        
+        missing = counts.get('missing_reorder_point', 0)
+        if missing > 0:
+            self._log_issue('inventory', f'{missing} rows', 'MISSING_REORDER_POINT',
+                          f'{missing} records missing reorder_point',
+                          'Set to 10')
+            self.stats['missing_values_fixed'] += missing
+        
+        missing = counts.get('missing_lead_time', 0)
+        if missing > 0:
+            self._log_issue('inventory', f'{missing} rows', 'MISSING_LEAD_TIME',
+                          f'{missing} records missing lead_time_days',
+                          'Set to 3')
+            self.stats['missing_values_fixed'] += missing
+        
+        dups_removed = counts.get('duplicates', 0)
+        if dups_removed > 0:
+            self.stats['duplicates_removed'] += dups_removed
+            self._log_issue('inventory', f'{dups_removed} rows', 'DUPLICATE_INVENTORY',
+                          f'{dups_removed} duplicate inventory records',
+                          'Kept latest')
+    
+    def _foreign_key_sets(self, products_df, stores_df):
+        """Return the valid SKU and store_id sets (None when a table cannot be checked)."""
+        valid_skus = None
+        valid_stores = None
+        if products_df is not None and len(products_df) > 0 and 'sku' in products_df.columns:
             valid_skus = set(products_df['sku'].unique())
-            invalid_sku_mask = ~sales_df['sku'].isin(valid_skus)
-            invalid_sku_count = invalid_sku_mask.sum()
-            
-            if invalid_sku_count > 0:
-                self._log_issue('sales', f'{invalid_sku_count} rows', 'INVALID_SKU_FK',
-                              f'{invalid_sku_count} sales reference non-existent SKUs',
-                              'Dropped rows')
-                sales_df = sales_df[~invalid_sku_mask].copy()
-                self.stats['invalid_dropped'] += invalid_sku_count
-        
-        # Check store_id exists in stores
-        if 'store_id' in sales_df.columns and stores_df is not None and len(stores_df) > 0 and 'store_id' in stores_df.columns:
+        if stores_df is not None and len(stores_df) > 0 and 'store_id' in stores_df.columns:
             valid_stores = set(stores_df['store_id'].unique())
-            invalid_store_mask = ~sales_df['store_id'].isin(valid_stores)
-            invalid_store_count = invalid_store_mask.sum()
-            
-            if invalid_store_count > 0:
-                self._log_issue('sales', f'{invalid_store_count} rows', 'INVALID_STORE_FK',
-                              f'{invalid_store_count} sales reference non-existent stores',
-                              'Dropped rows')
-                sales_df = sales_df[~invalid_store_mask].copy()
-                self.stats['invalid_dropped'] += invalid_store_count
-        
-        # Update report
-        if 'sales' in self.cleaning_report:
-            dropped_before = self.cleaning_report['sales'].get('dropped_rows', 0)
-            self.cleaning_report['sales']['final_rows'] = len(sales_df)
-            self.cleaning_report['sales']['dropped_rows'] = original_count - len(sales_df) + dropped_before
-        
-        self.cleaning_report['foreign_key_issues'] = {
-            'invalid_skus': invalid_sku_count,
-            'invalid_stores': invalid_store_count
-        }
-        
-        return sales_df
+        return valid_skus, valid_stores
     
-    def _validate_foreign_keys_inventory(self, inventory_df, products_df, stores_df):
-        """Validate and drop inventory with invalid foreign keys."""
-        if inventory_df is None or len(inventory_df) == 0:
-            return inventory_df
+    def _foreign_key_violations(self, df, valid_skus, valid_stores):
+        """
+        Return boolean masks of rows with an unknown SKU, and of the remaining
+        rows with an unknown store_id (SKU violations are dropped first).
+        """
+        invalid_sku = np.zeros(len(df), dtype=bool)
+        invalid_store = np.zeros(len(df), dtype=bool)
         
-        original_count = len(inventory_df)
-        invalid_sku_count = 0
-        invalid_store_count = 0
+        if 'sku' in df.columns and valid_skus is not None:
+            invalid_sku = ~df['sku'].isin(valid_skus).to_numpy()
+        if 'store_id' in df.columns and valid_stores is not None:
+            invalid_store = ~df['store_id'].isin(valid_stores).to_numpy() & ~invalid_sku
         
-        # Check SKU exists in products
-        if 'sku' in inventory_df.columns and products_df is not None and len(products_df) > 0 and 'sku' in products_df.columns:
-            valid_skus = set(products_df['sku'].unique())
-            invalid_sku_mask = ~inventory_df['sku'].isin(valid_skus)
-            invalid_sku_count = invalid_sku_mask.sum()
-            
-            if invalid_sku_count > 0:
-                self._log_issue('inventory', f'{invalid_sku_count} rows', 'INVALID_SKU_FK',
-                              f'{invalid_sku_count} inventory records reference non-existent SKUs',
-                              'Dropped rows')
-                inventory_df = inventory_df[~invalid_sku_mask].copy()
-                self.stats['invalid_dropped'] += invalid_sku_count
-        
-        # Check store_id exists in stores
-        if 'store_id' in inventory_df.columns and stores_df is not None and len(stores_df) > 0 and 'store_id' in stores_df.columns:
-            valid_stores = set(stores_df['store_id'].unique())
-            invalid_store_mask = ~inventory_df['store_id'].isin(valid_stores)
-            invalid_store_count = invalid_store_mask.sum()
-            
-            if invalid_store_count > 0:
-                self._log_issue('inventory', f'{invalid_store_count} rows', 'INVALID_STORE_FK',
-                              f'{invalid_store_count} inventory records reference non-existent stores',
-                              'Dropped rows')
-                inventory_df = inventory_df[~invalid_store_mask].copy()
-                self.stats['invalid_dropped'] += invalid_store_count
+        return invalid_sku, invalid_store
+    
+    def _log_foreign_key_issues(self, table, invalid_sku_count, invalid_store_count, original_count, final_count):
+        """Log foreign key violations for sales or inventory and update the cleaning report."""
+        self._log_foreign_key_violations(table, invalid_sku_count, invalid_store_count)
         
         # Update report
-        if 'inventory' in self.cleaning_report:
-            dropped_before = self.cleaning_report['inventory'].get('dropped_rows', 0)
-            self.cleaning_report['inventory']['final_rows'] = len(inventory_df)
-            self.cleaning_report['inventory']['dropped_rows'] = original_count - len(inventory_df) + dropped_before
+        if table in self.cleaning_report:
+            dropped_before = self.cleaning_report[table].get('dropped_rows', 0)
+            self.cleaning_report[table]['final_rows'] = final_count
+            self.cleaning_report[table]['dropped_rows'] = original_count - final_count + dropped_before
+        
+        if table == 'sales':
+            self.cleaning_report['foreign_key_issues'] = {
+                'invalid_skus': invalid_sku_count,
+                'invalid_stores': invalid_store_count
+            }
+        else:
+            # Update foreign key issues (add to existing)
+            if 'foreign_key_issues' not in self.cleaning_report:
+                self.cleaning_report['foreign_key_issues'] = {}
+            
+            self.cleaning_report['foreign_key_issues']['invalid_skus_inventory'] = invalid_sku_count
+            self.cleaning_report['foreign_key_issues']['invalid_stores_inventory'] = invalid_store_count
+    
+    def _log_foreign_key_violations(self, table, invalid_sku_count, invalid_store_count):
+        """Log foreign key violations for sales or inventory."""
+        records = 'sales' if table == 'sales' else 'inventory records'
+        
+        if invalid_sku_count > 0:
+            self._log_issue(table, f'{invalid_sku_count} rows', 'INVALID_SKU_FK',
+                          f'{invalid_sku_count} {records} reference non-existent SKUs',
+                          'Dropped rows')
+            self.stats['invalid_dropped'] += invalid_sku_count
+        
+        if invalid_store_count > 0:
+            self._log_issue(table, f'{invalid_store_count} rows', 'INVALID_STORE_FK',
+                          f'{invalid_store_count} {records} reference non-existent stores',
+                          'Dropped rows')
+            self.stats['invalid_dropped'] += invalid_store_count
+    
+    def _validate_foreign_keys(self, table, df, products_df, stores_df):
+        """Validate and drop rows with invalid foreign keys."""
+        if df is None or len(df) == 0:
+            return df
         
-        # Update foreign key issues (add to existing)
-        if 'foreign_key_issues' not in self.cleaning_report:
-            self.cleaning_report['foreign_key_issues'] = {}
+        original_count = len(df)
+        valid_skus, valid_stores = self._foreign_key_sets(products_df, stores_df)
+        invalid_sku, invalid_store = self._foreign_key_violations(df, valid_skus, valid_stores)
         
-        self.cleaning_report['foreign_key_issues']['invalid_skus_inventory'] = invalid_sku_count
-        self.cleaning_report['foreign_key_issues']['invalid_stores_inventory'] = invalid_store_count
+        invalid_mask = invalid_sku | invalid_store
+        if table == 'sales':
+            self._record_dropped_order_ids(df[invalid_mask])
+        if invalid_mask.any():
+            df = df[~invalid_mask].copy()
         
-        return inventory_df
+        self._log_foreign_key_issues(table, invalid_sku.sum(), invalid_store.sum(), original_count, len(df))
+        return df
+    
+    def _validate_foreign_keys_sales(self, sales_df, products_df, stores_df):
+        """Validate and drop sales with invalid foreign keys."""
+        return self._validate_foreign_keys('sales', sales_df, products_df, stores_df)
+    
+    def _validate_foreign_keys_inventory(self, inventory_df, products_df, stores_df):
+        """Validate and drop inventory with invalid foreign keys."""
+        return self._validate_foreign_keys('inventory', inventory_df, products_df, stores_df)
     
     def get_issues_df(self):
         """Return issues as a DataFrame in required format."""
@@ -822,3 +1650,31 @@ class DataCleaner:
     def get_cleaning_report(self):
         """Return detailed cleaning report."""
         return self.cleaning_report
+
+
+def _worker_cleaner(settings):
+    """Build a sequential cleaner in a worker process from the parent's settings."""
+    cleaner = DataCleaner(quantile_error=settings['quantile_error'])
+    cleaner.text_mappings = settings['text_mappings']
+    return cleaner
+
+
+def _clean_table_worker(table, df, settings):
+    """Clean one table in a worker process; returns the frame and that table's logs."""
+    cleaner = _worker_cleaner(settings)
+    
+    if table == 'products':
+        clean_df = cleaner._clean_products(df)
+    elif table == 'stores':
+        clean_df = cleaner._clean_stores(df)
+    elif table == 'sales':
+        clean_df = cleaner._clean_sales(df, None, None)
+    else:
+        clean_df = cleaner._clean_inventory(df, None, None)
+    
+    return clean_df, cleaner.issues, cleaner.stats, cleaner.cleaning_report
+
+
+def _clean_sales_rows_worker(df, now, settings):
+    """Apply the row-local sales rules to one partition in a worker process."""
+    return _worker_cleaner(settings)._clean_sales_rows(df, now)
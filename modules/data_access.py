@@ -0,0 +1,194 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Cached Data Access Layer
+# ============================================================================
+
+import hashlib
+import uuid
+
+import streamlit as st
+
+from .filters import FilterEngine
+from .simulator import Simulator
+
+DATASET_NAMES = ['products', 'stores', 'sales', 'inventory']
+
+# Bounds for the Streamlit caches (entries are per dataset version x filters)
+CACHE_MAX_ENTRIES = 32
+RESOURCE_MAX_ENTRIES = 4
+
+
+def new_fingerprint():
+    """Random fingerprint for data with no stable source (e.g. generated samples)."""
+    return uuid.uuid4().hex
+
+
+def file_fingerprint(uploaded_file):
+    """Fingerprint an uploaded file by hashing its bytes."""
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+
+def derived_fingerprint(parent_fingerprints, config=''):
+    """Fingerprint of data derived from other datasets by a deterministic step (e.g. cleaning)."""
+    digest = hashlib.sha256()
+    for fingerprint in parent_fingerprints:
+        digest.update(str(fingerprint).encode('utf-8'))
+        digest.update(b'|')
+    digest.update(config.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def set_dataset(stage, name, df, fingerprint=None):
+    """
+    Place a frame in session state as <stage>_<name> together with its fingerprint.
+    
+    stage is 'raw' or 'clean' and name one of DATASET_NAMES. Without a
+    fingerprint a random one is assigned, so the frame never shares cache
+    entries with other data.
+    """
+    key = f'{stage}_{name}'
+    st.session_state[key] = df
+    st.session_state.dataset_fingerprints[key] = fingerprint or new_fingerprint()
+
+
+def dataset_fingerprints(stage):
+    """Fingerprints of the four frames of a stage, in DATASET_NAMES order."""
+    fingerprints = st.session_state.dataset_fingerprints
+    return tuple(fingerprints.get(f'{stage}_{name}') for name in DATASET_NAMES)
+
+
+def dataset_version():
+    """
+    Return the version of the dataset the pages currently read.
+    
+    This is the stage plus the fingerprints of its four frames. Cached
+    artifacts are keyed on it instead of hashing the DataFrames on every
+    rerun. Fingerprints are assigned when data is uploaded, generated or
+    cleaned, so any of those events changes the version.
+    """
+    stage = 'clean' if st.session_state.is_cleaned else 'raw'
+    return (stage,) + dataset_fingerprints(stage)
+
+
+@st.cache_resource(max_entries=RESOURCE_MAX_ENTRIES, show_spinner=False)
+def get_filter_engine(version, _sales_df, _stores_df, _products_df, _inventory_df):
+    """Filter engine for a dataset version (frames are not hashed)."""
+    return FilterEngine(_sales_df, _stores_df, _products_df, _inventory_df)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def get_dashboard_kpis(version, filter_key, _sales_df, _stores_df, _products_df):
+    """
+    KPI artifacts for the dashboard, keyed by dataset version and filter state.
+    
+    Returns a dict with kpis, kpi_cube, city_kpis, channel_kpis,
+    category_kpis and daily_rollup. The frames passed in must be the
+    filtered view that filter_key describes.
+    """
+    sim = Simulator()
+    
+    # Build the joined sales fact table once; every KPI call below reuses it
+    sim.get_fact_table(_sales_df, _stores_df, _products_df)
+    
+    # One grouped pass for city x channel x category; per-dimension KPIs are rollups
+    kpi_cube = sim.calculate_kpi_cube(_sales_df, _stores_df, _products_df)
+    
+    return {
+        'kpis': sim.calculate_overall_kpis(_sales_df, _products_df),
+        'kpi_cube': kpi_cube,
+        'city_kpis': sim.rollup_kpi_cube(kpi_cube, ['city']),
+        'channel_kpis': sim.rollup_kpi_cube(kpi_cube, ['channel']),
+        'category_kpis': sim.rollup_kpi_cube(kpi_cube, ['category']),
+        'daily_rollup': sim.calculate_daily_rollup(_sales_df, _stores_df, _products_df),
+    }
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def get_analytics_tables(version, _sales_df, _stores_df, _products_df, _inventory_df):
+    """Trend, dimension and inventory risk tables for the analytics page."""
+    sim = Simulator()
+    sim.get_fact_table(_sales_df, _stores_df, _products_df)
+    
+    return {
+        'daily_trends': sim.calculate_daily_trends(_sales_df, _products_df),
+        'city_kpis': sim.calculate_kpis_by_dimension(_sales_df, _stores_df, _products_df, 'city'),
+        'category_kpis': sim.calculate_kpis_by_dimension(_sales_df, _stores_df, _products_df, 'category'),
+        'stockout': sim.calculate_stockout_risk(_inventory_df),
+    }
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def get_elasticity_estimates(version, dimensions, _sales_df, _stores_df, _products_df):
+    """Elasticities fitted from sales data (see Simulator.estimate_elasticities)."""
+    return Simulator().estimate_elasticities(_sales_df, _stores_df, _products_df, dimensions=dimensions)
+
+
+@st.cache_resource(max_entries=RESOURCE_MAX_ENTRIES, show_spinner=False)
+def get_simulator(version, use_estimated_elasticity, _sales_df, _stores_df, _products_df,
+                  baseline_method='run_rate', weekday_seasonality=False):
+    """
+    Simulator for a dataset version with its fact table already built.
+    
+    With use_estimated_elasticity, the overall and per-category elasticities
+    fitted from the data replace the built-in defaults where a fit exists.
+    baseline_method and weekday_seasonality set how campaign baselines are
+    measured. The simulator is shared by every session, so its fact table,
+    baseline table and (for the forecast method) forecaster are filled here
+    before it is returned; later lazy fills, such as inventory supply,
+    happen under the simulator's cache lock. Its caches are keyed on
+    version rather than on frame identity, since each session passes its
+    own frame objects for the same dataset.
+    """
+    sim = Simulator()
+    sim.dataset_version = version
+    sim.baseline_method = baseline_method
+    sim.weekday_seasonality = weekday_seasonality
+    if use_estimated_elasticity:
+        sim.apply_elasticities(get_elasticity_estimates(version, (), _sales_df, _stores_df, _products_df))
+        sim.apply_elasticities(get_elasticity_estimates(version, ('category',), _sales_df, _stores_df, _products_df))
+    sim.get_fact_table(_sales_df, _stores_df, _products_df)
+    sim.get_baseline_table(_sales_df, _stores_df, _products_df)
+    if baseline_method == 'forecast':
+        sim.fit_baseline_forecast(_sales_df, _stores_df, _products_df)
+    return sim
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def get_campaign_grid(version, discount_pcts, promo_budgets, margin_floors, campaign_days,
+                      city, channel, category, _sales_df, _stores_df, _products_df,
+                      use_estimated_elasticity=False, baseline_method='run_rate', weekday_seasonality=False):
+    """Campaign scenario grid (see Simulator.simulate_campaign_grid), keyed by dataset version and inputs."""
+    sim = get_simulator(version, use_estimated_elasticity, _sales_df, _stores_df, _products_df,
+                        baseline_method=baseline_method, weekday_seasonality=weekday_seasonality)
+    return sim.simulate_campaign_grid(
+        _sales_df, _stores_df, _products_df,
+        discount_pcts=discount_pcts,
+        promo_budgets=promo_budgets,
+        margin_floors=margin_floors,
+        campaign_days=campaign_days,
+        city=city,
+        channel=channel,
+        category=category
+    )
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def get_campaign_uncertainty(version, discount_pct, promo_budget, margin_floor, campaign_days,
+                             city, channel, category, _sales_df, _stores_df, _products_df,
+                             use_estimated_elasticity=False, baseline_method='run_rate', weekday_seasonality=False,
+                             n_draws=10000):
+    """Monte Carlo campaign bands (see Simulator.simulate_campaign_uncertainty) with a fixed seed."""
+    sim = get_simulator(version, use_estimated_elasticity, _sales_df, _stores_df, _products_df,
+                        baseline_method=baseline_method, weekday_seasonality=weekday_seasonality)
+    return sim.simulate_campaign_uncertainty(
+        _sales_df, _stores_df, _products_df,
+        discount_pct=discount_pct,
+        promo_budget=promo_budget,
+        margin_floor=margin_floor,
+        city=city,
+        channel=channel,
+        category=category,
+        campaign_days=campaign_days,
+        n_draws=n_draws,
+        seed=0
+    )
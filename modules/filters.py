@@ -0,0 +1,234 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Dashboard Filter Engine
+# ============================================================================
+
+import numpy as np
+import pandas as pd
+
+
+class FilterEngine:
+    """
+    Precomputed row indexes for the dashboard's global filters.
+    
+    Built once per dataset. Sales and inventory rows are grouped into sorted
+    posting lists per store and per SKU, and sales rows are also sorted by
+    order time. A filter combination then starts from the smallest candidate
+    list (one date range slice or the posting lists of the allowed keys) and
+    checks the other constraints by array lookups on those rows only, so the
+    cost follows the selected rows rather than rows x filters. Results are
+    row positions; frames are only sliced when a caller asks for them.
+    
+    Semantics match the original mask-based filters: stores and products are
+    filtered on their attributes, and fact rows are kept when their store_id
+    and sku belong to the remaining stores and products.
+    """
+    
+    def __init__(self, sales_df, stores_df=None, products_df=None, inventory_df=None):
+        """Build the indexes for a dataset."""
+        self.sales_df = sales_df
+        self.stores_df = stores_df
+        self.products_df = products_df
+        self.inventory_df = inventory_df
+        
+        self._store_keys = self._dimension_keys(stores_df, 'store_id')
+        self._sku_keys = self._dimension_keys(products_df, 'sku')
+        
+        self._sales_index = self._fact_index(sales_df)
+        self._inventory_index = self._fact_index(inventory_df)
+        self._time_index = self._build_time_index(sales_df)
+    
+    def _dimension_keys(self, df, key_col):
+        """Factorize a dimension's key column; missing keys share one code."""
+        if df is None or key_col not in df.columns:
+            return None
+        
+        keys = pd.Series(df[key_col].to_numpy(dtype=object))
+        codes, uniques = pd.factorize(keys, use_na_sentinel=True)
+        na_code = len(uniques)
+        codes = np.where(codes < 0, na_code, codes)
+        return {'column': key_col, 'uniques': pd.Index(uniques, dtype=object),
+                'row_codes': codes, 'n_keys': na_code + 1}
+    
+    def _key_codes(self, values, keys):
+        """Map fact key values to dimension key codes (-1 if not in the dimension)."""
+        uniques = keys['uniques']
+        na_code = keys['n_keys'] - 1
+        
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Translate the (small) category dictionary once, then gather by code
+            category_codes = uniques.get_indexer(values.cat.categories.astype(object))
+            codes = values.cat.codes.to_numpy()
+            return np.where(codes < 0, na_code, category_codes[codes])
+        
+        codes = uniques.get_indexer(pd.Index(values.to_numpy(dtype=object)))
+        codes[values.isna().to_numpy()] = na_code
+        return codes
+    
+    def _posting_lists(self, codes, n_keys):
+        """Sorted row positions per key code, as one ordering plus offsets."""
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes[codes >= 0], minlength=n_keys)
+        # Unmatched rows (-1) sort first; skip them
+        start = int((codes < 0).sum())
+        offsets = start + np.concatenate([[0], np.cumsum(counts)])
+        return {'codes': codes, 'order': order, 'offsets': offsets, 'counts': counts}
+    
+    def _fact_index(self, df):
+        """Build store and SKU posting lists for a fact table."""
+        if df is None:
+            return None
+        
+        index = {'n_rows': len(df)}
+        for name, keys in [('store', self._store_keys), ('sku', self._sku_keys)]:
+            if keys is not None and keys['column'] in df.columns:
+                codes = self._key_codes(df[keys['column']], keys)
+                index[name] = self._posting_lists(codes, keys['n_keys'])
+        return index
+    
+    def _build_time_index(self, df):
+        """Sort sales rows by order_time; rows without a valid time are excluded."""
+        if df is None or 'order_time' not in df.columns:
+            return None
+        
+        try:
+            times = pd.to_datetime(df['order_time'], errors='coerce')
+        except Exception as e:
+            print(f"Error in _build_time_index: {e}")
+            return None
+        
+        if getattr(times.dt, 'tz', None) is not None:
+            times = times.dt.tz_localize(None)
+        
+        values = times.to_numpy(dtype='datetime64[ns]')
+        valid = ~np.isnat(values)
+        order = np.argsort(values, kind='stable')
+        n_valid = int(valid.sum())
+        # NaT sorts last
+        order = order[:n_valid]
+        return {'values': values, 'valid': valid, 'order': order, 'sorted': values[order]}
+    
+    def date_bounds(self):
+        """Return (min_date, max_date) of valid order times, or None."""
+        if self._time_index is None or len(self._time_index['order']) == 0:
+            return None
+        
+        sorted_times = self._time_index['sorted']
+        return (pd.Timestamp(sorted_times[0]).date(), pd.Timestamp(sorted_times[-1]).date())
+    
+    def _dimension_rows(self, df, filters):
+        """Row positions of a dimension table matching {column: allowed values} filters."""
+        if df is None:
+            return None
+        
+        mask = np.ones(len(df), dtype=bool)
+        for col, allowed in filters.items():
+            if allowed and col in df.columns:
+                mask &= df[col].isin(allowed).to_numpy()
+        return np.flatnonzero(mask)
+    
+    def _allowed_keys(self, keys, rows):
+        """Boolean lookup over key codes for the keys present in the given dimension rows."""
+        allowed = np.zeros(keys['n_keys'], dtype=bool)
+        allowed[keys['row_codes'][rows]] = True
+        return allowed
+    
+    def _date_slice(self, date_range):
+        """Row positions (sorted by time) and ns bounds for an inclusive date range."""
+        start_date, end_date = date_range
+        start = np.datetime64(pd.Timestamp(start_date), 'ns')
+        end = np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1), 'ns')
+        
+        sorted_times = self._time_index['sorted']
+        lo = np.searchsorted(sorted_times, start, side='left')
+        hi = np.searchsorted(sorted_times, end, side='left')
+        return self._time_index['order'][lo:hi], start, end
+    
+    def _fact_rows(self, index, allowed, date_range=None):
+        """
+        Row positions of a fact table passing key and date constraints.
+        
+        allowed maps 'store'/'sku' to boolean key lookups. The smallest
+        candidate list is materialized and the remaining constraints are
+        checked on those rows only.
+        """
+        constraints = [(name, allowed[name]) for name in ['store', 'sku']
+                       if allowed.get(name) is not None and name in index]
+        use_dates = date_range is not None and self._time_index is not None and index is self._sales_index
+        
+        if not constraints and not use_dates:
+            return None
+        
+        # Size of each candidate list, without materializing it
+        candidates = []
+        for name, lookup in constraints:
+            candidates.append((int(index[name]['counts'][lookup].sum()), name))
+        if use_dates:
+            date_rows, start, end = self._date_slice(date_range)
+            candidates.append((len(date_rows), 'date'))
+        
+        _, driver = min(candidates)
+        if driver == 'date':
+            rows = np.sort(date_rows)
+        else:
+            postings = index[driver]
+            keys = np.flatnonzero(allowed[driver])
+            rows = np.concatenate([postings['order'][postings['offsets'][k]:postings['offsets'][k + 1]]
+                                   for k in keys]) if len(keys) else np.empty(0, dtype=np.intp)
+            rows.sort()
+        
+        for name, lookup in constraints:
+            if name == driver:
+                continue
+            codes = index[name]['codes'][rows]
+            rows = rows[(codes >= 0) & lookup[np.maximum(codes, 0)]]
+        
+        if use_dates and driver != 'date':
+            times = self._time_index['values'][rows]
+            rows = rows[self._time_index['valid'][rows] & (times >= start) & (times < end)]
+        
+        return rows
+    
+    def apply(self, date_range=None, cities=None, channels=None, categories=None, brands=None):
+        """
+        Evaluate a filter combination.
+        
+        Empty or None selections do not filter. Returns a dict of row
+        positions per table ('sales', 'stores', 'products', 'inventory');
+        None means all rows of that table.
+        """
+        if date_range is not None and len(date_range) != 2:
+            date_range = None
+        
+        store_rows = self._dimension_rows(self.stores_df, {'city': cities, 'channel': channels})
+        product_rows = self._dimension_rows(self.products_df, {'category': categories, 'brand': brands})
+        
+        allowed = {
+            'store': self._allowed_keys(self._store_keys, store_rows) if self._store_keys is not None else None,
+            'sku': self._allowed_keys(self._sku_keys, product_rows) if self._sku_keys is not None else None,
+        }
+        
+        result = {
+            'sales': self._fact_rows(self._sales_index, allowed, date_range),
+            'stores': store_rows,
+            'products': product_rows,
+            'inventory': self._fact_rows(self._inventory_index, allowed) if self._inventory_index is not None else None,
+        }
+        return result
+    
+    def filtered_frames(self, rows):
+        """
+        Slice the frames by the row positions from apply().
+        
+        Tables whose selection covers every row are returned as-is, without
+        a copy. Returns (sales, stores, products, inventory).
+        """
+        frames = []
+        for name, df in [('sales', self.sales_df), ('stores', self.stores_df),
+                         ('products', self.products_df), ('inventory', self.inventory_df)]:
+            positions = rows.get(name)
+            if df is None or positions is None or len(positions) == len(df):
+                frames.append(df)
+            else:
+                frames.append(df.iloc[positions])
+        return tuple(frames)
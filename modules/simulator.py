@@ -5,11 +5,23 @@ Campaign simulation and KPI calculations
 
 import pandas as pd
 import numpy as np
+import threading
 
 
 class Simulator:
     """Campaign simulator with KPI calculations."""
     
+    # Dimensions of the KPI cube (see calculate_kpi_cube)
+    CUBE_DIMENSIONS = ['city', 'channel', 'category']
+    
+    # Longest run without sales that still counts as one trading window (see _trading_window)
+    BASELINE_MAX_GAP_DAYS = 14
+    
+    # Measures projected by the baseline forecaster (see fit_baseline_forecast)
+    FORECAST_MEASURES = ['revenue', 'profit', 'orders', 'units']
+    # Days forecast ahead for campaign windows; longer windows continue at the last day's level
+    FORECAST_HORIZON_DAYS = 60
+    
     def __init__(self):
         """Initialize simulator with default elasticity values."""
         self.category_elasticity = {
@@ -21,6 +33,21 @@ class Simulator:
             'Sports': 2.6
         }
         self.default_elasticity = 2.5
+        # (city, channel, category) -> elasticity, from apply_elasticities
+        self.segment_elasticity = {}
+        # Campaign baseline: 'run_rate' (observed daily average) or 'forecast' (trend + weekly seasonality)
+        self.baseline_method = 'run_rate'
+        # Scale run-rate baselines by the day-of-week profile of the window
+        self.weekday_seasonality = False
+        # Version of the dataset the caller's frames hold; when set, the frame caches
+        # are keyed on it instead of frame identity (see _is_cached_frame)
+        self.dataset_version = None
+        self._fact_cache = None
+        self._baseline_cache = None
+        self._forecast_cache = None
+        self._inventory_cache = None
+        # Guards the lazy caches above; a cached simulator is shared across sessions
+        self._cache_lock = threading.RLock()
     
     def _find_column(self, df, possible_names):
         """Find a column from a list of possible names."""
@@ -47,7 +74,7 @@ class Simulator:
     
     def _get_date_column(self, df):
         """Find date column."""
-        return self._find_column(df, ['order_ts', 'order_date', 'date', 'timestamp', 'created_at', 'sale_date', 'transaction_date'])
+        return self._find_column(df, ['order_ts', 'order_time', 'order_date', 'date', 'timestamp', 'created_at', 'sale_date', 'transaction_date'])
     
     def _get_order_column(self, df):
         """Find order ID column."""
@@ -69,52 +96,174 @@ class Simulator:
         """Find channel column."""
         return self._find_column(df, ['channel', 'Channel', 'sales_channel', 'store_channel'])
     
+    def _unique_dimension(self, df, key_col, value_cols):
+        """Return a dimension table indexed by its key, keeping the first row per key."""
+        subset = df[[key_col] + value_cols].drop_duplicates(subset=[key_col], keep='first')
+        return subset.set_index(key_col)
+    
+    def _dimension_positions(self, keys, dim):
+        """
+        Resolve keys to integer row positions in a dimension table (-1 if missing).
+        
+        Cleaned frames carry sku/store_id as categoricals whose codes follow
+        the products/stores row order, so the codes already are dense surrogate
+        keys into the dimension and no lookup is needed. Other keys fall back
+        to a single index lookup.
+        """
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            categories = keys.cat.categories
+            n = len(dim)
+            if len(categories) >= n and np.array_equal(np.asarray(categories[:n]), np.asarray(dim.index)):
+                positions = keys.cat.codes.to_numpy().astype(np.int64)
+                positions[positions >= n] = -1
+                return positions
+        return dim.index.get_indexer(keys)
+    
+    def _gather_dimension(self, values, positions):
+        """Gather a dimension column by row position, keeping its shared category dictionary if it has one."""
+        missing = positions < 0
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()[positions]
+            codes[missing] = -1
+            return pd.Categorical.from_codes(codes, dtype=values.dtype)
+        
+        gathered = values.to_numpy()[positions]
+        if missing.any():
+            gathered = gathered.astype(float if gathered.dtype.kind in 'biuf' else object)
+            gathered[missing] = np.nan
+        return gathered
+    
+    def build_fact_table(self, sales_df, stores_df=None, products_df=None):
+        """
+        Build the enriched sales fact table shared by all KPI methods.
+        
+        Sales rows are joined once to stores (city, channel) and products
+        (unit cost, category). Each row gets integer surrogate keys
+        (_store_code, _sku_code: row positions in the de-duplicated dimension,
+        -1 if unmatched) and attributes are gathered by array indexing rather
+        than merged. The numeric _qty/_price/_cost/revenue/profit columns are
+        coerced up front. Dimension tables are de-duplicated on
+        their key before the join so duplicate store/product rows cannot
+        multiply sales rows.
+        """
+        # Shallow copy: only new columns are added, so the caller's data is
+        # never written and sales values are not duplicated in memory
+        fact = sales_df.copy(deep=False)
+        
+        sku_col_sales = self._get_sku_column(sales_df)
+        store_col_sales = self._get_store_column(sales_df)
+        qty_col = self._get_qty_column(sales_df)
+        price_col = self._get_price_column(sales_df)
+        order_col = self._get_order_column(sales_df)
+        date_col = self._get_date_column(sales_df)
+        
+        # Join stores (city, channel)
+        if stores_df is not None and store_col_sales:
+            store_col_stores = self._get_store_column(stores_df)
+            city_col = self._get_city_column(stores_df)
+            channel_col = self._get_channel_column(stores_df)
+            store_attrs = [c for c in [city_col, channel_col] if c]
+            
+            if store_col_stores:
+                stores_dim = self._unique_dimension(stores_df, store_col_stores, store_attrs)
+                fact['_store'] = fact[store_col_sales]
+                fact['_store_code'] = self._dimension_positions(fact['_store'], stores_dim)
+                if city_col:
+                    fact['city'] = self._gather_dimension(stores_dim[city_col], fact['_store_code'].to_numpy())
+                if channel_col:
+                    fact['channel'] = self._gather_dimension(stores_dim[channel_col], fact['_store_code'].to_numpy())
+        
+        # Join products (cost, category)
+        fact['_cost'] = 0
+        if products_df is not None and sku_col_sales:
+            sku_col_products = self._get_sku_column(products_df)
+            cost_col = self._get_cost_column(products_df)
+            category_col = self._get_category_column(products_df)
+            product_attrs = [c for c in [cost_col, category_col] if c]
+            
+            if sku_col_products:
+                products_dim = self._unique_dimension(products_df, sku_col_products, product_attrs)
+                fact['_sku'] = fact[sku_col_sales]
+                fact['_sku_code'] = self._dimension_positions(fact['_sku'], products_dim)
+                if cost_col:
+                    fact['_cost'] = self._gather_dimension(products_dim[cost_col], fact['_sku_code'].to_numpy())
+                if category_col:
+                    fact['category'] = self._gather_dimension(products_dim[category_col], fact['_sku_code'].to_numpy())
+        
+        # Numeric measures
+        if qty_col:
+            fact['_qty'] = pd.to_numeric(fact[qty_col], errors='coerce').fillna(0)
+        else:
+            fact['_qty'] = 1
+        
+        if price_col:
+            fact['_price'] = pd.to_numeric(fact[price_col], errors='coerce').fillna(0)
+        else:
+            fact['_price'] = 0
+        
+        fact['_cost'] = pd.to_numeric(fact['_cost'], errors='coerce').fillna(0)
+        
+        fact['revenue'] = fact['_qty'] * fact['_price']
+        fact['profit'] = fact['_qty'] * (fact['_price'] - fact['_cost'])
+        
+        # Order identifier for counting
+        if order_col:
+            fact['_order_id'] = fact[order_col]
+        else:
+            fact['_order_id'] = np.arange(len(fact))
+        
+        # Parsed order date (normalized to midnight)
+        if date_col:
+            fact['_date'] = pd.to_datetime(fact[date_col], errors='coerce').dt.normalize()
+        
+        return fact
+    
+    def _is_cached_frame(self, cached_df, df, cached_version):
+        """
+        Whether a frame matches the one a cache entry was built from.
+        
+        Frames are compared by identity. When dataset_version is set and
+        equals the entry's version, the caller's frames are that version's
+        data, so any frame object matches (both must be given or both None).
+        This lets a simulator shared across sessions, each holding its own
+        frame objects for the same dataset, keep a single set of caches.
+        """
+        if self.dataset_version is not None and cached_version == self.dataset_version:
+            return (cached_df is None) == (df is None)
+        return cached_df is df
+    
+    def get_fact_table(self, sales_df, stores_df=None, products_df=None):
+        """
+        Return the fact table for these frames, reusing the cached build.
+        
+        The cache is keyed on the identity of the input frames (or on
+        dataset_version when set), so every KPI method called with the same
+        dataset shares a single join. A table built with stores also serves
+        callers that do not pass stores.
+        """
+        with self._cache_lock:
+            if self._fact_cache is not None:
+                (cached_sales, cached_stores, cached_products), version, fact = self._fact_cache
+                if (self._is_cached_frame(cached_sales, sales_df, version)
+                        and self._is_cached_frame(cached_products, products_df, version)
+                        and (stores_df is None or self._is_cached_frame(cached_stores, stores_df, version))):
+                    return fact
+            
+            fact = self.build_fact_table(sales_df, stores_df, products_df)
+            self._fact_cache = ((sales_df, stores_df, products_df), self.dataset_version, fact)
+            return fact
+    
     def calculate_overall_kpis(self, sales_df, products_df):
         """Calculate overall KPIs from sales data."""
         kpis = {}
         
         try:
-            # Find column names
-            sku_col_sales = self._get_sku_column(sales_df)
-            sku_col_products = self._get_sku_column(products_df)
-            cost_col = self._get_cost_column(products_df)
-            price_col = self._get_price_column(sales_df)
-            qty_col = self._get_qty_column(sales_df)
-            order_col = self._get_order_column(sales_df)
-            
-            # Create working copy
-            merged = sales_df.copy()
-            
-            # Merge with products if possible
-            if sku_col_sales and sku_col_products and cost_col:
-                products_subset = products_df[[sku_col_products, cost_col]].copy()
-                products_subset.columns = ['_sku', '_cost']
-                merged['_sku'] = merged[sku_col_sales]
-                merged = merged.merge(products_subset, on='_sku', how='left')
-                merged['_cost'] = merged['_cost'].fillna(0)
-            else:
-                merged['_cost'] = 0
-            
-            # Get qty and price
-            if qty_col:
-                merged['_qty'] = pd.to_numeric(merged[qty_col], errors='coerce').fillna(0)
-            else:
-                merged['_qty'] = 1
-            
-            if price_col:
-                merged['_price'] = pd.to_numeric(merged[price_col], errors='coerce').fillna(0)
-            else:
-                merged['_price'] = 0
-            
-            merged['_cost'] = pd.to_numeric(merged['_cost'], errors='coerce').fillna(0)
-            
-            # Calculate
-            merged['revenue'] = merged['_qty'] * merged['_price']
-            merged['profit'] = merged['_qty'] * (merged['_price'] - merged['_cost'])
+            merged = self.get_fact_table(sales_df, None, products_df)
             
             kpis['total_revenue'] = float(merged['revenue'].sum())
             kpis['total_profit'] = float(merged['profit'].sum())
             
+            order_col = self._get_order_column(sales_df)
             if order_col:
                 kpis['total_orders'] = int(merged[order_col].nunique())
             else:
@@ -140,8 +289,7 @@ class Simulator:
                 kpis['refund_amount'] = 0
             
             # COGS (Total Cost)
-            merged['cogs'] = merged['_qty'] * merged['_cost']
-            kpis['total_cogs'] = float(merged['cogs'].sum())
+            kpis['total_cogs'] = float((merged['_qty'] * merged['_cost']).sum())
             
             # Net Revenue
             kpis['net_revenue'] = kpis['total_revenue'] - kpis['refund_amount']
@@ -149,9 +297,9 @@ class Simulator:
             # Discount calculations
             discount_col = self._find_column(merged, ['discount_pct', 'discount', 'discount_percent'])
             if discount_col and discount_col in merged.columns:
-                merged['_discount_pct'] = pd.to_numeric(merged[discount_col], errors='coerce').fillna(0)
-                kpis['avg_discount_pct'] = float(merged['_discount_pct'].mean())
-                kpis['total_discount'] = float((merged['revenue'] * merged['_discount_pct'] / 100).sum())
+                discount_pct = pd.to_numeric(merged[discount_col], errors='coerce').fillna(0)
+                kpis['avg_discount_pct'] = float(discount_pct.mean())
+                kpis['total_discount'] = float((merged['revenue'] * discount_pct / 100).sum())
             else:
                 kpis['avg_discount_pct'] = 0
                 kpis['total_discount'] = 0
@@ -174,92 +322,13 @@ class Simulator:
     def calculate_kpis_by_dimension(self, sales_df, stores_df, products_df, dimension):
         """Calculate KPIs grouped by a dimension (city, channel, category)."""
         try:
-            merged = sales_df.copy()
-            
-            # Find columns
-            sku_col_sales = self._get_sku_column(sales_df)
-            sku_col_products = self._get_sku_column(products_df)
-            store_col_sales = self._get_store_column(sales_df)
-            store_col_stores = self._get_store_column(stores_df)
-            cost_col = self._get_cost_column(products_df)
-            price_col = self._get_price_column(sales_df)
-            qty_col = self._get_qty_column(sales_df)
-            order_col = self._get_order_column(sales_df)
-            category_col = self._get_category_column(products_df)
-            city_col = self._get_city_column(stores_df)
-            channel_col = self._get_channel_column(stores_df)
-            
-            # Merge with stores
-            if store_col_sales and store_col_stores:
-                stores_cols = [store_col_stores]
-                if city_col:
-                    stores_cols.append(city_col)
-                if channel_col:
-                    stores_cols.append(channel_col)
-                
-                stores_subset = stores_df[stores_cols].copy()
-                stores_subset.columns = ['_store'] + [f'_{c}' for c in stores_cols[1:]]
-                merged['_store'] = merged[store_col_sales]
-                merged = merged.merge(stores_subset, on='_store', how='left')
-                
-                if city_col:
-                    merged['city'] = merged[f'_{city_col}']
-                if channel_col:
-                    merged['channel'] = merged[f'_{channel_col}']
-            
-            # Merge with products
-            if sku_col_sales and sku_col_products:
-                products_cols = [sku_col_products]
-                if cost_col:
-                    products_cols.append(cost_col)
-                if category_col:
-                    products_cols.append(category_col)
-                
-                products_subset = products_df[products_cols].copy()
-                new_cols = ['_sku']
-                if cost_col:
-                    new_cols.append('_cost')
-                if category_col:
-                    new_cols.append('category')
-                products_subset.columns = new_cols
-                
-                merged['_sku'] = merged[sku_col_sales]
-                merged = merged.merge(products_subset, on='_sku', how='left')
-            
-            # Set defaults
-            if '_cost' not in merged.columns:
-                merged['_cost'] = 0
-            if 'category' not in merged.columns:
-                merged['category'] = 'Unknown'
-            if 'city' not in merged.columns:
-                merged['city'] = 'Unknown'
-            if 'channel' not in merged.columns:
-                merged['channel'] = 'Unknown'
-            
-            # Get qty and price
-            if qty_col:
-                merged['_qty'] = pd.to_numeric(merged[qty_col], errors='coerce').fillna(0)
-            else:
-                merged['_qty'] = 1
-            
-            if price_col:
-                merged['_price'] = pd.to_numeric(merged[price_col], errors='coerce').fillna(0)
-            else:
-                merged['_price'] = 0
+            merged = self.get_fact_table(sales_df, stores_df, products_df)
             
-            merged['_cost'] = pd.to_numeric(merged['_cost'], errors='coerce').fillna(0)
-            
-            merged['revenue'] = merged['_qty'] * merged['_price']
-            merged['profit'] = merged['_qty'] * (merged['_price'] - merged['_cost'])
-            
-            # Set order_id for counting
-            if order_col:
-                merged['_order_id'] = merged[order_col]
-            else:
-                merged['_order_id'] = range(len(merged))
+            if dimension in ['city', 'channel', 'category'] and dimension not in merged.columns:
+                merged = merged.assign(**{dimension: 'Unknown'})
             
             # Group by dimension
-            grouped = merged.groupby(dimension).agg({
+            grouped = merged.groupby(dimension, observed=True).agg({
                 'revenue': 'sum',
                 'profit': 'sum',
                 '_order_id': 'nunique',
@@ -277,74 +346,180 @@ class Simulator:
             print(f"Error in calculate_kpis_by_dimension: {e}")
             return pd.DataFrame()
     
-    def calculate_daily_trends(self, sales_df, products_df):
-        """Calculate daily performance trends."""
+    def calculate_kpi_cube(self, sales_df, stores_df, products_df, dimensions=None):
+        """
+        Calculate additive KPIs for every combination of dimensions in one pass.
+        
+        Returns one row per city x channel x category cell (only dimensions
+        present in the data are used) with revenue, profit, paid_revenue,
+        orders and units, plus the sales line count and price/cost sums
+        (lines, price_sum, cost_sum) that mean prices are rebuilt from. Any
+        rollup is then a cheap re-aggregation of the cube via rollup_kpi_cube.
+        Orders are distinct order_ids per cell, so rolled-up order counts are
+        exact as long as each order_id belongs to a single store and SKU,
+        which holds for cleaned sales data.
+        """
         try:
-            merged = sales_df.copy()
-            
-            # Find columns
-            sku_col_sales = self._get_sku_column(sales_df)
-            sku_col_products = self._get_sku_column(products_df)
-            cost_col = self._get_cost_column(products_df)
-            price_col = self._get_price_column(sales_df)
-            qty_col = self._get_qty_column(sales_df)
-            date_col = self._get_date_column(sales_df)
-            order_col = self._get_order_column(sales_df)
+            merged = self.get_fact_table(sales_df, stores_df, products_df)
+            dimensions = [d for d in (dimensions or self.CUBE_DIMENSIONS) if d in merged.columns]
             
-            # Merge with products for cost
-            if sku_col_sales and sku_col_products and cost_col:
-                products_subset = products_df[[sku_col_products, cost_col]].copy()
-                products_subset.columns = ['_sku', '_cost']
-                merged['_sku'] = merged[sku_col_sales]
-                merged = merged.merge(products_subset, on='_sku', how='left')
-                merged['_cost'] = merged['_cost'].fillna(0)
+            # Narrow frame so the groupby does not carry the full sales table
+            cube_input = merged[dimensions + ['revenue', 'profit', '_order_id', '_qty', '_price', '_cost']]
+            if 'payment_status' in merged.columns:
+                paid_revenue = merged['revenue'].where(merged['payment_status'] == 'Paid', 0)
             else:
-                merged['_cost'] = 0
+                paid_revenue = merged['revenue']
+            cube_input = cube_input.assign(paid_revenue=paid_revenue)
+            
+            if not dimensions:
+                cube_input = cube_input.assign(_all='All')
+            
+            cube = cube_input.groupby(dimensions or ['_all'], dropna=False, sort=False, observed=True).agg(
+                revenue=('revenue', 'sum'),
+                profit=('profit', 'sum'),
+                paid_revenue=('paid_revenue', 'sum'),
+                orders=('_order_id', 'nunique'),
+                units=('_qty', 'sum'),
+                lines=('_qty', 'size'),
+                price_sum=('_price', 'sum'),
+                cost_sum=('_cost', 'sum')
+            ).reset_index()
+            
+            return cube.drop(columns=['_all'], errors='ignore')
+        
+        except Exception as e:
+            print(f"Error in calculate_kpi_cube: {e}")
+            return pd.DataFrame()
+    
+    def rollup_kpi_cube(self, cube, dimensions):
+        """
+        Roll a KPI cube up to the given dimensions.
+        
+        Output matches calculate_kpis_by_dimension (plus paid_revenue).
+        Dimensions missing from the cube are reported as 'Unknown'.
+        """
+        try:
+            dimensions = list(dimensions)
+            missing = {d: 'Unknown' for d in dimensions if d not in cube.columns}
+            if missing:
+                cube = cube.assign(**missing)
             
-            # Get qty and price
-            if qty_col:
-                merged['_qty'] = pd.to_numeric(merged[qty_col], errors='coerce').fillna(0)
-            else:
-                merged['_qty'] = 1
+            grouped = cube.groupby(dimensions, observed=True).agg({
+                'revenue': 'sum',
+                'profit': 'sum',
+                'orders': 'sum',
+                'units': 'sum',
+                'paid_revenue': 'sum'
+            }).reset_index()
+            
+            grouped['avg_order_value'] = grouped['revenue'] / grouped['orders']
+            grouped['profit_margin_pct'] = (grouped['profit'] / grouped['revenue'] * 100).fillna(0)
+            grouped = grouped[dimensions + ['revenue', 'profit', 'orders', 'units',
+                                            'avg_order_value', 'profit_margin_pct', 'paid_revenue']]
+            grouped = grouped.sort_values('revenue', ascending=False)
             
-            if price_col:
-                merged['_price'] = pd.to_numeric(merged[price_col], errors='coerce').fillna(0)
+            return grouped
+        
+        except Exception as e:
+            print(f"Error in rollup_kpi_cube: {e}")
+            return pd.DataFrame()
+    
+    def calculate_daily_rollup(self, sales_df, stores_df, products_df):
+        """
+        Calculate the KPI cube split by order date.
+        
+        Returns one row per date x city x channel x category cell with the
+        same additive measures as calculate_kpi_cube. Rows without a valid
+        date are dropped. Weekly and monthly series are derived from this
+        table with rollup_time_series, without rescanning sales rows.
+        """
+        columns = ['date'] + self.CUBE_DIMENSIONS + ['revenue', 'profit', 'paid_revenue', 'orders', 'units',
+                                                     'lines', 'price_sum', 'cost_sum']
+        try:
+            merged = self.get_fact_table(sales_df, stores_df, products_df)
+            if '_date' not in merged.columns:
+                return pd.DataFrame(columns=columns)
+            
+            daily = self.calculate_kpi_cube(sales_df, stores_df, products_df,
+                                            dimensions=['_date'] + self.CUBE_DIMENSIONS)
+            daily = daily.rename(columns={'_date': 'date'}).dropna(subset=['date'])
+            return daily.sort_values('date', kind='mergesort').reset_index(drop=True)
+        
+        except Exception as e:
+            print(f"Error in calculate_daily_rollup: {e}")
+            return pd.DataFrame(columns=columns)
+    
+    def rollup_time_series(self, daily, granularity='Daily', dimensions=None):
+        """
+        Roll a daily rollup up to Daily, Weekly or Monthly periods.
+        
+        Weeks start on Monday (pandas 'W' periods) and months on the 1st;
+        period holds the start date. Optional dimensions are kept as
+        grouping columns. Output is sorted by period.
+        """
+        try:
+            dimensions = [d for d in (dimensions or []) if d in daily.columns]
+            dates = pd.to_datetime(daily['date'])
+            
+            if granularity == 'Weekly':
+                period = dates - pd.to_timedelta(dates.dt.dayofweek, unit='D')
+            elif granularity == 'Monthly':
+                period = dates.dt.to_period('M').dt.start_time
             else:
-                merged['_price'] = 0
+                period = dates
             
-            merged['_cost'] = pd.to_numeric(merged['_cost'], errors='coerce').fillna(0)
+            series = daily.assign(period=period).groupby(['period'] + dimensions, observed=True).agg({
+                'revenue': 'sum',
+                'profit': 'sum',
+                'paid_revenue': 'sum',
+                'orders': 'sum',
+                'units': 'sum'
+            }).reset_index()
             
-            merged['revenue'] = merged['_qty'] * merged['_price']
-            merged['profit'] = merged['_qty'] * (merged['_price'] - merged['_cost'])
+            return series.sort_values('period', kind='mergesort').reset_index(drop=True)
+        
+        except Exception as e:
+            print(f"Error in rollup_time_series: {e}")
+            return pd.DataFrame(columns=['period'] + (dimensions or []) + ['revenue', 'profit', 'paid_revenue', 'orders', 'units'])
+    
+    def calculate_daily_trends(self, sales_df, products_df):
+        """Calculate daily performance trends."""
+        try:
+            merged = self.get_fact_table(sales_df, None, products_df)
+            order_col = self._get_order_column(sales_df)
             
-            # Parse date
-            if date_col:
-                merged['date'] = pd.to_datetime(merged[date_col], errors='coerce').dt.date
+            # Parsed date from the fact table
+            if '_date' in merged.columns:
+                dates = merged['_date']
             else:
                 # No date column found - create dummy dates
-                merged['date'] = pd.date_range(end=pd.Timestamp.today(), periods=len(merged), freq='h').date
+                dates = pd.Series(
+                    pd.date_range(end=pd.Timestamp.today(), periods=len(merged), freq='h').normalize(),
+                    index=merged.index
+                )
             
-            merged = merged.dropna(subset=['date'])
+            valid = dates.notna()
             
-            if len(merged) == 0:
+            if valid.sum() == 0:
                 return pd.DataFrame(columns=['date', 'revenue', 'profit', 'orders', 'units'])
             
             # Group by date
-            daily = merged.groupby('date').agg({
+            grouped = merged.loc[valid].groupby(dates[valid].rename('date'))
+            daily = grouped.agg({
                 'revenue': 'sum',
                 'profit': 'sum',
                 '_qty': 'sum'
-            }).reset_index()
+            })
             
             # Count orders
             if order_col:
-                orders_per_day = merged.groupby('date')[order_col].nunique().reset_index()
-                orders_per_day.columns = ['date', 'orders']
-                daily = daily.merge(orders_per_day, on='date', how='left')
-                daily.columns = ['date', 'revenue', 'profit', 'units', 'orders']
+                daily['orders'] = grouped[order_col].nunique()
             else:
                 daily['orders'] = daily['_qty']
-                daily.columns = ['date', 'revenue', 'profit', 'units', 'orders']
+            
+            daily = daily.reset_index()
+            daily.columns = ['date', 'revenue', 'profit', 'units', 'orders']
+            daily['date'] = daily['date'].dt.date
             
             daily = daily.sort_values('date')
             
@@ -354,25 +529,141 @@ class Simulator:
             print(f"Error in calculate_daily_trends: {e}")
             return pd.DataFrame(columns=['date', 'revenue', 'profit', 'orders', 'units'])
     
+    def _forecast_design(self, days, n_days, first_weekday, n_terms=8):
+        """
+        Regression design for day offsets from the start of the trading window.
+        
+        Columns are level, linear trend (scaled to the window) and six
+        weekday effects with Monday as reference, truncated to n_terms.
+        """
+        days = np.asarray(days)
+        trend = (days - (n_days - 1) / 2) / n_days
+        weekdays = (first_weekday + days) % 7
+        columns = [np.ones(len(days)), trend] + [(weekdays == d).astype(float) for d in range(1, 7)]
+        return np.column_stack(columns[:n_terms])
+    
+    def _group_coefficients(self, segments, coefficients, dimensions):
+        """Sum forecast coefficients of baseline segments by dimensions; returns (keys, coefficients)."""
+        grouped = segments.groupby(dimensions, observed=True)
+        codes = grouped.ngroup().to_numpy()
+        keys = grouped.size().reset_index()[dimensions]
+        
+        valid = ~np.isnan(codes)
+        totals = np.zeros((len(keys),) + coefficients.shape[1:])
+        np.add.at(totals, codes[valid].astype(int), coefficients[valid])
+        return keys, totals
+    
+    def _forecast_path(self, model, coefficients, horizon_days):
+        """Project coefficients (..., measures, terms) over the days after the window (not floored)."""
+        n_days = model['n_days']
+        design = self._forecast_design(np.arange(n_days, n_days + horizon_days), n_days,
+                                       model['first_weekday'], coefficients.shape[-1])
+        return coefficients @ design.T
+    
+    def fit_baseline_forecast(self, sales_df, stores_df, products_df):
+        """
+        Fit the baseline forecaster for all segments at once, cached per dataset.
+        
+        Daily revenue, profit, orders and units of every city x channel x
+        category segment over the trading window form a dense segment x day
+        matrix, with zeros for days without sales. A single least-squares
+        solve against the shared design (level, linear trend and weekday
+        effects; level only for windows under two weeks) fits every segment
+        and measure together. The model is linear, so summing segment
+        coefficients gives the fit of any combined segment. Returns None
+        when the data has no order dates, otherwise a dict with
+        'coefficients' (segments x measures x terms, aligned with the
+        segments of get_baseline_table), 'n_days' and 'first_weekday'.
+        """
+        with self._cache_lock:
+            fact = self.get_fact_table(sales_df, stores_df, products_df)
+            if self._forecast_cache is not None and self._forecast_cache[0] is fact:
+                return self._forecast_cache[1]
+            
+            table = self.get_baseline_table(sales_df, stores_df, products_df)
+            segment_days = table['segment_days']
+            model = None
+            
+            if segment_days is not None and len(table['segments']) > 0:
+                n_segments = len(table['segments'])
+                n_days = table['data_days']
+                first_weekday = table['first_date'].dayofweek
+                
+                # Segment x measure x day matrix
+                cells = segment_days['_segment'].to_numpy() * n_days + segment_days['_day'].to_numpy()
+                matrix = np.stack([
+                    np.bincount(cells, weights=segment_days[m].to_numpy(dtype=float),
+                                minlength=n_segments * n_days).reshape(n_segments, n_days)
+                    for m in self.FORECAST_MEASURES
+                ], axis=1)
+                
+                design = self._forecast_design(np.arange(n_days), n_days, first_weekday, 8 if n_days >= 14 else 1)
+                solution = np.linalg.lstsq(design, matrix.reshape(-1, n_days).T, rcond=None)[0]
+                
+                model = {
+                    'coefficients': solution.T.reshape(n_segments, len(self.FORECAST_MEASURES), -1),
+                    'n_days': n_days,
+                    'first_weekday': first_weekday
+                }
+            
+            self._forecast_cache = (fact, model)
+            return model
+    
+    def forecast_daily_baseline(self, sales_df, stores_df, products_df, horizon_days=30, dimensions=None):
+        """
+        Forecast daily revenue, profit, orders and units after the sales data ends.
+        
+        Uses fit_baseline_forecast. Returns one row per forecast date and
+        segment of the given dimensions (all segments combined by default).
+        """
+        dimensions = list(dimensions or [])
+        columns = ['date'] + dimensions + self.FORECAST_MEASURES
+        try:
+            model = self.fit_baseline_forecast(sales_df, stores_df, products_df)
+            if model is None:
+                return pd.DataFrame(columns=columns)
+            
+            table = self.get_baseline_table(sales_df, stores_df, products_df)
+            dimensions = [d for d in dimensions if d in table['segments'].columns]
+            if dimensions:
+                keys, coefficients = self._group_coefficients(table['segments'], model['coefficients'], dimensions)
+            else:
+                keys, coefficients = pd.DataFrame(index=[0]), model['coefficients'].sum(axis=0, keepdims=True)
+            
+            path = np.clip(self._forecast_path(model, coefficients, horizon_days), 0, None)
+            dates = table['last_date'] + pd.to_timedelta(np.arange(1, horizon_days + 1), unit='D')
+            
+            forecast = keys.loc[keys.index.repeat(horizon_days)].reset_index(drop=True)
+            forecast.insert(0, 'date', np.tile(dates, len(keys)))
+            values = path.transpose(0, 2, 1).reshape(-1, len(self.FORECAST_MEASURES))
+            for i, measure in enumerate(self.FORECAST_MEASURES):
+                forecast[measure] = values[:, i]
+            return forecast
+        
+        except Exception as e:
+            print(f"Error in forecast_daily_baseline: {e}")
+            return pd.DataFrame(columns=columns)
+    
     def calculate_stockout_risk(self, inventory_df):
         """Calculate stockout risk metrics."""
         try:
             stock_col = self._find_column(inventory_df, ['stock_on_hand', 'stock', 'quantity', 'qty', 'inventory'])
             reorder_col = self._find_column(inventory_df, ['reorder_point', 'reorder_level', 'min_stock'])
             
+            # Work on local Series so the caller's frame is left untouched
             if stock_col:
-                inventory_df['_stock'] = pd.to_numeric(inventory_df[stock_col], errors='coerce').fillna(0)
+                stock = pd.to_numeric(inventory_df[stock_col], errors='coerce').fillna(0)
             else:
-                inventory_df['_stock'] = 0
+                stock = pd.Series(0, index=inventory_df.index)
             
             if reorder_col:
-                inventory_df['_reorder'] = pd.to_numeric(inventory_df[reorder_col], errors='coerce').fillna(10)
+                reorder = pd.to_numeric(inventory_df[reorder_col], errors='coerce').fillna(10)
             else:
-                inventory_df['_reorder'] = 10
+                reorder = 10
             
             total_items = len(inventory_df)
-            zero_stock = len(inventory_df[inventory_df['_stock'] == 0])
-            low_stock = len(inventory_df[inventory_df['_stock'] <= inventory_df['_reorder']])
+            zero_stock = int((stock == 0).sum())
+            low_stock = int((stock <= reorder).sum())
             
             return {
                 'total_items': total_items,
@@ -389,166 +680,936 @@ class Simulator:
                 'stockout_risk_pct': 0
             }
     
-    def simulate_campaign(self, sales_df, stores_df, products_df,
-                          discount_pct=10, promo_budget=10000, margin_floor=15,
-                          city='All', channel='All', category='All', campaign_days=7):
-        """Simulate a promotional campaign."""
+    def _elasticity(self, city='All', channel='All', category='All'):
+        """Elasticity for a target: a fitted segment value if any, else the category or default value."""
+        key = (city, channel, category)
+        if key in self.segment_elasticity:
+            return self.segment_elasticity[key]
+        if category != 'All':
+            return self.category_elasticity.get(category, self.default_elasticity)
+        return self.default_elasticity
+    
+    def estimate_elasticities(self, sales_df, stores_df, products_df, dimensions=('category',),
+                              bin_width=5, min_rows=30, min_bins=3, max_elasticity=10):
+        """
+        Fit discount elasticities per segment from sales data.
+        
+        Elasticity has the meaning used by simulate_campaign: units grow by
+        elasticity % per discount point. Sales lines are binned by discount
+        (bin_width points) and mean discount and units per line are taken per
+        segment and bin. Then units = a + b * discount is fitted per segment
+        by weighted least squares (weights are bin sizes) using grouped sums,
+        and elasticity = 100 * b / a. All segments are fitted in one grouped
+        computation. Segments with fewer than min_rows lines or min_bins bins,
+        or a degenerate fit, are marked fitted=False and keep the current
+        elasticity. Estimates are clipped to [0, max_elasticity].
+        
+        dimensions may be any of city/channel/category; an empty tuple fits
+        one overall elasticity.
+        """
+        dimensions = list(dimensions)
+        columns = dimensions + ['elasticity', 'intercept', 'slope', 'rows', 'bins', 'fitted']
         try:
-            merged = sales_df.copy()
-            
-            # Find columns
-            sku_col_sales = self._get_sku_column(sales_df)
-            sku_col_products = self._get_sku_column(products_df)
-            store_col_sales = self._get_store_column(sales_df)
-            store_col_stores = self._get_store_column(stores_df)
-            cost_col = self._get_cost_column(products_df)
-            price_col = self._get_price_column(sales_df)
-            qty_col = self._get_qty_column(sales_df)
-            order_col = self._get_order_column(sales_df)
-            category_col = self._get_category_column(products_df)
-            city_col = self._get_city_column(stores_df)
-            channel_col = self._get_channel_column(stores_df)
-            
-            # Merge with stores
-            if store_col_sales and store_col_stores:
-                stores_cols = [store_col_stores]
-                if city_col:
-                    stores_cols.append(city_col)
-                if channel_col:
-                    stores_cols.append(channel_col)
-                
-                stores_subset = stores_df[stores_cols].copy()
-                stores_subset.columns = ['_store'] + stores_cols[1:]
-                merged['_store'] = merged[store_col_sales]
-                merged = merged.merge(stores_subset, on='_store', how='left')
-            
-            # Merge with products
-            if sku_col_sales and sku_col_products:
-                products_cols = [sku_col_products]
-                if cost_col:
-                    products_cols.append(cost_col)
-                if category_col:
-                    products_cols.append(category_col)
-                
-                products_subset = products_df[products_cols].copy()
-                new_names = ['_sku']
-                if cost_col:
-                    new_names.append('_cost')
-                if category_col:
-                    new_names.append('category')
-                products_subset.columns = new_names
+            merged = self.get_fact_table(sales_df, stores_df, products_df)
+            discount_col = self._find_column(merged, ['discount_pct', 'discount', 'discount_percent'])
+            dimensions = [d for d in dimensions if d in merged.columns]
+            if not discount_col:
+                return pd.DataFrame(columns=columns)
+            
+            discount = pd.to_numeric(merged[discount_col], errors='coerce')
+            frame = merged[dimensions].assign(
+                _discount=discount,
+                _bin=(discount / bin_width).round(),
+                _qty=merged['_qty']
+            ).dropna(subset=['_bin'])
+            groups = dimensions or ['_all']
+            if not dimensions:
+                frame = frame.assign(_all='All')
+            
+            # Mean discount and units per line for every segment x discount bin
+            bins = frame.groupby(groups + ['_bin'], observed=True).agg(
+                discount=('_discount', 'mean'),
+                units=('_qty', 'mean'),
+                size=('_qty', 'size')
+            ).reset_index()
+            
+            # Weighted least-squares sums per segment, all segments at once
+            w = bins['size'].astype(float)
+            x = bins['discount']
+            y = bins['units']
+            sums = bins[groups].assign(
+                w=w, wx=w * x, wy=w * y, wxx=w * x * x, wxy=w * x * y, bins=1
+            ).groupby(groups, observed=True).sum().reset_index()
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                denominator = sums['w'] * sums['wxx'] - sums['wx'] ** 2
+                slope = (sums['w'] * sums['wxy'] - sums['wx'] * sums['wy']) / denominator
+                intercept = (sums['wy'] - slope * sums['wx']) / sums['w']
+                elasticity = 100 * slope / intercept
+            
+            fitted = ((sums['w'] >= min_rows) & (sums['bins'] >= min_bins) & (denominator > 0)
+                      & (intercept > 0) & np.isfinite(elasticity))
+            
+            result = sums[groups].copy()
+            result['elasticity'] = elasticity.clip(0, max_elasticity)
+            result['intercept'] = intercept
+            result['slope'] = slope
+            result['rows'] = sums['w'].astype(int)
+            result['bins'] = sums['bins']
+            result['fitted'] = fitted
+            
+            # Segments without a usable fit keep the elasticity they have now
+            keys = [result[d] if d in result.columns else ['All'] * len(result) for d in self.CUBE_DIMENSIONS]
+            current = pd.Series([self._elasticity(*key) for key in zip(*keys)], index=result.index)
+            result['elasticity'] = result['elasticity'].where(fitted, current)
+            
+            return result.drop(columns=['_all'], errors='ignore')
+        
+        except Exception as e:
+            print(f"Error in estimate_elasticities: {e}")
+            return pd.DataFrame(columns=columns)
+    
+    def apply_elasticities(self, estimates):
+        """
+        Use fitted elasticities (from estimate_elasticities) in campaign simulations.
+        
+        Category-only estimates update category_elasticity, an overall
+        estimate updates default_elasticity, and estimates that also split
+        by city or channel go to segment_elasticity. Rows with fitted=False
+        are ignored.
+        """
+        if estimates is None or len(estimates) == 0:
+            return self
+        
+        dimensions = [d for d in self.CUBE_DIMENSIONS if d in estimates.columns]
+        for _, row in estimates[estimates['fitted']].iterrows():
+            if not dimensions:
+                self.default_elasticity = float(row['elasticity'])
+            elif dimensions == ['category']:
+                self.category_elasticity[row['category']] = float(row['elasticity'])
+            else:
+                key = tuple(row[d] if d in dimensions else 'All' for d in self.CUBE_DIMENSIONS)
+                self.segment_elasticity[key] = float(row['elasticity'])
+        return self
+    
+    def _campaign_segment(self, merged, city='All', channel='All', category='All'):
+        """Return the fact rows targeted by a campaign."""
+        if city != 'All' and 'city' in merged.columns:
+            merged = merged[merged['city'] == city]
+        if channel != 'All' and 'channel' in merged.columns:
+            merged = merged[merged['channel'] == channel]
+        if category != 'All':
+            if 'category' in merged.columns:
+                merged = merged[merged['category'] == category]
+            else:
+                merged = merged.iloc[0:0]
+        return merged
+    
+    def get_baseline_table(self, sales_df, stores_df, products_df):
+        """
+        Per-segment totals behind campaign baselines, cached per dataset.
+        
+        Built from the daily rollup rather than from sales rows: one row per
+        city x channel x category with the additive measures of the KPI cube
+        and revenue per weekday (revenue_dow0..revenue_dow6, Monday = 0).
+        Returns a dict with that 'segments' table, their daily rows as
+        'segment_days' (segment row, day offset and measures), the observed
+        'first_date' and 'last_date', 'data_days' (calendar days in that
+        span) and 'weekday_days' (how many of each weekday the span holds).
+        The span is the main trading window (see _trading_window), so a few
+        stray order dates cannot dilute the run-rate. Data without order dates falls
+        back to the KPI cube and a 30-day span.
+        """
+        with self._cache_lock:
+            fact = self.get_fact_table(sales_df, stores_df, products_df)
+            if self._baseline_cache is not None and self._baseline_cache[0] is fact:
+                return self._baseline_cache[1]
+            
+            measures = ['revenue', 'profit', 'orders', 'units', 'lines', 'price_sum', 'cost_sum']
+            daily = self.calculate_daily_rollup(sales_df, stores_df, products_df)
+            
+            if len(daily) > 0:
+                dates = pd.to_datetime(daily['date'])
+                first_date, last_date = self._trading_window(dates, daily['lines'])
+                in_window = ((dates >= first_date) & (dates <= last_date)).to_numpy()
+                daily, dates = daily[in_window], dates[in_window]
+                weekdays = dates.dt.dayofweek.to_numpy()
+                span = pd.date_range(first_date, last_date, freq='D')
+                data_days = len(span)
+                weekday_days = np.bincount(span.dayofweek, minlength=7)
                 
-                merged['_sku'] = merged[sku_col_sales]
-                merged = merged.merge(products_subset, on='_sku', how='left')
-            
-            # Set defaults
-            if '_cost' not in merged.columns:
-                merged['_cost'] = 0
-            if 'category' not in merged.columns:
-                merged['category'] = 'Unknown'
-            if city_col and city_col not in merged.columns:
-                merged[city_col] = 'Unknown'
-            if channel_col and channel_col not in merged.columns:
-                merged[channel_col] = 'Unknown'
-            
-            # Get qty and price
-            if qty_col:
-                merged['_qty'] = pd.to_numeric(merged[qty_col], errors='coerce').fillna(0)
+                weekday_revenue = {f'revenue_dow{d}': daily['revenue'].where(weekdays == d, 0) for d in range(7)}
+                source = daily.assign(**weekday_revenue)
+                measures = measures + list(weekday_revenue)
             else:
-                merged['_qty'] = 1
-            
-            if price_col:
-                merged['_price'] = pd.to_numeric(merged[price_col], errors='coerce').fillna(0)
+                first_date = last_date = None
+                data_days = 30
+                weekday_days = np.zeros(7, dtype=int)
+                source = self.calculate_kpi_cube(sales_df, stores_df, products_df)
+            
+            dimensions = [d for d in self.CUBE_DIMENSIONS if d in source.columns]
+            if len(source) == 0:
+                segments = pd.DataFrame(columns=dimensions + measures)
+                segment_codes = np.zeros(0, dtype=int)
+            elif dimensions:
+                grouped = source.groupby(dimensions, dropna=False, sort=False, observed=True)
+                segments = grouped[measures].sum().reset_index()
+                segment_codes = grouped.ngroup().to_numpy()
             else:
-                merged['_price'] = 0
+                segments = source[measures].sum().to_frame().T
+                segment_codes = np.zeros(len(source), dtype=int)
+            
+            # Daily rows of each segment, for the forecaster's segment x day matrix
+            segment_days = None
+            if first_date is not None:
+                segment_days = source[['revenue', 'profit', 'orders', 'units']].assign(
+                    _segment=segment_codes,
+                    _day=((dates - first_date).dt.days).to_numpy()
+                )
+            
+            table = {
+                'segments': segments,
+                'segment_days': segment_days,
+                'first_date': first_date,
+                'last_date': last_date,
+                'data_days': data_days,
+                'weekday_days': weekday_days
+            }
+            self._baseline_cache = (fact, table)
+            return table
+    
+    def _trading_window(self, dates, lines):
+        """
+        First and last date of the main trading window.
+        
+        Sales dates are split wherever no sales occur for more than
+        BASELINE_MAX_GAP_DAYS, and the stretch holding the most sales lines
+        is kept. For continuous data this is simply the full date range.
+        """
+        per_day = pd.Series(np.asarray(lines, dtype=float), index=pd.DatetimeIndex(dates)).groupby(level=0).sum()
+        days = per_day.index
+        
+        stretch = np.concatenate([[0], np.cumsum(np.diff(days.asi8) > self.BASELINE_MAX_GAP_DAYS * 86400 * 10 ** 9)])
+        main = np.bincount(stretch, weights=per_day.to_numpy()).argmax()
+        in_main = days[stretch == main]
+        return in_main[0], in_main[-1]
+    
+    def _baseline_fields(self, totals, table):
+        """
+        Turn summed segment totals into campaign baseline fields.
+        
+        totals is a frame of segment rows from get_baseline_table (summed
+        as needed). Adds data_days, avg_price and avg_cost, and with
+        weekday_seasonality the per-weekday demand weights weekday_weight0..6
+        and the weekday the campaign window starts on (the day after the
+        last observed date).
+        """
+        lines = totals['lines'].astype(float)
+        totals = totals.assign(
+            data_days=table['data_days'],
+            avg_price=(totals['price_sum'] / lines).where(lines > 0, 0),
+            avg_cost=(totals['cost_sum'] / lines).where(lines > 0, 0)
+        )
+        
+        if self.weekday_seasonality and table['last_date'] is not None:
+            # Mean revenue on each weekday relative to the mean day; 1 where undefined
+            daily_revenue = totals['revenue'].to_numpy(dtype=float) / table['data_days']
+            weights = {}
+            for d in range(7):
+                weekday_revenue = totals[f'revenue_dow{d}'].to_numpy(dtype=float)
+                n_days = table['weekday_days'][d]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    weight = weekday_revenue / n_days / daily_revenue if n_days else np.ones(len(totals))
+                weights[f'weekday_weight{d}'] = np.where(np.isfinite(weight) & (daily_revenue > 0), weight, 1.0)
+            totals = totals.assign(**weights, start_weekday=(table['last_date'].dayofweek + 1) % 7)
+        
+        return totals
+    
+    def _forecast_weights(self, totals, table, coefficients, model):
+        """
+        Forecast demand of each day after the window, relative to the mean observed day.
+        
+        coefficients are the summed forecaster coefficients of the rows of
+        totals. The units forecast is the demand index for every baseline
+        measure, so revenue, profit and orders keep the segment's observed
+        price and cost mix. Each day is floored at zero, so a falling trend
+        cannot offset demand on other days. Returns an array (rows x
+        FORECAST_HORIZON_DAYS); a campaign window then counts the sum of its
+        days' weights, as with weekday weights.
+        """
+        units = self.FORECAST_MEASURES.index('units')
+        path = self._forecast_path(model, coefficients[:, units], self.FORECAST_HORIZON_DAYS)
+        daily_units = totals['units'].to_numpy(dtype=float)[:, None] / table['data_days']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = path / daily_units
+        return np.where(daily_units > 0, np.maximum(weights, 0), 0.0)
+    
+    def _campaign_baseline(self, sales_df, stores_df, products_df, city='All', channel='All', category='All'):
+        """
+        Aggregate the targeted segment into the few numbers a campaign needs.
+        
+        Reads the cached baseline table instead of the sales rows. Returns
+        None if no rows match. Otherwise a dict with the segment's revenue,
+        profit, orders and units totals, the number of days they cover, mean
+        selling price and unit cost, the elasticity and, with
+        weekday_seasonality, the weekday weights of the campaign window. With
+        baseline_method 'forecast' it also holds the forecaster's daily
+        weights (see _forecast_weights), which take precedence.
+        """
+        table = self.get_baseline_table(sales_df, stores_df, products_df)
+        segments = table['segments']
+        
+        # Same targeting rules as _campaign_segment
+        mask = np.ones(len(segments), dtype=bool)
+        for dim, value in [('city', city), ('channel', channel), ('category', category)]:
+            if value == 'All':
+                continue
+            if dim in segments.columns:
+                mask &= (segments[dim] == value).to_numpy()
+            elif dim == 'category':
+                mask[:] = False
+        
+        if not mask.any() or segments['lines'][mask].sum() == 0:
+            return None
+        
+        totals = segments.loc[mask, segments.columns.difference(self.CUBE_DIMENSIONS, sort=False)].sum().to_frame().T
+        row = self._baseline_fields(totals, table).iloc[0]
+        
+        baseline = {key: row[key] for key in ['revenue', 'profit', 'orders', 'units', 'data_days', 'avg_price', 'avg_cost']}
+        baseline['elasticity'] = self._elasticity(city, channel, category)
+        if 'start_weekday' in row.index:
+            baseline['weekday_weights'] = row[[f'weekday_weight{d}' for d in range(7)]].to_numpy(dtype=float)
+            baseline['start_weekday'] = int(row['start_weekday'])
+        
+        model = self.fit_baseline_forecast(sales_df, stores_df, products_df) if self.baseline_method == 'forecast' else None
+        if model is not None:
+            coefficients = model['coefficients'][mask].sum(axis=0, keepdims=True)
+            baseline['forecast_weights'] = self._forecast_weights(totals, table, coefficients, model)[0]
+        return baseline
+    
+    def _window_days(self, baseline, campaign_days):
+        """
+        Baseline demand of a campaign window, in mean days.
+        
+        With forecast weights each day of the window counts its forecast
+        demand relative to the mean observed day; windows beyond the
+        forecast horizon continue at the last day's weight. With weekday weights each day counts
+        its weekday's weight, starting at start_weekday, so e.g. a 2-day
+        window over a busy weekend counts more than two mean days.
+        Otherwise this is campaign_days. Fractional days count pro rata.
+        """
+        weights = baseline.get('forecast_weights')
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+            horizon = weights.shape[-1]
+            days = weights[..., -1] * np.maximum(campaign_days - horizon, 0)
+            for d in range(horizon):
+                days = days + weights[..., d] * np.clip(campaign_days - d, 0, 1)
+            return days
+        
+        weights = baseline.get('weekday_weights')
+        if weights is None:
+            return campaign_days
+        
+        weights = np.roll(np.asarray(weights, dtype=float), -baseline['start_weekday'], axis=-1)
+        full_weeks, remainder = np.divmod(campaign_days, 7)
+        days = full_weeks * weights.sum(axis=-1)
+        for d in range(7):
+            days = days + weights[..., d] * np.clip(remainder - d, 0, 1)
+        return days
+    
+    def _campaign_outcomes(self, baseline, discount_pct, promo_budget, margin_floor, campaign_days,
+                           fill_rate=1.0, baseline_fill_rate=1.0):
+        """
+        Evaluate campaign economics for arrays of scenario parameters.
+        
+        Parameters broadcast against each other and against the baseline
+        values, which may themselves be arrays (one entry per segment). This
+        is the arithmetic behind simulate_campaign, simulate_campaign_grid
+        and allocate_budget. fill_rate and baseline_fill_rate are the shares
+        of campaign and baseline demand that stock can serve (see
+        _inventory_fill); baseline_units is the unconstrained baseline demand.
+        """
+        discount_pct, promo_budget, margin_floor, campaign_days = np.broadcast_arrays(
+            *[np.asarray(x, dtype=float) for x in (discount_pct, promo_budget, margin_floor, campaign_days)]
+        )
+        elasticity = baseline['elasticity']
+        avg_price = baseline['avg_price']
+        avg_cost = baseline['avg_cost']
+        
+        scale = self._window_days(baseline, campaign_days) / baseline['data_days']
+        baseline_revenue = baseline['revenue'] * scale
+        baseline_profit = baseline['profit'] * scale
+        baseline_orders = baseline['orders'] * scale
+        baseline_demand_units = baseline['units'] * scale
+        
+        # Without the campaign, stock limits what the baseline sells too
+        baseline_revenue = baseline_revenue * baseline_fill_rate
+        baseline_profit = baseline_profit * baseline_fill_rate
+        baseline_units = baseline_demand_units * baseline_fill_rate
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Margin without discount
+            base_margin_pct = np.where(avg_price > 0, (avg_price - avg_cost) / avg_price * 100, 0)
+            
+            # Cap the discount where it would breach the margin floor:
+            # discounted_price >= avg_cost / (1 - margin_floor/100)
+            discounted_price = avg_price * (1 - discount_pct / 100)
+            margin_check = np.where(discounted_price > 0, (discounted_price - avg_cost) / discounted_price * 100, 0)
+            margin_capped = (margin_check < margin_floor) & (base_margin_pct > margin_floor)
+            
+            min_price = np.where(margin_floor < 100, avg_cost / (1 - margin_floor / 100), avg_cost)
+            max_discount = np.where(avg_price > 0, (avg_price - min_price) / avg_price * 100, 0)
+            effective_discount = np.where(margin_capped, np.minimum(discount_pct, np.maximum(0, max_discount)), discount_pct)
+            
+            demand_lift_pct = effective_discount * elasticity
+            expected_units = baseline_demand_units * (1 + demand_lift_pct / 100) * fill_rate
+            discounted_price = avg_price * (1 - effective_discount / 100)
+            expected_revenue = expected_units * discounted_price
             
-            merged['_cost'] = pd.to_numeric(merged['_cost'], errors='coerce').fillna(0)
+            # Costs - promo capped at 5% of revenue or the budget; only extra units add fulfillment
+            promo_cost = np.minimum(promo_budget, expected_revenue * 0.05)
+            fulfillment_cost = np.maximum(0, (expected_units - baseline_units) * 1.5)
+            cogs = expected_units * avg_cost
             
-            # Filter by targeting
-            if city != 'All' and city_col and city_col in merged.columns:
-                merged = merged[merged[city_col] == city]
-            if channel != 'All' and channel_col and channel_col in merged.columns:
-                merged = merged[merged[channel_col] == channel]
-            if category != 'All' and 'category' in merged.columns:
-                merged = merged[merged['category'] == category]
+            expected_gross_profit = expected_revenue - cogs
+            expected_net_profit = expected_gross_profit - promo_cost - fulfillment_cost
+            expected_margin_pct = np.where(discounted_price > 0, (discounted_price - avg_cost) / discounted_price * 100, 0)
             
-            if len(merged) == 0:
-                return {'outputs': None, 'comparison': None, 'warnings': ['No data matches filters']}
+            # ROI = incremental profit / total investment, capped to -100% .. 500%
+            total_investment = promo_cost + fulfillment_cost
+            incremental_profit = expected_net_profit - baseline_profit
+            roi_pct = np.where(total_investment > 0, incremental_profit / total_investment * 100,
+                               np.where(incremental_profit <= 0, 0, 100))
+            roi_pct = np.maximum(-100, np.minimum(500, roi_pct))
             
-            merged['revenue'] = merged['_qty'] * merged['_price']
-            merged['profit'] = merged['_qty'] * (merged['_price'] - merged['_cost'])
+            revenue_change_pct = np.where(baseline_revenue > 0, (expected_revenue - baseline_revenue) / baseline_revenue * 100, 0)
+            profit_change_pct = np.where(baseline_profit != 0, (expected_net_profit - baseline_profit) / np.abs(baseline_profit) * 100, 0)
+        
+        return {
+            'discount_pct': discount_pct,
+            'promo_budget': promo_budget,
+            'margin_floor': margin_floor,
+            'campaign_days': campaign_days,
+            'effective_discount_pct': effective_discount,
+            'margin_capped': margin_capped,
+            'expected_revenue': expected_revenue,
+            'expected_orders': np.trunc(baseline_orders * (1 + demand_lift_pct / 100) * fill_rate).astype(np.int64),
+            'expected_units': expected_units,
+            'expected_net_profit': expected_net_profit,
+            'expected_margin_pct': expected_margin_pct,
+            'demand_lift_pct': demand_lift_pct,
+            'roi_pct': roi_pct,
+            'promo_cost': promo_cost,
+            'fulfillment_cost': fulfillment_cost,
+            'baseline_revenue': baseline_revenue,
+            'baseline_profit': baseline_profit,
+            'baseline_orders': np.trunc(baseline_orders * baseline_fill_rate).astype(np.int64),
+            'baseline_units': baseline_demand_units,
+            'revenue_change_pct': revenue_change_pct,
+            'profit_change_pct': profit_change_pct
+        }
+    
+    def _inventory_supply(self, inventory_df, stores_df, products_df):
+        """
+        Latest stock position per SKU x store, keyed like the fact table.
+        
+        Inventory rows are resolved to the same store and SKU positions as
+        the fact table's _store_code/_sku_code, combined into one integer
+        pair key, and only the latest snapshot per pair is kept. Returns
+        None if the frames lack the needed keys, otherwise a dict with the
+        pair 'index', 'stock' (on hand, floored at zero), 'lead_time' (days,
+        NaN when unknown), 'reorder_qty' (reorder_point, NaN when unknown),
+        'n_skus' and a 'segment_shares' cache for _inventory_pair_shares.
+        Cached per inventory frame (or per dataset_version when set).
+        """
+        with self._cache_lock:
+            if self._inventory_cache is not None:
+                (cached_inventory, cached_stores, cached_products), version, supply = self._inventory_cache
+                if (self._is_cached_frame(cached_inventory, inventory_df, version)
+                        and self._is_cached_frame(cached_stores, stores_df, version)
+                        and self._is_cached_frame(cached_products, products_df, version)):
+                    return supply
+            
+            supply = None
+            sku_col = self._get_sku_column(inventory_df)
+            store_col = self._get_store_column(inventory_df)
+            stock_col = self._find_column(inventory_df, ['stock_on_hand', 'stock', 'quantity', 'qty', 'inventory'])
+            lead_col = self._find_column(inventory_df, ['lead_time_days', 'lead_time', 'replenishment_days'])
+            reorder_col = self._find_column(inventory_df, ['reorder_point', 'reorder_qty', 'reorder_quantity'])
+            snapshot_col = self._find_column(inventory_df, ['snapshot_date', 'as_of_date', 'date'])
+            store_key = self._get_store_column(stores_df) if stores_df is not None else None
+            sku_key = self._get_sku_column(products_df) if products_df is not None else None
+            
+            if sku_col and store_col and stock_col and store_key and sku_key:
+                stores_dim = self._unique_dimension(stores_df, store_key, [])
+                products_dim = self._unique_dimension(products_df, sku_key, [])
+                n_skus = len(products_dim)
+                
+                store_codes = np.asarray(self._dimension_positions(inventory_df[store_col], stores_dim), dtype=np.int64)
+                sku_codes = np.asarray(self._dimension_positions(inventory_df[sku_col], products_dim), dtype=np.int64)
+                valid = (store_codes >= 0) & (sku_codes >= 0)
+                pairs = store_codes[valid] * n_skus + sku_codes[valid]
+                
+                stock = pd.to_numeric(inventory_df[stock_col], errors='coerce').fillna(0).clip(lower=0).to_numpy(dtype=float)[valid]
+                if lead_col:
+                    lead_time = pd.to_numeric(inventory_df[lead_col], errors='coerce').to_numpy(dtype=float)[valid]
+                    lead_time[lead_time < 0] = np.nan
+                else:
+                    lead_time = np.full(len(pairs), np.nan)
+                if reorder_col:
+                    reorder_qty = pd.to_numeric(inventory_df[reorder_col], errors='coerce').to_numpy(dtype=float)[valid]
+                    reorder_qty[reorder_qty < 0] = np.nan
+                else:
+                    reorder_qty = np.full(len(pairs), np.nan)
+                
+                # Latest snapshot per pair: sort by pair then date and keep each run's last row
+                if snapshot_col:
+                    snapshots = pd.to_datetime(inventory_df[snapshot_col], errors='coerce').to_numpy(dtype='datetime64[ns]')[valid]
+                    order = np.lexsort((snapshots.view(np.int64), pairs))
+                else:
+                    order = np.argsort(pairs, kind='stable')
+                pairs, stock, lead_time, reorder_qty = pairs[order], stock[order], lead_time[order], reorder_qty[order]
+                latest = np.append(pairs[1:] != pairs[:-1], True) if len(pairs) else np.zeros(0, dtype=bool)
+                
+                supply = {
+                    'index': pd.Index(pairs[latest]),
+                    'stock': stock[latest],
+                    'lead_time': lead_time[latest],
+                    'reorder_qty': reorder_qty[latest],
+                    'n_skus': n_skus,
+                    'segment_shares': {}
+                }
+            
+            self._inventory_cache = ((inventory_df, stores_df, products_df), self.dataset_version, supply)
+            return supply
+    
+    def _inventory_pair_shares(self, merged, supply, city, channel, category):
+        """
+        Share of a segment's sold units per SKU x store pair, matched to supply.
+        
+        Returns (share, positions, pairs, untracked) for the pairs that have
+        an inventory row, where positions index into the supply arrays, or
+        None if the segment sold nothing. Cached in supply per fact table and
+        segment, so repeated campaigns skip the slicing and factorizing.
+        """
+        with self._cache_lock:
+            key = (city, channel, category)
+            cached = supply['segment_shares'].get(key)
+            if cached is not None and cached[0] is merged:
+                return cached[1]
+            
+            shares = None
+            segment = self._campaign_segment(merged, city, channel, category)
+            units = segment['_qty'].to_numpy(dtype=float)
+            total_units = units.sum()
+            if total_units > 0:
+                store_codes = segment['_store_code'].to_numpy()
+                sku_codes = segment['_sku_code'].to_numpy()
+                valid = (store_codes >= 0) & (sku_codes >= 0)
+                pair_codes, pair_keys = pd.factorize(store_codes[valid].astype(np.int64) * supply['n_skus'] + sku_codes[valid])
+                share = np.bincount(pair_codes, weights=units[valid]) / total_units
+                
+                positions = supply['index'].get_indexer(pair_keys)
+                tracked = positions >= 0
+                shares = (share[tracked], positions[tracked], len(pair_keys), int((~tracked).sum()))
             
-            data_days = 30
-            baseline_revenue = merged['revenue'].sum() / data_days * campaign_days
-            baseline_profit = merged['profit'].sum() / data_days * campaign_days
+            supply['segment_shares'][key] = (merged, shares)
+            return shares
+    
+    def _inventory_fill(self, sales_df, stores_df, products_df, inventory_df,
+                        city, channel, category, baseline_units, expected_units, campaign_days):
+        """
+        Cap projected demand per SKU x store by the stock it can sell.
+        
+        Segment demand (baseline and campaign units over the window) is
+        spread over SKU x store pairs by their share of the segment's sold
+        units, and joined to the latest inventory by integer pair key. A
+        pair sells from its stock_on_hand during the first lead_time_days
+        of the window; then one replenishment of reorder_point units
+        arrives (the baseline demand over the lead time when reorder_point
+        is unknown) and the rest of the window sells from what is left plus
+        that delivery. Without a lead time the whole window sells from
+        stock. Pairs with no inventory row are left uncapped. Returns None
+        when the data cannot be matched, otherwise a dict with fill rates,
+        lost units and stockout counts.
+        """
+        supply = self._inventory_supply(inventory_df, stores_df, products_df)
+        merged = self.get_fact_table(sales_df, stores_df, products_df)
+        if supply is None or '_store_code' not in merged.columns or '_sku_code' not in merged.columns:
+            return None
+        
+        shares = self._inventory_pair_shares(merged, supply, city, channel, category)
+        if shares is None:
+            return None
+        share, positions, n_pairs, untracked = shares
+        stock = supply['stock'][positions]
+        lead_time = supply['lead_time'][positions]
+        days = max(campaign_days, 1e-9)
+        
+        # Share of the window that must be served from current stock (all of it without a lead time)
+        before_restock = np.where(np.isnan(lead_time), 1.0, np.minimum(lead_time, campaign_days) / days)
+        reorder_qty = supply['reorder_qty'][positions]
+        reorder_qty = np.where(np.isnan(reorder_qty), baseline_units * share / days * np.nan_to_num(lead_time), reorder_qty)
+        
+        def lost(demand_units):
+            demand = demand_units * share
+            sold_before = np.minimum(demand * before_restock, stock)
+            sold_after = np.minimum(demand * (1 - before_restock), stock - sold_before + reorder_qty)
+            return demand - sold_before - sold_after
+        
+        lost_baseline = lost(baseline_units)
+        lost_campaign = lost(expected_units)
+        
+        return {
+            'fill_rate': float(1 - lost_campaign.sum() / expected_units) if expected_units > 0 else 1.0,
+            'baseline_fill_rate': float(1 - lost_baseline.sum() / baseline_units) if baseline_units > 0 else 1.0,
+            'lost_units': float(lost_campaign.sum()),
+            'baseline_lost_units': float(lost_baseline.sum()),
+            'stockouts': int((lost_campaign > 1e-9).sum()),
+            'baseline_stockouts': int((lost_baseline > 1e-9).sum()),
+            'pairs': int(n_pairs),
+            'untracked_pairs': untracked
+        }
+    
+    def simulate_campaign_grid(self, sales_df, stores_df, products_df,
+                               discount_pcts=(10,), promo_budgets=(10000,), margin_floors=(15,),
+                               campaign_days=(7,), city='All', channel='All', category='All'):
+        """
+        Simulate every combination of discount, budget, margin floor and length.
+        
+        The targeted segment is aggregated once and all scenarios are then
+        evaluated in one vectorized pass. Returns a DataFrame with one row per
+        scenario (the cartesian product of the inputs, in input order) and the
+        same outputs as simulate_campaign, or an empty DataFrame if no data
+        matches the targeting.
+        """
+        try:
+            baseline = self._campaign_baseline(sales_df, stores_df, products_df, city, channel, category)
+            if baseline is None:
+                return pd.DataFrame()
+            
+            grid = np.meshgrid(
+                np.atleast_1d(np.asarray(discount_pcts, dtype=float)),
+                np.atleast_1d(np.asarray(promo_budgets, dtype=float)),
+                np.atleast_1d(np.asarray(margin_floors, dtype=float)),
+                np.atleast_1d(np.asarray(campaign_days, dtype=float)),
+                indexing='ij'
+            )
+            outcomes = self._campaign_outcomes(baseline, *[axis.ravel() for axis in grid])
+            return pd.DataFrame(outcomes)
+        
+        except Exception as e:
+            print(f"Error in simulate_campaign_grid: {e}")
+            return pd.DataFrame()
+    
+    def optimize_campaign(self, sales_df, stores_df, products_df,
+                          objective='net_profit', discount_range=(0, 50), budget_range=(1000, 500000),
+                          margin_floor=15, city='All', channel='All', category='All', campaign_days=7,
+                          grid_size=11, iterations=5):
+        """
+        Search discount and promo budget for the best campaign.
+        
+        objective is 'net_profit' (expected_net_profit) or 'roi' (roi_pct).
+        Scenarios whose expected margin falls below margin_floor are not
+        eligible. The search is coarse-to-fine: each round evaluates a
+        grid_size x grid_size grid over the current ranges in one vectorized
+        pass, then narrows both ranges to one grid step around the best
+        point. Returns the simulate_campaign result for the optimum, plus
+        'optimal' (the chosen parameters and objective value) and
+        'scenarios' (every evaluated scenario).
+        """
+        try:
+            objective_col = {'net_profit': 'expected_net_profit', 'roi': 'roi_pct'}[objective]
+            baseline = self._campaign_baseline(sales_df, stores_df, products_df, city, channel, category)
             
-            if order_col and order_col in merged.columns:
-                baseline_orders = merged[order_col].nunique() / data_days * campaign_days
-            else:
-                baseline_orders = len(merged) / data_days * campaign_days
+            if baseline is None:
+                return {'outputs': None, 'comparison': None, 'warnings': ['No data matches filters']}
             
-            baseline_units = merged['_qty'].sum() / data_days * campaign_days
+            discount_lo, discount_hi = float(discount_range[0]), float(discount_range[1])
+            budget_lo, budget_hi = float(budget_range[0]), float(budget_range[1])
+            rounds = []
+            best = None
+            
+            for _ in range(iterations):
+                discounts = np.linspace(discount_lo, discount_hi, grid_size)
+                budgets = np.linspace(budget_lo, budget_hi, grid_size)
+                grid = np.meshgrid(discounts, budgets, indexing='ij')
+                outcomes = pd.DataFrame(self._campaign_outcomes(
+                    baseline, grid[0].ravel(), grid[1].ravel(), margin_floor, campaign_days
+                ))
+                rounds.append(outcomes)
+                
+                eligible = outcomes[outcomes['expected_margin_pct'] >= margin_floor]
+                if len(eligible) == 0:
+                    break
+                candidate = eligible.loc[eligible[objective_col].idxmax()]
+                if best is None or candidate[objective_col] > best[objective_col]:
+                    best = candidate
+                
+                # Narrow to one grid step around the best point, within the user bounds
+                discount_step = (discount_hi - discount_lo) / (grid_size - 1)
+                budget_step = (budget_hi - budget_lo) / (grid_size - 1)
+                discount_lo = max(float(discount_range[0]), best['discount_pct'] - discount_step)
+                discount_hi = min(float(discount_range[1]), best['discount_pct'] + discount_step)
+                budget_lo = max(float(budget_range[0]), best['promo_budget'] - budget_step)
+                budget_hi = min(float(budget_range[1]), best['promo_budget'] + budget_step)
+            
+            scenarios = pd.concat(rounds, ignore_index=True)
+            
+            if best is None:
+                return {'outputs': None, 'comparison': None, 'scenarios': scenarios,
+                        'warnings': [f'No discount and budget in range keeps margin above the {margin_floor}% floor']}
+            
+            result = self.simulate_campaign(
+                sales_df, stores_df, products_df,
+                discount_pct=float(best['discount_pct']),
+                promo_budget=float(best['promo_budget']),
+                margin_floor=margin_floor,
+                city=city,
+                channel=channel,
+                category=category,
+                campaign_days=campaign_days
+            )
+            result['optimal'] = {
+                'discount_pct': float(best['discount_pct']),
+                'promo_budget': float(best['promo_budget']),
+                'objective': objective,
+                'objective_value': float(best[objective_col])
+            }
+            result['scenarios'] = scenarios
+            return result
+        
+        except Exception as e:
+            print(f"Error in optimize_campaign: {e}")
+            return {'outputs': None, 'comparison': None, 'warnings': [f'Error: {str(e)}']}
+    
+    def _segment_baselines(self, sales_df, stores_df, products_df, dimensions=None):
+        """
+        Campaign baselines for every segment of the given dimensions.
+        
+        Rolls the cached baseline table up to the dimensions and returns one
+        row per segment with the same fields as _campaign_baseline (revenue,
+        profit, orders, units, data_days, avg_price, avg_cost, elasticity and,
+        with weekday_seasonality, weekday_weight0..6 and start_weekday) as
+        columns. Returns (segments, forecast_weights), where forecast_weights
+        holds the per-segment forecaster weights with baseline_method
+        'forecast' and is None otherwise.
+        """
+        table = self.get_baseline_table(sales_df, stores_df, products_df)
+        all_segments = table['segments']
+        dimensions = [d for d in (dimensions or self.CUBE_DIMENSIONS) if d in all_segments.columns]
+        
+        measures = all_segments.columns.difference(self.CUBE_DIMENSIONS, sort=False)
+        segments = all_segments.groupby(dimensions, observed=True)[measures].sum().reset_index()
+        has_sales = (segments['lines'] > 0).to_numpy()
+        segments = self._baseline_fields(segments[has_sales], table).reset_index(drop=True)
+        
+        keys = [segments[d] if d in segments.columns else ['All'] * len(segments) for d in self.CUBE_DIMENSIONS]
+        segments['elasticity'] = [self._elasticity(*key) for key in zip(*keys)]
+        
+        forecast_weights = None
+        model = self.fit_baseline_forecast(sales_df, stores_df, products_df) if self.baseline_method == 'forecast' else None
+        if model is not None:
+            _, coefficients = self._group_coefficients(all_segments, model['coefficients'], dimensions)
+            forecast_weights = self._forecast_weights(segments, table, coefficients[has_sales], model)
+        return segments, forecast_weights
+    
+    def allocate_budget(self, sales_df, stores_df, products_df, total_budget,
+                        margin_floor=15, campaign_days=7, max_discount=50, discount_step=1):
+        """
+        Split a promo budget across city x channel x category segments.
+        
+        The budget funds markdowns: a segment's spend is the discount given
+        away on its expected units. All segments x discount levels are
+        evaluated in one array pass, and levels whose margin falls below
+        margin_floor are skipped (0% is always allowed). The split that
+        maximises total expected profit within the budget is found with a
+        Lagrange multiplier: each segment takes the level maximising
+        profit - lambda * spend, and lambda is bisected until the spend
+        fits. Returns 'allocation', with one row per segment (discount,
+        budget, profits and the marginal return of the next AED), and
+        'summary' with the totals.
+        """
+        try:
+            segments, forecast_weights = self._segment_baselines(sales_df, stores_df, products_df)
+            if len(segments) == 0:
+                return {'allocation': pd.DataFrame(), 'summary': {}}
+            
+            # Segments x discount levels
+            levels = np.arange(0, max_discount + discount_step, discount_step, dtype=float)
+            baseline = {col: segments[col].to_numpy(dtype=float)[:, None] for col in
+                        ['revenue', 'profit', 'orders', 'units', 'data_days', 'avg_price', 'avg_cost', 'elasticity']}
+            if 'start_weekday' in segments.columns:
+                weight_cols = [f'weekday_weight{d}' for d in range(7)]
+                baseline['weekday_weights'] = segments[weight_cols].to_numpy(dtype=float)[:, None, :]
+                baseline['start_weekday'] = int(segments['start_weekday'].iloc[0])
+            if forecast_weights is not None:
+                baseline['forecast_weights'] = forecast_weights[:, None, :]
+            outcomes = self._campaign_outcomes(baseline, levels[None, :], 0, margin_floor, campaign_days)
+            
+            profit = outcomes['expected_net_profit']
+            discount = np.broadcast_to(outcomes['effective_discount_pct'], profit.shape)
+            spend = outcomes['expected_units'] * baseline['avg_price'] * discount / 100
+            profit = np.where(outcomes['expected_margin_pct'] >= margin_floor, profit, -np.inf)
+            profit[:, 0] = outcomes['expected_net_profit'][:, 0]
+            
+            rows = np.arange(len(segments))
+            
+            def choose(lam):
+                return np.argmax(profit - lam * spend, axis=1)
+            
+            choice = choose(0.0)
+            if spend[rows, choice].sum() > total_budget:
+                # Spend falls as lambda grows; bisect for the smallest lambda that fits
+                lo, hi = 0.0, 1.0
+                while spend[rows, choose(hi)].sum() > total_budget and hi < 1e12:
+                    hi *= 2
+                for _ in range(60):
+                    mid = (lo + hi) / 2
+                    if spend[rows, choose(mid)].sum() > total_budget:
+                        lo = mid
+                    else:
+                        hi = mid
+                choice = choose(hi)
+            
+            # Marginal return of moving each segment to its next discount level
+            next_choice = np.minimum(choice + 1, len(levels) - 1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                extra_spend = spend[rows, next_choice] - spend[rows, choice]
+                marginal_return = np.where(extra_spend > 0,
+                                           (profit[rows, next_choice] - profit[rows, choice]) / extra_spend, 0)
+            
+            allocation = segments[[c for c in self.CUBE_DIMENSIONS if c in segments.columns]].copy()
+            allocation['discount_pct'] = discount[rows, choice]
+            allocation['allocated_budget'] = spend[rows, choice]
+            allocation['baseline_profit'] = outcomes['baseline_profit'][:, 0]
+            allocation['expected_net_profit'] = profit[rows, choice]
+            allocation['incremental_profit'] = allocation['expected_net_profit'] - allocation['baseline_profit']
+            allocation['marginal_return'] = np.where(np.isfinite(marginal_return), marginal_return, 0)
+            allocation = allocation.sort_values('allocated_budget', ascending=False).reset_index(drop=True)
+            
+            summary = {
+                'total_budget': total_budget,
+                'allocated_budget': float(allocation['allocated_budget'].sum()),
+                'expected_net_profit': float(allocation['expected_net_profit'].sum()),
+                'incremental_profit': float(allocation['incremental_profit'].sum()),
+                'segments_funded': int((allocation['allocated_budget'] > 0).sum())
+            }
+            return {'allocation': allocation, 'summary': summary}
+        
+        except Exception as e:
+            print(f"Error in allocate_budget: {e}")
+            return {'allocation': pd.DataFrame(), 'summary': {}}
+    
+    def simulate_campaign_uncertainty(self, sales_df, stores_df, products_df,
+                                      discount_pct=10, promo_budget=10000, margin_floor=15,
+                                      city='All', channel='All', category='All', campaign_days=7,
+                                      n_draws=10000, elasticity_cv=0.25, demand_cv=0.15, cost_cv=0.10,
+                                      percentiles=(5, 50, 95), seed=None):
+        """
+        Monte Carlo version of simulate_campaign.
+        
+        Draws n_draws samples of elasticity, baseline demand and unit cost as
+        mean-one lognormal multipliers with the given coefficients of
+        variation, and evaluates all of them in one batched pass. Returns
+        'bands' (per metric: the requested percentiles and the mean for
+        expected_revenue, expected_net_profit and roi_pct), 'prob_loss'
+        (share of draws with negative incremental profit) and 'warnings'.
+        """
+        try:
+            baseline = self._campaign_baseline(sales_df, stores_df, products_df, city, channel, category)
             
-            elasticity = self.category_elasticity.get(category, self.default_elasticity) if category != 'All' else self.default_elasticity
+            if baseline is None:
+                return {'bands': None, 'prob_loss': None, 'warnings': ['No data matches filters']}
             
-            demand_lift_pct = discount_pct * elasticity
+            rng = np.random.default_rng(seed)
             
-            expected_units = baseline_units * (1 + demand_lift_pct / 100)
-            avg_price = merged['_price'].mean()
-            avg_cost = merged['_cost'].mean()
+            def multipliers(cv):
+                sigma = np.sqrt(np.log1p(cv ** 2))
+                return rng.lognormal(-sigma ** 2 / 2, sigma, n_draws)
             
-            # Calculate margin without discount first
-            base_margin_pct = ((avg_price - avg_cost) / avg_price * 100) if avg_price > 0 else 0
+            demand = multipliers(demand_cv)
+            cost = multipliers(cost_cv)
             
-            # Adjust discount if it would breach margin floor
-            effective_discount = discount_pct
-            discounted_price = avg_price * (1 - effective_discount / 100)
-            expected_margin_check = ((discounted_price - avg_cost) / discounted_price * 100) if discounted_price > 0 else 0
-            
-            # If margin breaches floor, cap the discount
-            margin_capped = False
-            if expected_margin_check < margin_floor and base_margin_pct > margin_floor:
-                # Calculate max discount that maintains margin floor
-                # margin_floor = (discounted_price - avg_cost) / discounted_price * 100
-                # Solving for discounted_price: discounted_price = avg_cost / (1 - margin_floor/100)
-                min_price = avg_cost / (1 - margin_floor / 100) if margin_floor < 100 else avg_cost
-                max_discount = ((avg_price - min_price) / avg_price * 100) if avg_price > 0 else 0
-                effective_discount = min(discount_pct, max(0, max_discount))
-                margin_capped = True
-                
-                # Recalculate demand lift with effective discount
-                demand_lift_pct = effective_discount * elasticity
-                expected_units = baseline_units * (1 + demand_lift_pct / 100)
+            # Demand scales every baseline total; cost rescales COGS inside baseline profit
+            cogs = baseline['revenue'] - baseline['profit']
+            draws = dict(baseline)
+            draws['revenue'] = baseline['revenue'] * demand
+            draws['profit'] = (baseline['revenue'] - cogs * cost) * demand
+            draws['orders'] = baseline['orders'] * demand
+            draws['units'] = baseline['units'] * demand
+            draws['avg_cost'] = baseline['avg_cost'] * cost
+            draws['elasticity'] = baseline['elasticity'] * multipliers(elasticity_cv)
             
-            discounted_price = avg_price * (1 - effective_discount / 100)
-            expected_revenue = expected_units * discounted_price
+            outcomes = self._campaign_outcomes(draws, discount_pct, promo_budget, margin_floor, campaign_days)
             
-            # Costs - use actual promo budget
-            promo_cost = min(promo_budget, expected_revenue * 0.05)  # Cap at 5% of revenue or budget
-            fulfillment_cost = (expected_units - baseline_units) * 1.5  # Only extra units have fulfillment cost
-            fulfillment_cost = max(0, fulfillment_cost)  # Can't be negative
+            bands = {}
+            for metric in ['expected_revenue', 'expected_net_profit', 'roi_pct']:
+                values = outcomes[metric]
+                band = {f'p{p:g}': float(value) for p, value in zip(percentiles, np.percentile(values, percentiles))}
+                band['mean'] = float(values.mean())
+                bands[metric] = band
             
-            cogs = expected_units * avg_cost
+            incremental_profit = outcomes['expected_net_profit'] - outcomes['baseline_profit']
+            prob_loss = float((incremental_profit < 0).mean())
             
-            expected_gross_profit = expected_revenue - cogs
-            expected_net_profit = expected_gross_profit - promo_cost - fulfillment_cost
-            expected_margin_pct = ((discounted_price - avg_cost) / discounted_price * 100) if discounted_price > 0 else 0
+            warnings = []
+            if prob_loss > 0.5:
+                warnings.append(f"Campaign loses money in {prob_loss * 100:.0f}% of scenarios")
             
-            # ROI calculation - realistic formula
-            # ROI = (Incremental Profit / Total Investment) * 100
-            total_investment = promo_cost + fulfillment_cost
-            incremental_profit = expected_net_profit - baseline_profit
+            return {'bands': bands, 'prob_loss': prob_loss, 'n_draws': n_draws, 'warnings': warnings}
+        
+        except Exception as e:
+            print(f"Error in simulate_campaign_uncertainty: {e}")
+            return {'bands': None, 'prob_loss': None, 'warnings': [f'Error: {str(e)}']}
+    
+    def simulate_campaign(self, sales_df, stores_df, products_df,
+                          discount_pct=10, promo_budget=10000, margin_floor=15,
+                          city='All', channel='All', category='All', campaign_days=7,
+                          inventory_df=None):
+        """
+        Simulate a promotional campaign.
+        
+        With inventory_df, expected units are capped per SKU x store by
+        the stock that can be sold in the window (see _inventory_fill) and
+        the result gains an 'inventory' entry with lost sales and stockout
+        counts.
+        """
+        try:
+            baseline = self._campaign_baseline(sales_df, stores_df, products_df, city, channel, category)
             
-            if total_investment > 0:
-                roi_pct = (incremental_profit / total_investment) * 100
-            else:
-                roi_pct = 0 if incremental_profit <= 0 else 100
+            if baseline is None:
+                return {'outputs': None, 'comparison': None, 'warnings': ['No data matches filters']}
             
-            # Cap ROI to realistic range (-100% to 500%)
-            roi_pct = max(-100, min(500, roi_pct))
+            result = {key: value.item() for key, value in
+                      self._campaign_outcomes(baseline, discount_pct, promo_budget, margin_floor, campaign_days).items()}
+            
+            inventory = None
+            if inventory_df is not None:
+                fill = self._inventory_fill(sales_df, stores_df, products_df, inventory_df, city, channel, category,
+                                            result['baseline_units'], result['expected_units'], campaign_days)
+                if fill is not None:
+                    demand_revenue = result['expected_revenue']
+                    result = {key: value.item() for key, value in self._campaign_outcomes(
+                        baseline, discount_pct, promo_budget, margin_floor, campaign_days,
+                        fill_rate=fill['fill_rate'], baseline_fill_rate=fill['baseline_fill_rate']).items()}
+                    inventory = {
+                        'fill_rate_pct': fill['fill_rate'] * 100,
+                        'lost_units': fill['lost_units'],
+                        'lost_revenue': demand_revenue - result['expected_revenue'],
+                        'stockouts': fill['stockouts'],
+                        'baseline_stockouts': fill['baseline_stockouts'],
+                        'pairs': fill['pairs'],
+                        'untracked_pairs': fill['untracked_pairs']
+                    }
+            
+            effective_discount = result['effective_discount_pct']
+            expected_margin_pct = result['expected_margin_pct']
+            roi_pct = result['roi_pct']
             
             warnings = []
-            if margin_capped:
+            if result['margin_capped']:
                 warnings.append(f"Discount capped to {effective_discount:.1f}% to maintain {margin_floor}% margin floor")
             if expected_margin_pct < margin_floor:
                 warnings.append(f"Margin ({expected_margin_pct:.1f}%) below floor ({margin_floor}%) - campaign not recommended")
@@ -558,29 +1619,28 @@ class Simulator:
                 warnings.append(f"Low ROI ({roi_pct:.1f}%) - consider reducing discount or budget")
             if discount_pct > 30:
                 warnings.append("High discount may erode brand value")
+            if inventory is not None and inventory['stockouts'] > 0:
+                warnings.append(f"{inventory['stockouts']} SKU-store pairs stock out - "
+                                f"{inventory['lost_units']:,.0f} units of demand cannot be fulfilled")
             
-            outputs = {
-                'expected_revenue': expected_revenue,
-                'expected_orders': int(baseline_orders * (1 + demand_lift_pct / 100)),
-                'expected_units': expected_units,
-                'expected_net_profit': expected_net_profit,
-                'expected_margin_pct': expected_margin_pct,
-                'demand_lift_pct': demand_lift_pct,
-                'roi_pct': roi_pct,
-                'promo_cost': promo_cost,
-                'fulfillment_cost': fulfillment_cost
-            }
+            outputs = {key: result[key] for key in [
+                'expected_revenue', 'expected_orders', 'expected_units', 'expected_net_profit',
+                'expected_margin_pct', 'demand_lift_pct', 'roi_pct', 'promo_cost', 'fulfillment_cost'
+            ]}
             
             comparison = {
-                'baseline_revenue': baseline_revenue,
-                'baseline_profit': baseline_profit,
-                'baseline_orders': int(baseline_orders),
-                'revenue_change_pct': ((expected_revenue - baseline_revenue) / baseline_revenue * 100) if baseline_revenue > 0 else 0,
-                'profit_change_pct': ((expected_net_profit - baseline_profit) / abs(baseline_profit) * 100) if baseline_profit != 0 else 0,
-                'order_change_pct': demand_lift_pct
+                'baseline_revenue': result['baseline_revenue'],
+                'baseline_profit': result['baseline_profit'],
+                'baseline_orders': result['baseline_orders'],
+                'revenue_change_pct': result['revenue_change_pct'],
+                'profit_change_pct': result['profit_change_pct'],
+                'order_change_pct': result['demand_lift_pct']
             }
             
-            return {'outputs': outputs, 'comparison': comparison, 'warnings': warnings}
+            results = {'outputs': outputs, 'comparison': comparison, 'warnings': warnings}
+            if inventory is not None:
+                results['inventory'] = inventory
+            return results
             
         except Exception as e:
             print(f"Error in simulate_campaign: {e}")
@@ -0,0 +1,204 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Quantile Sketches
+# ============================================================================
+
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile summary for streaming and parallel cleaning.
+    
+    Values are kept as sorted (value, weight) centroids. With ``rank_error=None``
+    every distinct value keeps its own centroid and quantiles are exact (same
+    linear interpolation as pandas), but memory grows with the number of
+    distinct values, so exact mode is only bounded for low-cardinality data.
+    With a rank error, centroids are merged t-digest style (arcsine scale
+    function) so the sketch stays bounded at roughly ``pi / rank_error``
+    centroids and quantile ranks are accurate to about ``rank_error``,
+    tighter towards the tails.
+    """
+    
+    BUFFER_SIZE = 50000
+    
+    def __init__(self, rank_error=None):
+        """Initialize an empty sketch."""
+        if rank_error is not None and not 0 < rank_error < 1:
+            raise ValueError("rank_error must be between 0 and 1")
+        
+        self.rank_error = rank_error
+        self.delta = math.ceil(math.pi / (2 * rank_error)) if rank_error else None
+        self.exact = True
+        self.min = np.nan
+        self.max = np.nan
+        self._values = np.empty(0, dtype=float)
+        self._weights = np.empty(0, dtype=float)
+        self._buffer = []
+        self._buffered = 0
+    
+    @property
+    def count(self):
+        """Total weight (number of values) seen."""
+        self._flush()
+        return float(self._weights.sum())
+    
+    def __len__(self):
+        """Number of centroids currently stored."""
+        self._flush()
+        return len(self._values)
+    
+    def update(self, values):
+        """Add an array or Series of values; missing values are ignored."""
+        values = pd.to_numeric(pd.Series(values), errors='coerce').dropna().to_numpy(dtype=float)
+        if len(values) == 0:
+            return self
+        
+        self._buffer.append(values)
+        self._buffered += len(values)
+        if self._buffered >= self.BUFFER_SIZE:
+            self._flush()
+        return self
+    
+    def add(self, value, weight=1):
+        """Add a single value with the given weight."""
+        if pd.isna(value) or weight <= 0:
+            return self
+        
+        self._flush()
+        self._absorb(np.array([value], dtype=float), np.array([weight], dtype=float))
+        return self
+    
+    def merge(self, other):
+        """Merge another sketch into this one (in place) and return self."""
+        if other is None:
+            return self
+        
+        other._flush()
+        self._flush()
+        self.exact = self.exact and other.exact
+        self._absorb(other._values, other._weights)
+        if len(other._values):
+            # Centroids are means; keep the other sketch's exact extremes
+            self.min = np.nanmin([self.min, other.min])
+            self.max = np.nanmax([self.max, other.max])
+        return self
+    
+    def copy(self):
+        """Return an independent copy of the sketch."""
+        self._flush()
+        sketch = QuantileSketch(self.rank_error)
+        sketch.exact = self.exact
+        sketch.min = self.min
+        sketch.max = self.max
+        sketch._values = self._values.copy()
+        sketch._weights = self._weights.copy()
+        return sketch
+    
+    def quantile(self, q):
+        """Return the q-th quantile (0 <= q <= 1), or NaN if the sketch is empty."""
+        self._flush()
+        if len(self._values) == 0:
+            return np.nan
+        
+        if self.exact:
+            return self._exact_quantile(q)
+        return self._approx_quantile(q)
+    
+    def median(self):
+        """Return the median."""
+        self._flush()
+        if len(self._values) == 0:
+            return np.nan
+        
+        if self.exact:
+            # Like pandas, average the two middle values
+            cumulative = np.cumsum(self._weights)
+            total = int(cumulative[-1])
+            a = self._values[np.searchsorted(cumulative, (total - 1) // 2, side='right')]
+            b = self._values[np.searchsorted(cumulative, total // 2, side='right')]
+            return (a + b) / 2
+        return self._approx_quantile(0.5)
+    
+    def _flush(self):
+        """Fold buffered values into the centroids."""
+        if not self._buffer:
+            return
+        
+        values = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        
+        values, weights = np.unique(values, return_counts=True)
+        self._absorb(values, weights.astype(float))
+    
+    def _absorb(self, values, weights):
+        """Merge (value, weight) pairs into the centroids and compress if needed."""
+        if len(values) == 0:
+            return
+        
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+        
+        values = np.concatenate([self._values, values])
+        weights = np.concatenate([self._weights, weights])
+        self._values, inverse = np.unique(values, return_inverse=True)
+        self._weights = np.bincount(inverse, weights=weights)
+        
+        if self.delta is not None and len(self._values) > 2 * self.delta:
+            self._compress()
+    
+    def _compress(self):
+        """Merge centroids whose midpoints share one unit of the arcsine scale."""
+        total = self._weights.sum()
+        scale = self.delta / (2 * math.pi)
+        
+        # Rank of each centroid's midpoint, and the ranks where the scale
+        # function crosses each whole unit
+        cumulative = np.cumsum(self._weights)
+        q_mid = (cumulative - self._weights / 2) / total
+        units = np.arange(1, math.ceil(scale * math.pi))
+        q_bounds = (np.sin(units / scale - math.pi / 2) + 1) / 2
+        buckets = np.searchsorted(q_bounds, q_mid, side='right')
+        
+        # Buckets are sorted, so each one is a run of adjacent centroids
+        starts = np.flatnonzero(np.concatenate([[True], buckets[1:] != buckets[:-1]]))
+        weights = np.add.reduceat(self._weights, starts)
+        self._values = np.add.reduceat(self._values * self._weights, starts) / weights
+        self._weights = weights
+        self.exact = False
+    
+    def _exact_quantile(self, q):
+        """Quantile over exact value counts, matching pandas linear interpolation."""
+        cumulative = np.cumsum(self._weights)
+        total = cumulative[-1]
+        
+        # Replicate the pandas -> np.percentile arithmetic (including the
+        # percent round trip) so caps match an in-memory run exactly
+        q = q * 100.0 / 100
+        position = (total - 1) * q
+        lower = np.floor(position)
+        upper = lower + 1
+        if position >= total - 1:
+            lower = upper = total - 1
+        elif position < 0:
+            lower = upper = 0
+        
+        a = self._values[np.searchsorted(cumulative, lower, side='right')]
+        b = self._values[np.searchsorted(cumulative, upper, side='right')]
+        t = position - lower
+        return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+    
+    def _approx_quantile(self, q):
+        """Quantile by interpolating between centroid centers."""
+        total = self._weights.sum()
+        centers = np.cumsum(self._weights) - self._weights / 2
+        rank = q * total
+        
+        # Anchor the ends at the exact min and max
+        ranks = np.concatenate([[0.0], centers, [total]])
+        values = np.concatenate([[self.min], self._values, [self.max]])
+        return float(np.interp(rank, ranks, values))
@@ -0,0 +1,46 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Test Fixtures
+# ============================================================================
+
+import os
+import sys
+import warnings
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(ROOT, 'data')
+sys.path.insert(0, ROOT)
+
+from modules import DataCleaner  # noqa: E402
+
+RAW_FILES = ['products_dirty.csv', 'stores_dirty.csv', 'sales_raw_dirty.csv', 'inventory_snapshot_dirty.csv']
+
+
+def read_raw_frames():
+    """Dirty sample data: (products, stores, sales, inventory)."""
+    return tuple(pd.read_csv(os.path.join(DATA_DIR, name)) for name in RAW_FILES)
+
+
+@pytest.fixture(autouse=True)
+def _quiet_warnings():
+    """The dirty sample data triggers parsing warnings on purpose."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        yield
+
+
+@pytest.fixture
+def raw_frames():
+    """Fresh copy of the dirty sample data for each test."""
+    return read_raw_frames()
+
+
+@pytest.fixture(scope='session')
+def clean_frames():
+    """Sample data after clean_all, shared by the read-only tests."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return DataCleaner().clean_all(*read_raw_frames())
@@ -0,0 +1,179 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Cleaner Equivalence Tests
+# ============================================================================
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules import CleaningCache, DataCleaner
+
+# clean_all on the sample data before the cleaning fast paths were added
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'data', 'clean_all_baseline.json')
+
+
+def sorted_rows(df, keys):
+    """Rows in a canonical order, for comparing runs that keep a different row order."""
+    return df.sort_values(keys, kind='stable').reset_index(drop=True)
+
+
+def assert_same_cleaning(result, expected, cleaner, expected_cleaner):
+    """Frames, issue log, stats and report of two cleaning runs are identical."""
+    for got, want in zip(result, expected):
+        pd.testing.assert_frame_equal(got, want)
+    assert cleaner.issues == expected_cleaner.issues
+    assert cleaner.stats == expected_cleaner.stats
+    assert cleaner.cleaning_report == expected_cleaner.cleaning_report
+
+
+def cleaning_summary(cleaner, result):
+    """Row counts, logs and sales order_ids of a cleaning run, as stored in BASELINE_FILE."""
+    summary = {
+        'rows': [len(df) for df in result],
+        'stats': cleaner.stats,
+        'issues': cleaner.issues,
+        'cleaning_report': cleaner.cleaning_report,
+        'sales_order_ids': sorted(result[2]['order_id'].astype(str)),
+    }
+    return json.loads(json.dumps(summary, default=lambda value: value.item()))
+
+
+@pytest.fixture
+def reference(raw_frames):
+    """A sequential clean_all run: (cleaner, cleaned frames)."""
+    cleaner = DataCleaner()
+    return cleaner, cleaner.clean_all(*raw_frames)
+
+
+@pytest.mark.parametrize('frame, column, mapping_key', [
+    (0, 'category', 'categories'),
+    (1, 'city', 'cities'),
+    (1, 'channel', 'channels'),
+])
+def test_text_mapping_matches_per_value(raw_frames, frame, column, mapping_key):
+    series = raw_frames[frame][column]
+    
+    per_value = DataCleaner()
+    mappings = per_value.text_mappings.get(mapping_key, {})
+    expected = series.apply(lambda value: per_value._map_text_value(value, mappings, column))
+    
+    vectorized = DataCleaner()
+    pd.testing.assert_series_equal(vectorized._map_text_series(series, mappings, column), expected)
+    assert vectorized.stats['text_standardized'] == per_value.stats['text_standardized']
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'parallel', 'streaming'])
+def test_matches_pre_change_clean_all(raw_frames, tmp_path, monkeypatch, mode):
+    products, stores, sales, inventory = raw_frames
+    if mode == 'streaming':
+        sales.to_csv(tmp_path / 'sales.csv', index=False)
+        inventory.to_csv(tmp_path / 'inventory.csv', index=False)
+        cleaner = DataCleaner()
+        result = cleaner.clean_all_streaming(products, stores, tmp_path / 'sales.csv', tmp_path / 'inventory.csv',
+                                             chunksize=700, exact=True)
+    else:
+        monkeypatch.setattr(DataCleaner, 'SALES_PARTITION_ROWS', 1000)
+        cleaner = DataCleaner(workers=3 if mode == 'parallel' else 1)
+        result = cleaner.clean_all(*raw_frames)
+    
+    with open(BASELINE_FILE) as fh:
+        baseline = json.load(fh)
+    # Duplicate order_ids with equal timestamps keep the later row, as before
+    assert cleaning_summary(cleaner, result) == baseline
+
+
+def test_parallel_matches_sequential(raw_frames, reference, monkeypatch):
+    # Small partitions so the sales rows are really split across workers
+    monkeypatch.setattr(DataCleaner, 'SALES_PARTITION_ROWS', 1000)
+    cleaner = DataCleaner(workers=3)
+    assert_same_cleaning(cleaner.clean_all(*raw_frames), reference[1], cleaner, reference[0])
+
+
+@pytest.mark.parametrize('chunksize', [700, 100000])
+def test_streaming_exact_matches_clean_all(raw_frames, reference, tmp_path, chunksize):
+    products, stores, sales, inventory = raw_frames
+    sales.to_csv(tmp_path / 'sales.csv', index=False)
+    inventory.to_csv(tmp_path / 'inventory.csv', index=False)
+    
+    cleaner = DataCleaner()
+    result = cleaner.clean_all_streaming(products, stores, tmp_path / 'sales.csv', tmp_path / 'inventory.csv',
+                                         chunksize=chunksize, exact=True)
+    expected_cleaner, expected = reference
+    
+    pd.testing.assert_frame_equal(result[0], expected[0])
+    pd.testing.assert_frame_equal(result[1], expected[1])
+    # Streaming keeps input order, so compare rows irrespective of order
+    pd.testing.assert_frame_equal(sorted_rows(result[2], ['order_id', 'order_time']),
+                                  sorted_rows(expected[2], ['order_id', 'order_time']))
+    pd.testing.assert_frame_equal(sorted_rows(result[3], ['sku', 'store_id', 'snapshot_date']),
+                                  sorted_rows(expected[3], ['sku', 'store_id', 'snapshot_date']))
+    assert cleaner.issues == expected_cleaner.issues
+    assert cleaner.stats == expected_cleaner.stats
+
+
+def test_streaming_defaults_to_bounded_sketches(raw_frames, tmp_path):
+    products, stores, sales, inventory = raw_frames
+    sales.to_csv(tmp_path / 'sales.csv', index=False)
+    inventory.to_csv(tmp_path / 'inventory.csv', index=False)
+    
+    cleaner = DataCleaner()
+    cleaner.clean_all_streaming(products, stores, tmp_path / 'sales.csv', tmp_path / 'inventory.csv', chunksize=700)
+    assert cleaner.sales_summary['qty_sketch'].rank_error == DataCleaner.STREAMING_QUANTILE_ERROR
+    assert cleaner.quantile_error is None
+
+
+def test_cached_miss_and_hit_match_clean_all(raw_frames, reference, tmp_path):
+    cache = CleaningCache(cache_dir=str(tmp_path))
+    
+    miss = DataCleaner()
+    result = miss.clean_all_cached(*raw_frames, cache)
+    assert not miss.cache_hit
+    assert_same_cleaning(result, reference[1], miss, reference[0])
+    
+    hit = DataCleaner()
+    result = hit.clean_all_cached(*raw_frames, cache)
+    assert hit.cache_hit
+    assert_same_cleaning(result, reference[1], hit, reference[0])
+
+
+@pytest.mark.parametrize('split', [1000, 4000])
+def test_incremental_matches_full_clean(raw_frames, reference, split):
+    products, stores, sales, inventory = raw_frames
+    
+    cleaner = DataCleaner()
+    clean_products, clean_stores, history, _ = cleaner.clean_all(products, stores, sales.iloc[:split], inventory)
+    state = cleaner.incremental_state(clean_products, clean_stores, history)
+    seen_before = state['order_id_hashes'].copy()
+    
+    batch, new_state = DataCleaner().clean_sales_increment(sales.iloc[split:], state)
+    combined = DataCleaner.append_sales_batch(history, batch)
+    
+    # Same surviving orders as a full clean; batch rows get the caps of the
+    # whole data, while history rows keep the caps they were cleaned with
+    full = reference[1][2]
+    assert sorted(combined['order_id'].astype(str)) == sorted(full['order_id'].astype(str))
+    batch_ids = batch['order_id'].astype(str)
+    pd.testing.assert_frame_equal(sorted_rows(batch, ['order_id', 'order_time']),
+                                  sorted_rows(full[full['order_id'].astype(str).isin(batch_ids)],
+                                              ['order_id', 'order_time']),
+                                  check_categorical=False)
+    # The incoming state is left untouched, so a batch can be retried from it
+    np.testing.assert_array_equal(state['order_id_hashes'], seen_before)
+    assert len(new_state['order_id_hashes']) > len(seen_before)
+    retry, _ = DataCleaner().clean_sales_increment(sales.iloc[split:], state)
+    pd.testing.assert_frame_equal(retry, batch)
+
+
+def test_incremental_drops_ids_already_seen(raw_frames):
+    products, stores, sales, inventory = raw_frames
+    
+    cleaner = DataCleaner()
+    clean_products, clean_stores, history, _ = cleaner.clean_all(products, stores, sales.iloc[:1000], inventory)
+    state = cleaner.incremental_state(clean_products, clean_stores, history)
+    
+    batch, _ = DataCleaner().clean_sales_increment(sales.iloc[:1000], state)
+    assert len(batch) == 0
@@ -0,0 +1,92 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Fact Table Tests
+# ============================================================================
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules import Simulator
+
+
+def merged_fact(sales, stores, products):
+    """Reference join: sales merged with the de-duplicated stores and products (first row wins)."""
+    stores_dim = stores.drop_duplicates('store_id')[['store_id', 'city', 'channel']]
+    products_dim = products.drop_duplicates('sku')[['sku', 'unit_cost_aed', 'category']]
+    return (sales.reset_index(drop=True)
+            .merge(stores_dim, on='store_id', how='left')
+            .merge(products_dim, on='sku', how='left'))
+
+
+def dimensions(stores, products, variant):
+    """Stores and products as given, with duplicate rows, or missing some keys."""
+    if variant == 'duplicated':
+        return pd.concat([stores, stores.iloc[:5]]), pd.concat([products, products.iloc[:5]])
+    if variant == 'missing':
+        return stores.iloc[2:], products.iloc[3:]
+    return stores, products
+
+
+@pytest.mark.parametrize('variant', ['clean', 'duplicated', 'missing'])
+def test_fact_table_matches_merge_join(clean_frames, variant):
+    products, stores, sales, _ = clean_frames
+    stores, products = dimensions(stores, products, variant)
+    
+    fact = Simulator().build_fact_table(sales, stores, products).reset_index(drop=True)
+    expected = merged_fact(sales, stores, products)
+    # Duplicate dimension rows must not multiply sales rows
+    assert len(fact) == len(sales) == len(expected)
+    for column in ['city', 'channel', 'category']:
+        pd.testing.assert_series_equal(fact[column].astype(object), expected[column].astype(object))
+    
+    qty = pd.to_numeric(expected['qty'], errors='coerce').fillna(0)
+    price = pd.to_numeric(expected['selling_price_aed'], errors='coerce').fillna(0)
+    cost = pd.to_numeric(expected['unit_cost_aed'], errors='coerce').fillna(0)
+    np.testing.assert_allclose(fact['_cost'], cost)
+    np.testing.assert_allclose(fact['revenue'], qty * price)
+    np.testing.assert_allclose(fact['profit'], qty * (price - cost))
+
+
+@pytest.mark.parametrize('variant', ['clean', 'duplicated', 'missing'])
+def test_surrogate_keys_are_dimension_positions(clean_frames, variant):
+    products, stores, sales, _ = clean_frames
+    stores, products = dimensions(stores, products, variant)
+    fact = Simulator().build_fact_table(sales, stores, products)
+    
+    for code_col, key, dim in [('_store_code', 'store_id', stores), ('_sku_code', 'sku', products)]:
+        keys = dim.drop_duplicates(key)[key].to_numpy()
+        codes = fact[code_col].to_numpy()
+        matched = codes >= 0
+        np.testing.assert_array_equal(keys[codes[matched]].astype(str), sales[key].to_numpy()[matched].astype(str))
+        # -1 only for keys the dimension does not have
+        assert not sales[key][~matched].isin(keys).any()
+
+
+def test_fact_table_is_built_once_per_dataset(clean_frames):
+    products, stores, sales, _ = clean_frames
+    sim = Simulator()
+    
+    fact = sim.get_fact_table(sales, stores, products)
+    assert sim.get_fact_table(sales, stores, products) is fact
+    # A table built with stores also serves callers that do not pass stores
+    assert sim.get_fact_table(sales, None, products) is fact
+    assert sim.get_fact_table(sales.copy(), stores, products) is not fact
+
+
+def test_dataset_version_keys_the_caches(clean_frames):
+    products, stores, sales, inventory = clean_frames
+    sim = Simulator()
+    sim.dataset_version = ('clean', 'first')
+    
+    fact = sim.get_fact_table(sales, stores, products)
+    baseline = sim.get_baseline_table(sales, stores, products)
+    supply = sim._inventory_supply(inventory, stores, products)
+    # Another session's frame objects for the same version share the caches
+    copies = [df.copy() for df in (sales, stores, products)]
+    assert sim.get_fact_table(*copies) is fact
+    assert sim.get_baseline_table(*copies) is baseline
+    assert sim._inventory_supply(inventory.copy(), copies[1], copies[2]) is supply
+    
+    sim.dataset_version = ('clean', 'second')
+    assert sim.get_fact_table(*copies) is not fact
@@ -0,0 +1,85 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Filter Engine Tests
+# ============================================================================
+
+import random
+
+import pandas as pd
+import pytest
+
+from modules import FilterEngine
+from conftest import read_raw_frames
+
+
+def mask_filter(sales_df, stores_df, products_df, inventory_df,
+                date_range=None, cities=None, channels=None, categories=None, brands=None):
+    """Reference implementation: the dashboard's original boolean-mask filtering."""
+    sales, stores, products, inventory = sales_df, stores_df, products_df, inventory_df
+    
+    if date_range and len(date_range) == 2:
+        start, end = date_range
+        sales = sales[(sales['order_time'].dt.date >= start) & (sales['order_time'].dt.date <= end)]
+    if cities:
+        stores = stores[stores['city'].isin(cities)]
+    if channels:
+        stores = stores[stores['channel'].isin(channels)]
+    if categories:
+        products = products[products['category'].isin(categories)]
+    if brands:
+        products = products[products['brand'].isin(brands)]
+    
+    store_ids = stores['store_id'].unique()
+    skus = products['sku'].unique()
+    sales = sales[sales['store_id'].isin(store_ids) & sales['sku'].isin(skus)]
+    inventory = inventory[inventory['store_id'].isin(store_ids) & inventory['sku'].isin(skus)]
+    return sales, stores, products, inventory
+
+
+@pytest.fixture(params=['clean', 'raw'])
+def frames(request, clean_frames):
+    """Cleaned frames, and raw frames with their dirty keys and categories."""
+    if request.param == 'clean':
+        products, stores, sales, inventory = clean_frames
+    else:
+        products, stores, sales, inventory = read_raw_frames()
+        products = products.rename(columns={'product_id': 'sku'})
+        inventory = inventory.rename(columns={'product_id': 'sku'})
+        sales = sales.rename(columns={'product_id': 'sku'})
+    sales = sales.assign(order_time=pd.to_datetime(sales['order_time'], errors='coerce'))
+    return sales, stores, products, inventory
+
+
+def test_apply_matches_mask_filtering(frames):
+    sales, stores, products, inventory = frames
+    engine = FilterEngine(sales, stores, products, inventory)
+    first, last = engine.date_bounds()
+    span = (last - first).days
+    
+    options = {
+        'cities': sorted(stores['city'].dropna().unique()),
+        'channels': sorted(stores['channel'].dropna().unique()),
+        'categories': sorted(products['category'].dropna().unique()),
+        'brands': sorted(products['brand'].dropna().unique()),
+    }
+    rng = random.Random(0)
+    for _ in range(100):
+        selection = {name: rng.sample(values, rng.randint(0, min(3, len(values))))
+                     for name, values in options.items()}
+        if rng.random() < 0.7:
+            start = first + pd.Timedelta(days=rng.randint(0, span))
+            selection['date_range'] = (start, start + pd.Timedelta(days=rng.randint(0, span)))
+        
+        expected = mask_filter(sales, stores, products, inventory, **selection)
+        result = engine.filtered_frames(engine.apply(**selection))
+        for got, want in zip(result, expected):
+            pd.testing.assert_index_equal(got.index, want.index)
+
+
+def test_no_selection_returns_frames_unchanged(frames):
+    sales, stores, products, inventory = frames
+    engine = FilterEngine(sales, stores, products, inventory)
+    
+    result = engine.filtered_frames(engine.apply())
+    assert result[1] is stores
+    assert result[2] is products
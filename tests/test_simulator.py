@@ -0,0 +1,142 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Campaign Simulator Tests
+# ============================================================================
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from modules import Simulator
+
+BASELINE_MODES = [('run_rate', False), ('run_rate', True), ('forecast', False)]
+
+
+def make_simulator(baseline_method, weekday_seasonality):
+    """Simulator with the given baseline mode."""
+    sim = Simulator()
+    sim.baseline_method = baseline_method
+    sim.weekday_seasonality = weekday_seasonality
+    return sim
+
+
+def assert_matches_campaign(row, campaign):
+    """A grid or scenario row carries the same outputs as simulate_campaign."""
+    for section in ['outputs', 'comparison']:
+        for key, value in campaign[section].items():
+            if key in row:
+                assert row[key] == pytest.approx(value, rel=1e-9, abs=1e-6), key
+
+
+def test_default_baseline_is_run_rate():
+    assert Simulator().baseline_method == 'run_rate'
+
+
+@pytest.mark.parametrize('baseline_method, weekday_seasonality', BASELINE_MODES)
+@pytest.mark.parametrize('targeting', [('All', 'All', 'All'), ('Dubai', 'All', 'Electronics')])
+def test_grid_matches_looped_campaigns(clean_frames, baseline_method, weekday_seasonality, targeting):
+    products, stores, sales, _ = clean_frames
+    city, channel, category = targeting
+    sim = make_simulator(baseline_method, weekday_seasonality)
+    
+    axes = {
+        'discount_pcts': [0, 10, 35],
+        'promo_budgets': [5000, 50000],
+        'margin_floors': [15, 40],
+        'campaign_days': [3, 7, 45, 90],
+    }
+    grid = sim.simulate_campaign_grid(sales, stores, products, city=city, channel=channel, category=category, **axes)
+    combinations = list(itertools.product(*axes.values()))
+    assert len(grid) == len(combinations)
+    
+    for (_, row), (discount, budget, floor, days) in zip(grid.iterrows(), combinations):
+        assert (row['discount_pct'], row['promo_budget'], row['margin_floor'], row['campaign_days']) == \
+            (discount, budget, floor, days)
+        campaign = sim.simulate_campaign(sales, stores, products, discount_pct=discount, promo_budget=budget,
+                                         margin_floor=floor, city=city, channel=channel, category=category,
+                                         campaign_days=days)
+        assert_matches_campaign(row, campaign)
+
+
+@pytest.mark.parametrize('objective, column', [('net_profit', 'expected_net_profit'), ('roi', 'roi_pct')])
+def test_optimizer_matches_looped_campaigns(clean_frames, objective, column):
+    products, stores, sales, _ = clean_frames
+    sim = Simulator()
+    
+    result = sim.optimize_campaign(sales, stores, products, objective=objective, margin_floor=15,
+                                   city='Dubai', campaign_days=14, grid_size=7, iterations=3)
+    optimal = result['optimal']
+    scenarios = result['scenarios']
+    assert len(scenarios) == 7 * 7 * 3
+    
+    campaign = sim.simulate_campaign(sales, stores, products, discount_pct=optimal['discount_pct'],
+                                     promo_budget=optimal['promo_budget'], margin_floor=15, city='Dubai',
+                                     campaign_days=14)
+    assert campaign['outputs'][column] == pytest.approx(optimal['objective_value'])
+    assert result['outputs'] == campaign['outputs']
+    
+    # The optimum is the best eligible scenario, and each scenario matches a looped run
+    eligible = scenarios[scenarios['expected_margin_pct'] >= 15]
+    assert optimal['objective_value'] == pytest.approx(eligible[column].max())
+    for _, row in scenarios.sample(10, random_state=0).iterrows():
+        looped = sim.simulate_campaign(sales, stores, products, discount_pct=row['discount_pct'],
+                                       promo_budget=row['promo_budget'], margin_floor=15, city='Dubai',
+                                       campaign_days=14)
+        assert_matches_campaign(row, looped)
+
+
+def test_forecast_window_days_are_never_negative(clean_frames):
+    products, stores, sales, _ = clean_frames
+    sim = make_simulator('forecast', False)
+    
+    grid = sim.simulate_campaign_grid(sales, stores, products, campaign_days=[1, 30, 60, 120])
+    baseline = grid['baseline_units'].to_numpy()
+    assert (baseline >= 0).all()
+    assert (np.diff(baseline) >= 0).all()
+
+
+def test_inventory_cap_only_removes_demand(clean_frames):
+    products, stores, sales, inventory = clean_frames
+    sim = Simulator()
+    
+    for days in [7, 30, 90]:
+        uncapped = sim.simulate_campaign(sales, stores, products, discount_pct=20, campaign_days=days)
+        capped = sim.simulate_campaign(sales, stores, products, discount_pct=20, campaign_days=days,
+                                       inventory_df=inventory)
+        assert 0 < capped['inventory']['fill_rate_pct'] <= 100
+        assert capped['outputs']['expected_units'] <= uncapped['outputs']['expected_units']
+        assert capped['outputs']['expected_units'] == pytest.approx(
+            uncapped['outputs']['expected_units'] - capped['inventory']['lost_units'], abs=1)
+
+
+def test_replenishment_is_bounded_by_reorder_point(clean_frames):
+    products, stores, sales, inventory = clean_frames
+    sim = Simulator()
+    # Nothing on hand and nothing reordered: every tracked pair runs out
+    empty = inventory.assign(stock_on_hand=0, reorder_point=0, lead_time_days=0)
+    
+    capped = sim.simulate_campaign(sales, stores, products, discount_pct=20, campaign_days=30, inventory_df=empty)
+    stock = capped['inventory']
+    assert stock['lost_units'] > 0
+    assert stock['stockouts'] == stock['pairs'] - stock['untracked_pairs']
+
+
+def test_shared_simulator_is_thread_safe(clean_frames):
+    products, stores, sales, inventory = clean_frames
+    segments = [('All', 'All', 'All'), ('Dubai', 'All', 'All'), ('All', 'App', 'All'), ('All', 'All', 'Electronics')]
+    
+    def run(sim, segment):
+        city, channel, category = segment
+        return sim.simulate_campaign(sales, stores, products, discount_pct=15, city=city, channel=channel,
+                                     category=category, campaign_days=14, inventory_df=inventory)
+    
+    expected = [run(Simulator(), segment) for segment in segments]
+    # One cold simulator shared by all threads, as get_simulator shares it across sessions
+    shared = Simulator()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda segment: run(shared, segment), segments * 4))
+    for result, want in zip(results, expected * 4):
+        assert result['outputs'] == want['outputs']
+        assert result['inventory'] == want['inventory']
@@ -0,0 +1,88 @@
+# ============================================================================
+# UAE Pulse Simulator + Data Rescue Dashboard
+# Quantile Sketch Tests
+# ============================================================================
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from modules import QuantileSketch
+
+QUANTILES = [0, 0.001, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 0.999, 1]
+
+
+def sample(name, size=200000, seed=0):
+    """Test distributions, including heavy ties and already sorted input."""
+    rng = np.random.default_rng(seed)
+    return {
+        'normal': lambda: rng.normal(size=size),
+        'lognormal': lambda: rng.lognormal(3, 1.5, size),
+        'integers': lambda: rng.integers(0, 5000, size).astype(float),
+        'sorted': lambda: np.sort(rng.exponential(size=size)),
+    }[name]()
+
+
+def merged_sketch(values, rank_error, parts=17):
+    """Sketch built from partial sketches, as the parallel and streaming cleaners do."""
+    sketches = [QuantileSketch(rank_error).update(part) for part in np.array_split(values, parts)]
+    for sketch in sketches[1:]:
+        sketches[0].merge(sketch)
+    return sketches[0]
+
+
+@pytest.mark.parametrize('name', ['normal', 'integers'])
+def test_exact_mode_matches_pandas(name):
+    values = sample(name, size=20000)
+    series = pd.Series(values)
+    sketch = merged_sketch(values, None)
+    
+    assert sketch.exact
+    for q in QUANTILES:
+        assert sketch.quantile(q) == series.quantile(q)
+    assert sketch.median() == series.median()
+
+
+def test_exact_mode_ignores_missing_values():
+    series = pd.Series([3.0, np.nan, 1.0, 2.0, None, 10.0])
+    sketch = QuantileSketch().update(series)
+    
+    assert sketch.count == 4
+    assert sketch.quantile(0.9) == series.quantile(0.9)
+
+
+@pytest.mark.parametrize('name', ['normal', 'lognormal', 'integers', 'sorted'])
+@pytest.mark.parametrize('rank_error', [0.01, 0.001])
+def test_rank_error_bound(name, rank_error):
+    values = sample(name)
+    ordered = np.sort(values)
+    
+    streamed = QuantileSketch(rank_error)
+    for part in np.array_split(values, 100):
+        streamed.update(part)
+    
+    for sketch in [streamed, merged_sketch(values, rank_error)]:
+        assert not sketch.exact
+        assert len(sketch) <= 2 * sketch.delta
+        for q in QUANTILES:
+            rank = np.searchsorted(ordered, sketch.quantile(q)) / len(values)
+            assert abs(rank - q) <= rank_error
+        assert sketch.quantile(0) == ordered[0]
+        assert sketch.quantile(1) == ordered[-1]
+
+
+def test_copy_is_independent():
+    sketch = QuantileSketch(0.01).update(sample('normal', size=5000))
+    copy = sketch.copy()
+    copy.update(np.full(5000, 100.0))
+    
+    assert sketch.count == 5000
+    assert copy.count == 10000
+    assert sketch.quantile(0.99) < 100
+
+
+def test_invalid_rank_error():
+    with pytest.raises(ValueError):
+        QuantileSketch(0)
+    with pytest.raises(ValueError):
+        QuantileSketch(1.5)